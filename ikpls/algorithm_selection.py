@@ -0,0 +1,408 @@
+"""
+Contains the CostModel class which estimates the computational cost of Improved Kernel
+PLS Algorithm #1 and #2 by Dayal and MacGregor:
+https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+
+The cost model is used to automatically select the cheaper algorithm for a given
+problem size when `algorithm="auto"`. It counts the floating point operations of the
+steps in which the two algorithms differ and weighs them by the throughput of
+matrix-matrix and matrix-vector products, which can be measured on the host with a
+quick micro-benchmark. The implementation is written using NumPy.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+import time
+from typing import Iterable, Union
+
+import numpy as np
+
+
+class CostModel:
+    """
+    Estimates the time taken by Improved Kernel PLS Algorithm #1 and #2 from the number
+    of floating point operations in the steps in which they differ.
+
+    Algorithm #1 computes the scores from `X` in each component, costing two
+    matrix-vector products with `X`. Algorithm #2 instead forms `XTX` once with a
+    matrix-matrix product and then computes one matrix-vector product with `XTX` in
+    each component. The steps shared by both algorithms are not counted.
+
+    If `X` is a scipy.sparse matrix, the products with `X` cost in proportion to its
+    number of nonzero entries `nnz` instead of `N` times `K`. Algorithm #1 benefits
+    fully from this, while `XTX` is dense regardless of the density of `X`.
+
+    Parameters
+    ----------
+    gemm_flops : float, default=1e11
+        Throughput of matrix-matrix products in floating point operations per second.
+
+    gemv_flops : float, default=1e10
+        Throughput of matrix-vector products in floating point operations per second.
+        These are bound by memory bandwidth and are typically an order of magnitude
+        slower than matrix-matrix products.
+
+    memory_limit : int or None, default=None
+        Maximum number of bytes that `XTX` may use. If `XTX` would exceed it, then
+        Algorithm #1 is selected regardless of the cost. If None, the memory usage is
+        only limited for a sparse `X`, for which `XTX` may not have more entries than
+        `X` has nonzero entries.
+
+    See Also
+    --------
+    calibrate : Measures `gemm_flops` and `gemv_flops` on the host.
+    """
+
+    def __init__(
+        self,
+        gemm_flops: float = 1e11,
+        gemv_flops: float = 1e10,
+        memory_limit: Union[None, int] = None,
+    ) -> None:
+        self.gemm_flops = gemm_flops
+        self.gemv_flops = gemv_flops
+        self.memory_limit = memory_limit
+
+    @classmethod
+    def calibrate(
+        cls,
+        dtype: np.floating = np.float64,
+        size: int = 512,
+        repeats: int = 5,
+        memory_limit: Union[None, int] = None,
+    ) -> "CostModel":
+        """
+        Measures the throughput of matrix-matrix and matrix-vector products on the
+        host and returns a cost model using them. The measurement takes a fraction of a
+        second with the default arguments.
+
+        Parameters
+        ----------
+        dtype : numpy.float, default=numpy.float64
+            The float datatype to use in the measurement.
+
+        size : int, default=512
+            Number of rows and columns of the square matrix used in the measurement.
+
+        repeats : int, default=5
+            Number of times each product is timed. The fastest time is used.
+
+        memory_limit : int or None, default=None
+            Maximum number of bytes that `XTX` may use. Passed to the cost model.
+
+        Returns
+        -------
+        cost_model : CostModel
+            A cost model with the measured throughputs.
+        """
+        rng = np.random.default_rng(0)
+        X = rng.standard_normal((size, size)).astype(dtype)
+        v = rng.standard_normal((size, 1)).astype(dtype)
+
+        def best_time(product):
+            product()  # Warm up
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                product()
+                times.append(time.perf_counter() - start)
+            return max(min(times), np.finfo(np.float64).eps)
+
+        gemm_time = best_time(lambda: X @ X)
+        # A single matrix-vector product is too fast to time accurately.
+        gemv_time = best_time(lambda: [X @ v for _ in range(size)]) / size
+        return cls(
+            gemm_flops=2 * size**3 / gemm_time,
+            gemv_flops=2 * size**2 / gemv_time,
+            memory_limit=memory_limit,
+        )
+
+    def fit_cost(
+        self,
+        algorithm: int,
+        N: int,
+        K: int,
+        M: int,
+        A: int,
+        nnz: Union[None, int] = None,
+    ) -> float:
+        """
+        Estimates the time in seconds taken by the steps of a fit that depend on the
+        algorithm.
+
+        Parameters
+        ----------
+        algorithm : int
+            Whether to estimate the cost of Improved Kernel PLS Algorithm #1 or #2.
+
+        N : int
+            Number of samples.
+
+        K : int
+            Number of predictor variables.
+
+        M : int
+            Number of response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        nnz : int or None, optional, default=None
+            Number of nonzero entries of a sparse `X`. If None, `X` is dense.
+
+        Returns
+        -------
+        cost : float
+            Estimated time in seconds.
+        """
+        if algorithm == 1:
+            # Scores t = Xr and loadings p = X^T t in each component.
+            return A * 4 * (N * K if nnz is None else nnz) / self.gemv_flops
+        # XTX is formed once, and r^T XTX is computed in each component.
+        return self._cross_product_cost(N, K, nnz) + A * 2 * K**2 / self.gemv_flops
+
+    def _cross_product_cost(self, N: int, K: int, nnz: Union[None, int]) -> float:
+        """
+        Estimates the time in seconds taken to form `XTX`.
+
+        Parameters
+        ----------
+        N : int
+            Number of samples.
+
+        K : int
+            Number of predictor variables.
+
+        nnz : int or None
+            Number of nonzero entries of a sparse `X`. If None, `X` is dense.
+
+        Returns
+        -------
+        cost : float
+            Estimated time in seconds.
+        """
+        if nnz is None:
+            return N * K**2 / self.gemm_flops
+        # Each row contributes the outer product of its nonzero entries, which is
+        # bound by memory bandwidth. With a density of nnz / (N K), a row has
+        # nnz / N nonzero entries on average.
+        density = nnz / max(N * K, 1)
+        return N * (density * K) ** 2 / self.gemv_flops
+
+    def cross_validation_cost(
+        self,
+        algorithm: int,
+        N: int,
+        K: int,
+        M: int,
+        A: int,
+        validation_sizes: Iterable[int],
+        nnz: Union[None, int] = None,
+    ) -> float:
+        """
+        Estimates the time in seconds taken by the steps of fast cross-validation that
+        depend on the algorithm.
+
+        Parameters
+        ----------
+        algorithm : int
+            Whether to estimate the cost of Improved Kernel PLS Algorithm #1 or #2.
+
+        N : int
+            Total number of samples.
+
+        K : int
+            Number of predictor variables.
+
+        M : int
+            Number of response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        validation_sizes : Iterable of int
+            Number of validation samples in each fold.
+
+        nnz : int or None, optional, default=None
+            Number of nonzero entries of a sparse `X`. If None, `X` is dense.
+
+        Returns
+        -------
+        cost : float
+            Estimated time in seconds.
+        """
+        cost = 0
+        if algorithm == 2:
+            # The total XTX is formed once.
+            cost += self._cross_product_cost(N, K, nnz)
+        for validation_size in validation_sizes:
+            training_size = N - validation_size
+            # The nonzero entries are assumed to be spread evenly over the rows.
+            training_nnz = None if nnz is None else nnz * training_size // max(N, 1)
+            validation_nnz = None if nnz is None else nnz - training_nnz
+            if algorithm == 1:
+                # The training set X is copied and then used in each component.
+                cost += (
+                    2
+                    * (training_size * K if nnz is None else training_nnz)
+                    / self.gemv_flops
+                )
+                cost += self.fit_cost(1, training_size, K, M, A, training_nnz)
+            else:
+                # The validation set XTX is subtracted from the total XTX and the
+                # result is centered and scaled.
+                cost += 2 * self._cross_product_cost(
+                    validation_size, K, validation_nnz
+                )
+                cost += (3 * K**2 + A * 2 * K**2) / self.gemv_flops
+        return cost
+
+    def fits_in_memory(
+        self,
+        K: int,
+        dtype: np.floating = np.float64,
+        nnz: Union[None, int] = None,
+    ) -> bool:
+        """
+        Checks whether `XTX` fits within `memory_limit`.
+
+        Parameters
+        ----------
+        K : int
+            Number of predictor variables.
+
+        dtype : numpy.float, default=numpy.float64
+            The float datatype of `XTX`.
+
+        nnz : int or None, optional, default=None
+            Number of nonzero entries of a sparse `X`. If None, `X` is dense.
+
+        Returns
+        -------
+        fits : bool
+            Whether `XTX` fits within `memory_limit`. If `memory_limit` is None, this
+            is True for a dense `X` and whether the dense `XTX` has at most `nnz`
+            entries for a sparse `X`.
+        """
+        if self.memory_limit is not None:
+            return K**2 * np.dtype(dtype).itemsize <= self.memory_limit
+        # A sparse X is typically used because a dense X does not fit in memory, and
+        # a dense XTX that is larger than X defeats its purpose.
+        return nnz is None or K**2 <= nnz
+
+
+def select_algorithm(
+    N: int,
+    K: int,
+    M: int,
+    A: int,
+    validation_sizes: Union[None, Iterable[int]] = None,
+    cost_model: Union[None, CostModel] = None,
+    dtype: np.floating = np.float64,
+    nnz: Union[None, int] = None,
+) -> int:
+    """
+    Selects the cheaper of Improved Kernel PLS Algorithm #1 and #2 according to
+    `cost_model`.
+
+    Parameters
+    ----------
+    N : int
+        Number of samples.
+
+    K : int
+        Number of predictor variables.
+
+    M : int
+        Number of response variables.
+
+    A : int
+        Number of components in the PLS model.
+
+    validation_sizes : Iterable of int or None, optional, default=None
+        Number of validation samples in each fold. If given, the cost of fast
+        cross-validation is compared. Otherwise, the cost of a single fit is compared.
+
+    cost_model : CostModel or None, optional, default=None
+        The cost model to use. If None, a cost model with default throughputs is used.
+
+    dtype : numpy.float, default=numpy.float64
+        The float datatype used in computation. Only used to check `memory_limit`.
+
+    nnz : int or None, optional, default=None
+        Number of nonzero entries of `X` if it is a scipy.sparse matrix. If None, `X`
+        is dense.
+
+    Returns
+    -------
+    algorithm : int
+        1 or 2, whichever is estimated to be faster. If the costs are equal, 1 is
+        returned.
+    """
+    if cost_model is None:
+        cost_model = CostModel()
+    if not cost_model.fits_in_memory(K, dtype, nnz):
+        return 1
+    if validation_sizes is None:
+        costs = [
+            cost_model.fit_cost(algorithm, N, K, M, A, nnz) for algorithm in [1, 2]
+        ]
+    else:
+        validation_sizes = list(validation_sizes)
+        costs = [
+            cost_model.cross_validation_cost(
+                algorithm, N, K, M, A, validation_sizes, nnz
+            )
+            for algorithm in [1, 2]
+        ]
+    return 1 if costs[0] <= costs[1] else 2
+
+
+def make_jax_pls(
+    N: int,
+    K: int,
+    M: int,
+    A: int,
+    cost_model: Union[None, CostModel] = None,
+    **kwargs,
+):
+    """
+    Creates an instance of the JAX implementation of Improved Kernel PLS Algorithm #1
+    or #2, whichever is estimated to be faster by `select_algorithm`.
+
+    Parameters
+    ----------
+    N : int
+        Number of samples.
+
+    K : int
+        Number of predictor variables.
+
+    M : int
+        Number of response variables.
+
+    A : int
+        Number of components in the PLS model.
+
+    cost_model : CostModel or None, optional, default=None
+        The cost model to use. If None, a cost model with default throughputs is used.
+        Note that `CostModel.calibrate` measures the throughput of NumPy on the host,
+        which may differ from that of JAX on an accelerator.
+
+    **kwargs
+        Keyword arguments passed to the constructor of the selected class.
+
+    Returns
+    -------
+    pls : ikpls.jax_ikpls_alg_1.PLS or ikpls.jax_ikpls_alg_2.PLS
+        An unfitted instance of the selected class.
+    """
+    # Imported here to avoid importing JAX when only the NumPy classes are used.
+    from ikpls.jax_ikpls_alg_1 import PLS as JAX_Alg_1
+    from ikpls.jax_ikpls_alg_2 import PLS as JAX_Alg_2
+
+    dtype = kwargs.get("dtype", np.float64)
+    algorithm = select_algorithm(N, K, M, A, cost_model=cost_model, dtype=dtype)
+    pls_class = JAX_Alg_1 if algorithm == 1 else JAX_Alg_2
+    return pls_class(**kwargs)
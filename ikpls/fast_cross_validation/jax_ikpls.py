@@ -0,0 +1,722 @@
+"""
+Contains the PLS class which implements fast cross-validation with partial
+least-squares regression using Improved Kernel PLS by Dayal and MacGregor:
+https://arxiv.org/abs/2401.13185
+https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+
+The implementation is written using JAX. The training set statistics of each fold are
+derived from statistics computed once on the entire dataset by subtracting the
+contribution of the validation set. All folds share the same input shapes, so the
+cross-validation is JIT compiled only once.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+from collections.abc import Callable
+from functools import partial
+from typing import Any, Hashable, Tuple, Union
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.typing import ArrayLike, DTypeLike
+from tqdm import tqdm
+
+from ikpls.jax_ikpls_alg_1 import PLS as JAX_Alg_1
+from ikpls.jax_ikpls_alg_2 import PLS as JAX_Alg_2
+from ikpls.jax_ikpls_base import _jit_method, _StaticConfig
+
+
+class PLS:
+    """
+    Implements fast cross-validation with partial least-squares regression using
+    Improved Kernel PLS by Dayal and MacGregor:
+    https://arxiv.org/abs/2401.13185
+    https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+
+    Parameters
+    ----------
+    center_X : bool, optional default=True
+        Whether to center `X` before fitting by subtracting its row of
+        column-wise means from each row. The row of column-wise means is computed on
+        the training set for each fold to avoid data leakage.
+
+    center_Y : bool, optional default=True
+        Whether to center `Y` before fitting by subtracting its row of
+        column-wise means from each row. The row of column-wise means is computed on
+        the training set for each fold to avoid data leakage.
+
+    scale_X : bool, optional default=True
+        Whether to scale `X` before fitting by dividing each row with the row of `X`'s
+        column-wise standard deviations. Bessel's correction for the unbiased estimate
+        of the sample standard deviation is used. The row of column-wise standard
+        deviations is computed on the training set for each fold to avoid data leakage.
+
+    scale_Y : bool, optional default=True
+        Whether to scale `Y` before fitting by dividing each row with the row of `X`'s
+        column-wise standard deviations. Bessel's correction for the unbiased estimate
+        of the sample standard deviation is used. The row of column-wise standard
+        deviations is computed on the training set for each fold to avoid data leakage.
+
+    algorithm : int, default=1
+        Whether to use Improved Kernel PLS Algorithm #1 or #2.
+
+    dtype : DTypeLike, optional, default=jnp.float64
+        The float datatype to use in computation of the PLS algorithm. Using a lower
+        precision than float64 will yield significantly worse results when using an
+        increasing number of components due to propagation of numerical errors.
+
+    reverse_differentiable: bool, optional, default=False
+        Whether to make the implementation end-to-end differentiable. The
+        differentiable version is slightly slower. Results among the two versions are
+        identical.
+
+    verbose : bool, optional, default=False
+        If True, each sub-function will print when it will be JIT compiled. This can be
+        useful to track if recompilation is triggered due to passing inputs with
+        different shapes.
+
+    weight_callback : bool, optional, default=True
+        Whether to check for weights that are close to zero with a host callback in
+        every iteration. If False, no callbacks are issued inside the compiled loop,
+        and no warnings are issued.
+
+    eigensolver : str, optional, default="eigh"
+        How to compute the weight vector if there are multiple response variables.
+        If "eigh", then the smaller of the two products of the cross-covariance matrix
+        with its transpose is formed and fully eigendecomposed for each component. If
+        "lanczos", then only the dominant singular pair of the cross-covariance matrix
+        is computed with the restarted Lanczos method, warm-started from the loadings
+        of the previous component. This avoids the cubic cost of the
+        eigendecomposition if both `K` and `M` are large. The Lanczos method is not
+        reverse differentiable, so "eigh" is always used if `reverse_differentiable`
+        is True.
+
+    max_iter : int, optional, default=100
+        Maximum number of Lanczos restarts per component. Only used if `eigensolver`
+        is "lanczos".
+
+    tol : float or None, optional, default=None
+        Tolerance on the residual of the dominant eigenpair relative to its
+        eigenvalue. If None, then 1000 times the machine epsilon of `dtype` is used.
+        Only used if `eigensolver` is "lanczos".
+
+    Raises
+    ------
+    ValueError
+        If `algorithm` is not 1 or 2.
+
+        If `eigensolver` is not "eigh" or "lanczos".
+
+    Notes
+    -----
+    Any centering and scaling is undone before returning predictions to ensure that
+    predictions are on the original scale. If both centering and scaling are True, then
+    the data is first centered and then scaled.
+    """
+
+    def __init__(
+        self,
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        algorithm: int = 1,
+        dtype: DTypeLike = jnp.float64,
+        reverse_differentiable: bool = False,
+        verbose: bool = False,
+        weight_callback: bool = True,
+        eigensolver: str = "eigh",
+        max_iter: int = 100,
+        tol: Union[None, float] = None,
+    ) -> None:
+        self.center_X = center_X
+        self.center_Y = center_Y
+        self.scale_X = scale_X
+        self.scale_Y = scale_Y
+        self.algorithm = algorithm
+        self.dtype = dtype
+        self.eps = jnp.finfo(dtype).eps
+        self.reverse_differentiable = reverse_differentiable
+        self.verbose = verbose
+        self.weight_callback = weight_callback
+        self.eigensolver = eigensolver
+        self.max_iter = max_iter
+        self.tol = tol
+        self.name = f"Improved Kernel PLS Algorithm #{algorithm}"
+        if self.algorithm not in [1, 2]:
+            raise ValueError(
+                f"Invalid algorithm: {self.algorithm}. Algorithm must be 1 or 2."
+            )
+        # The centering and scaling is handled by this class. The underlying
+        # implementation is only used for the steps of the PLS algorithm. The
+        # predictions are computed from R and Q, so B is not needed.
+        pls_class = JAX_Alg_1 if self.algorithm == 1 else JAX_Alg_2
+        self.pls = pls_class(
+            center_X=False,
+            center_Y=False,
+            scale_X=False,
+            scale_Y=False,
+            dtype=dtype,
+            reverse_differentiable=reverse_differentiable,
+            verbose=verbose,
+            weight_callback=weight_callback,
+            eigensolver=eigensolver,
+            max_iter=max_iter,
+            tol=tol,
+            store_B="none",
+        )
+
+    def _static_config(self) -> _StaticConfig:
+        """
+        Returns the attributes that are read when tracing the jitted methods.
+
+        Returns
+        -------
+        config : _StaticConfig
+            The class and the parameters that determine the compiled computation.
+
+        Notes
+        -----
+        The jitted methods receive this configuration as their static `self`
+        argument, so all instances with the same configuration share compiled
+        executables. The underlying PLS instance is represented by its own
+        configuration.
+        """
+        return _StaticConfig(
+            type(self),
+            (
+                ("name", self.name),
+                ("center_X", self.center_X),
+                ("center_Y", self.center_Y),
+                ("scale_X", self.scale_X),
+                ("scale_Y", self.scale_Y),
+                ("algorithm", self.algorithm),
+                ("dtype", jnp.dtype(self.dtype)),
+                ("eps", self.eps),
+                ("reverse_differentiable", self.reverse_differentiable),
+                ("verbose", self.verbose),
+                ("weight_callback", self.weight_callback),
+                ("eigensolver", self.eigensolver),
+                ("max_iter", self.max_iter),
+                ("tol", self.tol),
+                ("pls", self.pls._static_config()),
+            ),
+        )
+
+    @partial(_jit_method, static_argnums=0)
+    def _compute_global_statistics(
+        self, X: jax.Array, Y: jax.Array
+    ) -> Tuple[
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        Union[None, jax.Array],
+        jax.Array,
+    ]:
+        """
+        Computes the statistics of the entire dataset from which the training set
+        statistics of each fold are derived. The sums of squares and products are
+        computed on `X` and `Y` shifted by their global means.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M)
+            Response variables.
+
+        Returns
+        -------
+        X_mean : Array of shape (1, K)
+            Column-wise means of `X`.
+
+        Y_mean : Array of shape (1, M)
+            Column-wise means of `Y`.
+
+        sum_sq_X : Array of shape (1, K)
+            Column-wise sums of squares of the shifted `X`.
+
+        sum_sq_Y : Array of shape (1, M)
+            Column-wise sums of squares of the shifted `Y`.
+
+        XTX : Array of shape (K, K) or None
+            Product of the transposed shifted predictor variables and the shifted
+            predictor variables. Only computed for Improved Kernel PLS Algorithm #2.
+
+        XTY : Array of shape (K, M)
+            Product of the transposed shifted predictor variables and the shifted
+            response variables.
+        """
+        if self.verbose:
+            print(f"_compute_global_statistics for {self.name} will be JIT compiled...")
+        X_mean = jnp.mean(X, axis=0, keepdims=True)
+        Y_mean = jnp.mean(Y, axis=0, keepdims=True)
+        X = X - X_mean
+        Y = Y - Y_mean
+        sum_sq_X = jnp.sum(X * X, axis=0, keepdims=True)
+        sum_sq_Y = jnp.sum(Y * Y, axis=0, keepdims=True)
+        XTX = X.T @ X if self.algorithm == 2 else None
+        XTY = X.T @ Y
+        return X_mean, Y_mean, sum_sq_X, sum_sq_Y, XTX, XTY
+
+    def _training_shift_std(
+        self,
+        validation: jax.Array,
+        sum_sq: jax.Array,
+        training_size: jax.Array,
+    ) -> Tuple[jax.Array, jax.Array]:
+        """
+        Computes the difference between the training set and global means and the
+        training set sample standard deviations by downdating the centered sums of
+        squares of the entire dataset.
+
+        Parameters
+        ----------
+        validation : Array of shape (N_val_max, K) or (N_val_max, M)
+            Validation set shifted by the global means with the padding rows set to
+            zero.
+
+        sum_sq : Array of shape (1, K) or (1, M)
+            Column-wise sums of squares of the entire dataset shifted by the global
+            means.
+
+        training_size : Array of shape ()
+            Number of samples in the training set.
+
+        Returns
+        -------
+        training_shift : Array of shape (1, K) or (1, M)
+            Training set mean minus the global mean.
+
+        training_std : Array of shape (1, K) or (1, M)
+            Sample standard deviation row of the training set. Any zero standard
+            deviations are replaced with ones.
+        """
+        training_shift = -jnp.sum(validation, axis=0, keepdims=True) / training_size
+        training_std = jnp.sqrt(
+            (
+                sum_sq
+                - jnp.sum(validation * validation, axis=0, keepdims=True)
+                - training_size * training_shift * training_shift
+            )
+            / (training_size - 1)
+        )
+        training_std = jnp.where(jnp.abs(training_std) <= self.eps, 1, training_std)
+        return training_shift, training_std
+
+    @partial(_jit_method, static_argnums=(0, 3))
+    def _stateless_fit(
+        self,
+        X: jax.Array,
+        Y: jax.Array,
+        A: int,
+        val_idxs: jax.Array,
+        val_weights: jax.Array,
+        statistics: Tuple[
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            Union[None, jax.Array],
+            jax.Array,
+        ],
+    ) -> Union[
+        Tuple[
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+        ],
+        Tuple[
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+        ],
+    ]:
+        """
+        Fits Improved Kernel PLS Algorithm #1 or #2 on the training set defined by all
+        samples not in `val_idxs` using `A` components. The training set statistics
+        are derived from `statistics` by subtracting the contribution of the
+        validation set.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M)
+            Response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        val_idxs : Array of shape (N_val_max,)
+            Indices of the validation samples padded to the size of the largest fold.
+
+        val_weights : Array of shape (N_val_max,)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+
+        statistics : tuple of arrays
+            The output of `_compute_global_statistics`.
+
+        Returns
+        -------
+        B : None
+            PLS regression coefficients tensor. Not computed as the predictions only
+            require `R` and `Q`.
+
+        W : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        P : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        T : Array of shape (A, N)
+            PLS scores matrix of X. The scores of the validation samples are zero. Only
+            Returned for Improved Kernel PLS Algorithm #1.
+
+        training_X_mean : Array of shape (1, K)
+            Mean row of training X. Will be an array of zeros if `self.center_X` is
+            False.
+
+        training_Y_mean : Array of shape (1, M)
+            Mean row of training Y. Will be an array of zeros if `self.center_Y` is
+            False.
+
+        training_X_std : Array of shape (1, K)
+            Sample standard deviation row of training X. Will be an array of ones if
+            `self.scale_X` is False. Any zero standard deviations will be replaced with
+            ones.
+
+        training_Y_std : Array of shape (1, M)
+            Sample standard deviation row of training Y. Will be an array of ones if
+            `self.scale_Y` is False. Any zero standard deviations will be replaced with
+            ones.
+        """
+        if self.verbose:
+            print(f"_stateless_fit for {self.name} will be JIT compiled...")
+        X_mean, Y_mean, sum_sq_X, sum_sq_Y, XTX, XTY = statistics
+        N, K = X.shape
+        M = Y.shape[1]
+
+        # Extract the validation set shifted by the global means with the padding rows
+        # set to zero
+        val_weights_col = val_weights.reshape(-1, 1)
+        validation_X = (jnp.take(X, val_idxs, axis=0) - X_mean) * val_weights_col
+        validation_Y = (jnp.take(Y, val_idxs, axis=0) - Y_mean) * val_weights_col
+        training_size = N - jnp.sum(val_weights)
+
+        # Compute the training set means and standard deviations. Downdating centered
+        # second moments avoids the catastrophic cancellation of downdating raw sums
+        # of squares.
+        training_X_shift, training_X_std = self._training_shift_std(
+            validation_X, sum_sq_X, training_size
+        )
+        training_Y_shift, training_Y_std = self._training_shift_std(
+            validation_Y, sum_sq_Y, training_size
+        )
+        training_X_mean = X_mean + training_X_shift
+        training_Y_mean = Y_mean + training_Y_shift
+
+        # Offsets from the training set centering to the global mean
+        X_offset = -training_X_shift if self.center_X else X_mean
+        Y_offset = -training_Y_shift if self.center_Y else Y_mean
+
+        # Subtract the validation set's contribution from the total XTY and move it to
+        # the training set centering
+        training_XTY = (
+            XTY
+            - validation_X.T @ validation_Y
+            + training_size
+            * (
+                X_offset.T @ training_Y_shift
+                + training_X_shift.T @ Y_offset
+                + X_offset.T @ Y_offset
+            )
+        )
+        if self.scale_X:
+            training_XTY = training_XTY / training_X_std.T
+        if self.scale_Y:
+            training_XTY = training_XTY / training_Y_std
+
+        if self.algorithm == 1:
+            # Weight the validation rows of X by zero instead of gathering the
+            # training rows to keep the shapes fixed
+            training_X = X
+            if self.center_X:
+                training_X = training_X - training_X_mean
+            if self.scale_X:
+                training_X = training_X / training_X_std
+            train_weights = self.pls._get_train_weights(N, val_idxs, val_weights)
+            training_X = training_X * train_weights.reshape(-1, 1)
+            matrices = self.pls._fit_main_loop(A, training_X, training_XTY)[:-2]
+        else:
+            # Subtract the validation set's contribution from the total XTX and move it
+            # to the training set centering
+            training_XTX = (
+                XTX
+                - validation_X.T @ validation_X
+                + training_size
+                * (
+                    X_offset.T @ training_X_shift
+                    + training_X_shift.T @ X_offset
+                    + X_offset.T @ X_offset
+                )
+            )
+            if self.scale_X:
+                training_XTX = training_XTX / (training_X_std.T @ training_X_std)
+            matrices = self.pls._fit_main_loop(A, training_XTX, training_XTY)[:-2]
+
+        # Use additive and multiplicative identities for means and standard deviations
+        # for centering and scaling if they are not used
+        if not self.center_X:
+            training_X_mean = jnp.zeros((1, K), dtype=self.dtype)
+        if not self.center_Y:
+            training_Y_mean = jnp.zeros((1, M), dtype=self.dtype)
+        if not self.scale_X:
+            training_X_std = jnp.ones((1, K), dtype=self.dtype)
+        if not self.scale_Y:
+            training_Y_std = jnp.ones((1, M), dtype=self.dtype)
+
+        return (
+            *matrices,
+            training_X_mean,
+            training_Y_mean,
+            training_X_std,
+            training_Y_std,
+        )
+
+    @partial(_jit_method, static_argnums=0)
+    def _stateless_predict(
+        self,
+        X: jax.Array,
+        R: jax.Array,
+        Q: jax.Array,
+        training_X_mean: jax.Array,
+        training_Y_mean: jax.Array,
+        training_X_std: jax.Array,
+        training_Y_std: jax.Array,
+    ) -> jax.Array:
+        """
+        Predicts with Improved Kernel PLS Algorithm #1 or #2 on `X` with `R` and `Q`
+        for all number of components. The scores T = X R are computed once, and the
+        predictions are cumulative sums of the outer products of the columns of T and
+        Q. This avoids the product with the regression coefficients tensor `B`.
+
+        Parameters
+        ----------
+        X : Array of shape (N_pred, K)
+            Predictor variables.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        training_X_mean : Array of shape (1, K)
+            Mean row of training X.
+
+        training_Y_mean : Array of shape (1, M)
+            Mean row of training Y.
+
+        training_X_std : Array of shape (1, K)
+            Sample standard deviation row of training X.
+
+        training_Y_std : Array of shape (1, M)
+            Sample standard deviation row of training Y.
+
+        Returns
+        -------
+        Y_pred : Array of shape (A, N_pred, M)
+            A prediction for each number of components up to `A`.
+        """
+        if self.verbose:
+            print(f"_stateless_predict for {self.name} will be JIT compiled...")
+        T = ((X - training_X_mean) / training_X_std) @ R.T
+        Y_pred = jnp.cumsum(T.T[:, :, jnp.newaxis] * Q[:, jnp.newaxis, :], axis=0)
+        return Y_pred * training_Y_std + training_Y_mean
+
+    @partial(_jit_method, static_argnums=(0, 3, 7))
+    def _stateless_fit_predict_eval(
+        self,
+        X: jax.Array,
+        Y: jax.Array,
+        A: int,
+        val_idxs: jax.Array,
+        val_weights: jax.Array,
+        statistics: Tuple[
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            jax.Array,
+            Union[None, jax.Array],
+            jax.Array,
+        ],
+        metric_function: Callable[[jax.Array, jax.Array, jax.Array], Any],
+    ) -> Any:
+        """
+        Fits on the training set defined by all samples not in `val_idxs`, predicts on
+        the validation set defined by all samples in `val_idxs`, and evaluates the
+        predictions using `metric_function`.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M)
+            Response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        val_idxs : Array of shape (N_val_max,)
+            Indices of the validation samples padded to the size of the largest fold.
+
+        val_weights : Array of shape (N_val_max,)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+
+        statistics : tuple of arrays
+            The output of `_compute_global_statistics`.
+
+        metric_function : Callable receiving arrays `Y_true`, `Y_pred`, and
+        `val_weights` and returning Any
+
+        Returns
+        -------
+        metric : Any
+            The result of evaluating `metric_function` on the validation set.
+        """
+        if self.verbose:
+            print(
+                f"_stateless_fit_predict_eval for {self.name} will be JIT compiled..."
+            )
+        matrices = self._stateless_fit(X, Y, A, val_idxs, val_weights, statistics)
+        Q, R = matrices[3:5]
+        training_X_mean, training_Y_mean, training_X_std, training_Y_std = matrices[
+            -4:
+        ]
+        Y_pred = self._stateless_predict(
+            jnp.take(X, val_idxs, axis=0),
+            R,
+            Q,
+            training_X_mean,
+            training_Y_mean,
+            training_X_std,
+            training_Y_std,
+        )
+        val_weights_col = val_weights.reshape(-1, 1)
+        return metric_function(
+            jnp.take(Y, val_idxs, axis=0) * val_weights_col,
+            Y_pred * val_weights_col,
+            val_weights,
+        )
+
+    def cross_validate(
+        self,
+        X: ArrayLike,
+        Y: ArrayLike,
+        A: int,
+        cv_splits: ArrayLike,
+        metric_function: Callable[[jax.Array, jax.Array, jax.Array], Any],
+        show_progress=True,
+    ) -> dict[Hashable, Any]:
+        """
+        Cross-validates the PLS model using `cv_splits` splits on `X` and `Y` with `A`
+        components evaluating results with `metric_function`.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M) or (N,)
+            Target variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        cv_splits : Array of shape (N,)
+            An array defining cross-validation splits. Each unique value in `cv_splits`
+            corresponds to a different fold.
+
+        metric_function : callable
+            A callable receiving arrays `Y_true` of shape (N_val_max, M), `Y_pred` of
+            shape (A, N_val_max, M), and `val_weights` of shape (N_val_max,) and
+            returning Any. Computes a metric based on true values `Y_true` and
+            predicted values `Y_pred`. `Y_pred` contains a prediction for all `A`
+            components. The validation set is padded to the size of the largest fold,
+            and `val_weights` is 1 for the validation samples and 0 for the padding
+            samples, which are zero in both `Y_true` and `Y_pred`. `metric_function`
+            must use `val_weights` to exclude the padding samples, e.g., from a mean.
+            Unlike the NumPy implementation of fast cross-validation, which passes
+            only `Y_true` and `Y_pred`, a metric function can therefore not be reused
+            between the two by mistake.
+
+        show_progress : bool, optional, default=True
+            If True, displays a progress bar for the cross-validation.
+
+        Returns
+        -------
+        metrics : dict of Hashable to Any
+            A dictionary mapping each unique value in `cv_splits` to the result of
+            evaluating `metric_function` on the validation set corresponding to that
+            value.
+
+        Notes
+        -----
+        The keys of `metrics` are sorted in ascending order of the unique values in
+        `cv_splits`.
+        """
+        X = jnp.asarray(X, dtype=self.dtype)
+        Y = jnp.asarray(Y, dtype=self.dtype)
+        if Y.ndim == 1:
+            Y = Y.reshape(-1, 1)
+        unique_splits = np.unique(np.asarray(cv_splits))
+        val_idxs, val_weights = self.pls._get_fold_masks(cv_splits)
+
+        # We can compute these once for the entire dataset and subtract the
+        # validation parts during cross-validation.
+        statistics = self._compute_global_statistics(X, Y)
+
+        metrics = {}
+        for split, fold_val_idxs, fold_val_weights in tqdm(
+            zip(unique_splits.tolist(), val_idxs, val_weights),
+            total=unique_splits.size,
+            disable=not show_progress,
+        ):
+            metrics[split] = self._stateless_fit_predict_eval(
+                X,
+                Y,
+                A,
+                fold_val_idxs,
+                fold_val_weights,
+                statistics,
+                metric_function,
+            )
+        return metrics
@@ -11,6 +11,9 @@ Author: Ole-Christian Galbo Engstrøm
 E-mail: ole.e@di.ku.dk
 """
 
+import contextlib
+import os
+import tempfile
 import warnings
 from typing import Any, Callable, Hashable, Iterable, Union
 
@@ -18,11 +21,21 @@ import joblib
 import numpy as np
 import numpy.linalg as la
 import numpy.typing as npt
-from joblib import Parallel, delayed
+import scipy.sparse as sp
+from joblib import Parallel, delayed, parallel_config
+from threadpoolctl import threadpool_limits
+
+from ikpls import sparse
+from ikpls.algorithm_selection import CostModel, select_algorithm
+from ikpls.numpy_ikpls import _cumulative_outer_products
+
+# Whether each of the documented joblib backends runs the jobs in threads of the
+# calling process rather than in separate processes.
+_BACKEND_USES_THREADS = {"loky": False, "multiprocessing": False, "threading": True}
 
 
 class PLS:
-    """
+    r"""
     Implements fast cross-validation with partial least-squares regression using
     Improved Kernel PLS by Dayal and MacGregor:
     https://arxiv.org/abs/2401.13185
@@ -52,18 +65,36 @@ class PLS:
         of the sample standard deviation is used. The row of column-wise standard
         deviations is computed on the training set for each fold to avoid data leakage.
 
-    algorithm : int, default=1
-        Whether to use Improved Kernel PLS Algorithm #1 or #2.
+    algorithm : int, str, or CostModel, default=1
+        Whether to use Improved Kernel PLS Algorithm #1, #2, or #3. Algorithm #3 is
+        the wide kernel form of PLS, which extracts the scores from the Gram matrix of
+        the training set. Unless `scale_X` is True, this is a sub-block of the global
+        Gram matrix :math:`\mathbf{X}\mathbf{X}^{\mathbf{T}}`, which is computed once.
+        It is faster than Algorithm #1 and #2 if `K` is much larger than `N`. If
+        "auto" or a CostModel, then the one of Algorithm #1 and #2 that the cost model
+        estimates to be faster for the shape and sparsity of `X`, the shape of `Y`,
+        the number of components, and the sizes of the validation sets is selected in
+        `cross_validate`. "auto" uses a cost model with default throughputs. Use
+        `CostModel.calibrate` to measure the throughputs on the host.
 
     dtype : numpy.float, default=numpy.float64
         The float datatype to use in computation of the PLS algorithm. Using a lower
         precision than float64 will yield significantly worse results when using an
         increasing number of components due to propagation of numerical errors.
 
+    store_B : str, default="all"
+        Which regression coefficients to compute for each fold. If "all", then the full
+        tensor of shape (A, K, M) is computed. If "last", then only the coefficients of
+        shape (K, M) for `A` components are computed. If "none", then no coefficients
+        are computed. The predictions on the validation set are computed from `R` and
+        `Q` and do not depend on this.
+
     Raises
     ------
     ValueError
-        If `algorithm` is not 1 or 2.
+        If `algorithm` is not 1, 2, 3, "auto", or a CostModel.
+
+        If `store_B` is not "all", "last", or "none".
 
     Notes
     -----
@@ -75,6 +106,11 @@ class PLS:
     using multiple jobs, will increase the memory consumption as each job will then
     have to keep its own copy of :math:`\mathbf{X}^{\mathbf{T}}\mathbf{X}` and
     :math:`\mathbf{X}^{\mathbf{T}}\mathbf{Y}` with its specific centering and scaling.
+
+    `X` may be a scipy.sparse matrix, which is converted to the CSR format and kept
+    sparse. The global and training set centering is then applied implicitly by
+    correcting the products with `X` with rank-one terms in the means, so no centered
+    copy of `X` or of its training and validation sets is formed.
     """
 
     def __init__(
@@ -83,8 +119,9 @@ class PLS:
         center_Y: bool = True,
         scale_X: bool = True,
         scale_Y: bool = True,
-        algorithm: int = 1,
+        algorithm: Union[int, str, CostModel] = 1,
         dtype: np.floating = np.float64,
+        store_B: str = "all",
     ) -> None:
         self.center_X = center_X
         self.center_Y = center_Y
@@ -92,11 +129,18 @@ class PLS:
         self.scale_Y = scale_Y
         self.algorithm = algorithm
         self.dtype = dtype
+        self.store_B = store_B
         self.eps = np.finfo(dtype).eps
-        self.name = f"Improved Kernel PLS Algorithm #{algorithm}"
-        if self.algorithm not in [1, 2]:
+        is_cost_model = isinstance(self.algorithm, CostModel)
+        if not is_cost_model and self.algorithm not in [1, 2, 3, "auto"]:
+            raise ValueError(
+                f"Invalid algorithm: {self.algorithm}. Algorithm must be 1, 2, 3, "
+                "'auto', or a CostModel."
+            )
+        if self.store_B not in ["all", "last", "none"]:
             raise ValueError(
-                f"Invalid algorithm: {self.algorithm}. Algorithm must be 1 or 2."
+                f"Invalid store_B: {self.store_B}. store_B must be 'all', 'last', or "
+                "'none'."
             )
         self.X = None
         self.Y = None
@@ -106,14 +150,18 @@ class PLS:
         self.M = None
         self.X_mean = None
         self.Y_mean = None
-        self.sum_X = None
-        self.sum_Y = None
         self.sum_sq_X = None
         self.sum_sq_Y = None
         self.XTX = None
         self.XTY = None
-        if self.algorithm == 1:
-            self.all_indices = None
+        if self.algorithm in [1, 2, 3]:
+            self.selected_algorithm = self.algorithm
+            self.name = f"Improved Kernel PLS Algorithm #{self.algorithm}"
+        else:
+            # The name is set once the algorithm is selected in cross_validate
+            self.selected_algorithm = None
+            self.name = "Improved Kernel PLS"
+        self.all_indices = None
 
     def _weight_warning(self, i: int) -> None:
         """
@@ -173,8 +221,8 @@ class PLS:
 
         Returns
         -------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (A, K)
             PLS weights matrix for X.
@@ -216,7 +264,6 @@ class PLS:
             residual goes below machine epsilon.
         """
 
-        B = np.zeros(shape=(self.A, self.K, self.M), dtype=self.dtype)
         WT = np.zeros(shape=(self.A, self.K), dtype=self.dtype)
         PT = np.zeros(shape=(self.A, self.K), dtype=self.dtype)
         QT = np.zeros(shape=(self.A, self.M), dtype=self.dtype)
@@ -227,7 +274,7 @@ class PLS:
         R = RT.T
 
         validation_size = validation_indices.size
-        if self.algorithm == 1:
+        if self.selected_algorithm in [1, 3]:
             TT = np.zeros(shape=(self.A, self.N - validation_size), dtype=self.dtype)
             T = TT.T
 
@@ -235,163 +282,227 @@ class PLS:
         validation_X = self.X[validation_indices]
         validation_Y = self.Y[validation_indices]
 
-        if self.center_X or self.center_Y or self.scale_X or self.scale_Y:
-            training_size = self.N - validation_size
-            N_total_over_N_train = self.N / training_size
-            N_val_over_N_train = validation_size / training_size
-
-        # Compute the training set means
-        if self.center_X or self.center_Y or self.scale_X:
-            training_X_mean = (
-                N_total_over_N_train * self.X_mean
-                - N_val_over_N_train * np.mean(validation_X, axis=0, keepdims=True)
-            )
-        if self.center_X or self.center_Y or self.scale_Y:
-            training_Y_mean = (
-                N_total_over_N_train * self.Y_mean
-                - N_val_over_N_train * np.mean(validation_Y, axis=0, keepdims=True)
+        training_size = self.N - validation_size
+        preprocess = self.center_X or self.center_Y or self.scale_X or self.scale_Y
+
+        # The global products are computed on X and Y shifted by their global means.
+        # The training set statistics are derived from them by downdating centered
+        # second moments and correcting with rank-one terms in the difference between
+        # the training and global means. This avoids the catastrophic cancellation of
+        # downdating raw sums of squares.
+        # A sparse validation set is shifted implicitly to keep it sparse
+        validation_X_offset = None
+        if preprocess:
+            if sp.issparse(validation_X):
+                validation_X_offset = self.X_mean
+                validation_X_sum = sparse.column_sums(validation_X, self.X_mean)
+            else:
+                validation_X = validation_X - self.X_mean
+                validation_X_sum = np.expand_dims(
+                    np.einsum("ij -> j", validation_X), axis=0
+                )
+            validation_Y = validation_Y - self.Y_mean
+            training_X_shift = -validation_X_sum / training_size
+            training_Y_shift = (
+                -np.expand_dims(np.einsum("ij -> j", validation_Y), axis=0)
+                / training_size
             )
 
-        # Compute the training set standard deviations for X
+            # Compute the training set means
+            training_X_mean = self.X_mean + training_X_shift
+            training_Y_mean = self.Y_mean + training_Y_shift
+
+            # Offsets from the training set centering to the global mean
+            X_offset = -training_X_shift if self.center_X else self.X_mean
+            Y_offset = -training_Y_shift if self.center_Y else self.Y_mean
+
+        # Compute the training set standard deviations for X. Sums of squares within
+        # the rounding errors of the downdate, which grow with the number of samples,
+        # belong to columns that are constant in the training set.
         if self.scale_X:
-            train_sum_X = self.sum_X - np.expand_dims(
-                np.einsum("ij -> j", validation_X), axis=0
-            )
-            train_sum_sq_X = self.sum_sq_X - np.expand_dims(
-                np.einsum("ij,ij -> j", validation_X, validation_X), axis=0
-            )
-            training_X_std = np.sqrt(
-                1
-                / (training_size - 1)
-                * (
-                    -2 * training_X_mean * train_sum_X
-                    + training_size
-                    * np.einsum("ij,ij -> ij", training_X_mean, training_X_mean)
-                    + train_sum_sq_X
-                )
+            training_X_sum_sq = (
+                self.sum_sq_X
+                - sparse.column_sums_of_squares(validation_X, validation_X_offset)
+                - training_size * training_X_shift**2
             )
+            tol = self.N * self.eps * self.sum_sq_X
+            training_X_sum_sq[training_X_sum_sq <= tol] = 0
+            training_X_std = np.sqrt(training_X_sum_sq / (training_size - 1))
             training_X_std[np.abs(training_X_std) <= self.eps] = 1
 
         # Compute the training set standard deviations for Y
         if self.scale_Y:
-            train_sum_Y = self.sum_Y - np.expand_dims(
-                np.einsum("ij -> j", validation_Y), axis=0
-            )
-            train_sum_sq_Y = self.sum_sq_Y - np.expand_dims(
-                np.einsum("ij,ij -> j", validation_Y, validation_Y), axis=0
-            )
-            training_Y_std = np.sqrt(
-                1
-                / (training_size - 1)
-                * (
-                    -2 * training_Y_mean * train_sum_Y
-                    + training_size
-                    * np.einsum("ij,ij -> ij", training_Y_mean, training_Y_mean)
-                    + train_sum_sq_Y
+            training_Y_sum_sq = (
+                self.sum_sq_Y
+                - np.expand_dims(
+                    np.einsum("ij,ij -> j", validation_Y, validation_Y), axis=0
                 )
+                - training_size * training_Y_shift**2
             )
+            tol = self.N * self.eps * self.sum_sq_Y
+            training_Y_sum_sq[training_Y_sum_sq <= tol] = 0
+            training_Y_std = np.sqrt(training_Y_sum_sq / (training_size - 1))
             training_Y_std[np.abs(training_Y_std) <= self.eps] = 1
 
-        # Subtract the validation set's contribution from the total XTY
-        training_XTY = self.XTY - validation_X.T @ validation_Y
-
-        # Apply the training set centering
-        if self.center_X or self.center_Y:
-            # Apply the training set centering
-            training_XTY = training_XTY - training_size * (
-                training_X_mean.T @ training_Y_mean
+        # Subtract the validation set's contribution from the total XTY. Algorithm #3
+        # extracts the components from the Gram matrix and does not use XTY.
+        if self.selected_algorithm != 3:
+            training_XTY = self.XTY - sparse.transpose_product(
+                validation_X, validation_Y, validation_X_offset
             )
 
-        # Apply the training set scaling
-        if self.scale_X and self.scale_Y:
-            divisor = training_X_std.T @ training_Y_std
-        elif self.scale_X:
-            divisor = training_X_std.T
-        elif self.scale_Y:
-            divisor = training_Y_std
-        if self.scale_X or self.scale_Y:
-            training_XTY = training_XTY / divisor
-
-        # If algorithm is 1, extract training set X
-        if self.algorithm == 1:
+            # Move the products to the training set centering
+            if preprocess:
+                training_XTY = training_XTY + training_size * (
+                    X_offset.T @ training_Y_shift
+                    + training_X_shift.T @ Y_offset
+                    + X_offset.T @ Y_offset
+                )
+
+            # Apply the training set scaling
+            if self.scale_X and self.scale_Y:
+                divisor = training_X_std.T @ training_Y_std
+            elif self.scale_X:
+                divisor = training_X_std.T
+            elif self.scale_Y:
+                divisor = training_Y_std
+            if self.scale_X or self.scale_Y:
+                training_XTY = training_XTY / divisor
+
+        # If algorithm is 1 or 3, extract training set X
+        if self.selected_algorithm in [1, 3]:
             training_indices = np.setdiff1d(self.all_indices,
                                             validation_indices,
                                             assume_unique=True)
             training_X = self.X[training_indices]
-            if self.center_X:
-                # Apply the training set centering
-                training_X = training_X - training_X_mean
-            if self.scale_X:
-                # Apply the training set scaling
-                training_X = training_X / training_X_std
+            training_X_offset = None
+            if sp.issparse(training_X):
+                # Apply the training set scaling to the nonzero entries and the
+                # training set centering implicitly
+                if self.center_X:
+                    training_X_offset = training_X_mean
+                if self.scale_X:
+                    training_X = sparse.scale_columns(training_X, training_X_std)
+                    if self.center_X:
+                        training_X_offset = training_X_offset / training_X_std
+            else:
+                if self.center_X:
+                    # Apply the training set centering
+                    training_X = training_X - training_X_mean
+                if self.scale_X:
+                    # Apply the training set scaling
+                    training_X = training_X / training_X_std
 
         # If algorithm is 2, derive training set XTX from total XTX and validation XTX
         else:
-            training_XTX = self.XTX - validation_X.T @ validation_X
-            if self.center_X:
-                # Apply the training set centering
-                training_XTX = training_XTX - training_size * (
-                    training_X_mean.T @ training_X_mean
+            training_XTX = self.XTX - sparse.cross_product(
+                validation_X, validation_X_offset
+            )
+            if preprocess:
+                # Move the products to the training set centering
+                training_XTX = training_XTX + training_size * (
+                    X_offset.T @ training_X_shift
+                    + training_X_shift.T @ X_offset
+                    + X_offset.T @ X_offset
                 )
             if self.scale_X:
                 # Apply the training set scaling
                 training_XTX = training_XTX / (training_X_std.T @ training_X_std)
 
-        # Execute Improved Kernel PLS steps 2-5
-        for i in range(self.A):
-            # Step 2
-            if self.M == 1:
-                norm = la.norm(training_XTY, ord=2)
-                if np.isclose(norm, 0, atol=self.eps, rtol=0):
-                    self._weight_warning(i)
-                    break
-                w = training_XTY / norm
+        # If algorithm is 3, extract training set Y and the training set Gram matrix
+        if self.selected_algorithm == 3:
+            training_Y = self.Y[training_indices]
+            if self.center_Y:
+                training_Y = training_Y - training_Y_mean
+            if self.scale_Y:
+                training_Y = training_Y / training_Y_std
+            if self.scale_X:
+                # The training set scaling cannot be applied to a sub-block of the
+                # global Gram matrix
+                training_XXT = sparse.gram(training_X, training_X_offset)
             else:
-                if self.M < self.K:
-                    training_XTYTtraining_XTY = training_XTY.T @ training_XTY
-                    eig_vals, eig_vecs = la.eigh(training_XTYTtraining_XTY)
-                    q = eig_vecs[:, -1:]
-                    w = training_XTY @ q
-                    norm = la.norm(w)
+                training_XXT = self.XXT[np.ix_(training_indices, training_indices)]
+                if self.center_X:
+                    # Double centering applies the training set centering
+                    row_means = training_XXT.mean(axis=1, keepdims=True)
+                    training_XXT = (
+                        training_XXT - row_means - row_means.T + row_means.mean()
+                    )
+
+        # Execute Improved Kernel PLS steps 2-5
+        if self.selected_algorithm == 3:
+            self._kernel_steps(
+                training_X,
+                training_Y,
+                training_XXT,
+                WT,
+                PT,
+                QT,
+                RT,
+                TT,
+                training_X_offset,
+            )
+        else:
+            for i in range(self.A):
+                # Step 2
+                if self.M == 1:
+                    norm = la.norm(training_XTY, ord=2)
                     if np.isclose(norm, 0, atol=self.eps, rtol=0):
                         self._weight_warning(i)
                         break
-                    w = w / norm
+                    w = training_XTY / norm
                 else:
-                    training_XTYYTX = training_XTY @ training_XTY.T
-                    eig_vals, eig_vecs = la.eigh(training_XTYYTX)
-                    norm = eig_vals[-1]
-                    if np.isclose(norm, 0, atol=self.eps, rtol=0):
-                        self._weight_warning(i)
-                        break
-                    w = eig_vecs[:, -1:]
-            WT[i] = w.squeeze()
-
-            # Step 3
-            r = np.copy(w)
-            for j in range(i):
-                r = r - PT[j].reshape(-1, 1).T @ w * RT[j].reshape(-1, 1)
-            RT[i] = r.squeeze()
-
-            # Step 4
-            if self.algorithm == 1:
-                t = training_X @ r
-                TT[i] = t.squeeze()
-                tTt = t.T @ t
-                p = (t.T @ training_X).T / tTt
-            elif self.algorithm == 2:
-                rtraining_XTX = r.T @ training_XTX
-                tTt = rtraining_XTX @ r
-                p = rtraining_XTX.T / tTt
-            q = (r.T @ training_XTY).T / tTt
-            PT[i] = p.squeeze()
-            QT[i] = q.squeeze()
-
-            # Step 5
-            training_XTY = training_XTY - (p @ q.T) * tTt
-
-            # Compute regression coefficients
-            B[i] = B[i - 1] + r @ q.T
+                    if self.M < self.K:
+                        training_XTYTtraining_XTY = training_XTY.T @ training_XTY
+                        eig_vals, eig_vecs = la.eigh(training_XTYTtraining_XTY)
+                        q = eig_vecs[:, -1:]
+                        w = training_XTY @ q
+                        norm = la.norm(w)
+                        if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                            self._weight_warning(i)
+                            break
+                        w = w / norm
+                    else:
+                        training_XTYYTX = training_XTY @ training_XTY.T
+                        eig_vals, eig_vecs = la.eigh(training_XTYYTX)
+                        norm = eig_vals[-1]
+                        if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                            self._weight_warning(i)
+                            break
+                        w = eig_vecs[:, -1:]
+                WT[i] = w.squeeze()
+
+                # Step 3
+                r = w - RT[:i].T @ (PT[:i] @ w)
+                RT[i] = r.squeeze()
+
+                # Step 4
+                if self.selected_algorithm == 1:
+                    t = sparse.product(training_X, r, training_X_offset)
+                    TT[i] = t.squeeze()
+                    tTt = t.T @ t
+                    p = sparse.transpose_product(
+                        training_X, t / tTt, training_X_offset
+                    )
+                elif self.selected_algorithm == 2:
+                    rtraining_XTX = r.T @ training_XTX
+                    tTt = rtraining_XTX @ r
+                    p = rtraining_XTX.T / tTt
+                q = (r.T @ training_XTY).T / tTt
+                PT[i] = p.squeeze()
+                QT[i] = q.squeeze()
+
+                # Step 5
+                training_XTY = training_XTY - (p @ q.T) * tTt
+
+        # Compute regression coefficients. Components after an early stop have zero
+        # weights and thus repeat the coefficients of the last extracted component.
+        if self.store_B == "all":
+            B = _cumulative_outer_products(RT, QT)
+        elif self.store_B == "last":
+            B = R @ QT
+        else:
+            B = None
 
         # Use additive and multiplicative identities for means and standard deviations
         # for centering and scaling if they are not used
@@ -405,7 +516,7 @@ class PLS:
             training_Y_std = np.ones((1, self.M))
 
         # Return PLS matrices and training set statistics
-        if self.algorithm == 1:
+        if self.selected_algorithm in [1, 3]:
             return (
                 B,
                 W,
@@ -430,10 +541,118 @@ class PLS:
             training_Y_std,
         )
 
+    def _kernel_steps(
+        self,
+        training_X: npt.NDArray[np.floating],
+        training_Y: npt.NDArray[np.floating],
+        training_XXT: npt.NDArray[np.floating],
+        WT: npt.NDArray[np.floating],
+        PT: npt.NDArray[np.floating],
+        QT: npt.NDArray[np.floating],
+        RT: npt.NDArray[np.floating],
+        TT: npt.NDArray[np.floating],
+        training_X_offset: Union[None, npt.NDArray[np.floating]] = None,
+    ) -> None:
+        """
+        Executes the wide kernel form of PLS (Algorithm #3) on the training set Gram
+        matrix and fills the PLS matrices in place. The weights and loadings in the
+        space of the predictor variables are computed after the loop with a single
+        product with `training_X`.
+
+        Parameters
+        ----------
+        training_X : Array or scipy.sparse matrix of shape (N_train, K)
+            Preprocessed training set predictor variables.
+
+        training_Y : Array of shape (N_train, M)
+            Preprocessed training set response variables.
+
+        training_XXT : Array of shape (N_train, N_train)
+            Gram matrix of the preprocessed training set predictor variables.
+
+        WT : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        PT : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        QT : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        RT : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        TT : Array of shape (A, N_train)
+            PLS scores matrix of X.
+
+        training_X_offset : Array of shape (1, K) or None, optional, default=None
+            Row implicitly subtracted from each row of a sparse `training_X` to center
+            it. If None, `training_X` is used as is.
+
+        Returns
+        -------
+        None.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+        """
+        VT = np.zeros_like(TT)
+        tTts = np.ones(shape=(self.A, 1), dtype=self.dtype)
+        YTXXTY = training_Y.T @ training_XXT @ training_Y
+        for i in range(self.A):
+            # Step 2
+            if self.M == 1:
+                u = training_Y
+            else:
+                eig_vals, eig_vecs = la.eigh(YTXXTY)
+                u = training_Y @ eig_vecs[:, -1:]
+            XXTu = training_XXT @ u
+            norm = np.sqrt(max((u.T @ XXTu).item(), 0))
+            if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                self._weight_warning(i)
+                break
+
+            # Step 3
+            v = u - TT[:i].T @ ((TT[:i] @ u) / tTts[:i])
+            VT[i] = v.squeeze() / norm
+
+            # Step 4
+            t = XXTu / norm
+            TT[i] = t.squeeze()
+            tTt = t.T @ t
+            tTts[i] = tTt
+            QT[i] = ((training_Y.T @ t) / tTt).squeeze()
+
+            # Step 5
+            XXTt = training_XXT @ t
+            c = (t.T @ XXTt) / tTt**2
+            training_XXT = (
+                training_XXT - (t @ XXTt.T + XXTt @ t.T) / tTt + c * (t @ t.T)
+            )
+            YTt = training_Y.T @ t
+            YTXXTt = training_Y.T @ XXTt
+            YTXXTY = (
+                YTXXTY - (YTt @ YTXXTt.T + YTXXTt @ YTt.T) / tTt + c * (YTt @ YTt.T)
+            )
+
+        # Compute the weights and the X loadings from X
+        WP = sparse.transpose_product(
+            training_X, np.concatenate([VT, TT]).T, training_X_offset
+        ).T
+        WT[:] = WP[: self.A]
+        PT[:] = WP[self.A :] / tTts
+        for i in range(self.A):
+            RT[i] = WT[i] - RT[:i].T @ (PT[:i] @ WT[i])
+
     def _stateless_predict(
         self,
         indices: npt.NDArray[np.int_],
-        B: npt.NDArray[np.floating],
+        B: Union[None, npt.NDArray[np.floating]],
+        R: npt.NDArray[np.floating],
+        Q: npt.NDArray[np.floating],
         training_X_mean: npt.NDArray[np.floating],
         training_Y_mean: npt.NDArray[np.floating],
         training_X_std: npt.NDArray[np.floating],
@@ -451,8 +670,15 @@ class PLS:
             Integer array defining indices into X and Y corresponding to samples on
             which to predict.
 
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor as returned by `_stateless_fit`. Only
+            used if `n_components` is not None.
+
+        R : Array of shape (K, A)
+            PLS weights matrix to compute scores T directly from original X.
+
+        Q : Array of shape (M, A)
+            PLS Loadings matrix for Y.
 
         training_X_mean : Array of shape (1, K)
             Mean row of training X. If self.center_X is False, then this should be an
@@ -489,15 +715,36 @@ class PLS:
         """
 
         predictor_variables = self.X[indices]
-        # Apply the potential training set centering and scaling
-        predictor_variables = (predictor_variables - training_X_mean) / training_X_std
+        if sp.issparse(predictor_variables):
+            # Apply the potential training set scaling to the nonzero entries and the
+            # potential training set centering implicitly
+            X_offset = training_X_mean / training_X_std
+            predictor_variables = sparse.scale_columns(
+                predictor_variables, training_X_std
+            )
+        else:
+            # Apply the potential training set centering and scaling
+            X_offset = None
+            predictor_variables = (
+                predictor_variables - training_X_mean
+            ) / training_X_std
         if n_components is None:
-            Y_pred = predictor_variables @ B
+            # Cumulative sums of the rank one contributions of each component avoid
+            # the product with the (A, K, M) tensor B.
+            T = sparse.product(predictor_variables, R, X_offset)
+            Y_pred = _cumulative_outer_products(T.T, Q.T)
+        elif B is not None and B.ndim == 3:
+            Y_pred = sparse.product(predictor_variables, B[n_components - 1], X_offset)
+        elif B is not None and n_components == self.A:
+            Y_pred = sparse.product(predictor_variables, B, X_offset)
         else:
-            Y_pred = predictor_variables @ B[n_components - 1]
+            T = sparse.product(predictor_variables, R[:, :n_components], X_offset)
+            Y_pred = T @ Q[:, :n_components].T
         # Multiply by the potential training set scale and add the potential training
         # set bias
-        return Y_pred * training_Y_std + training_Y_mean
+        Y_pred *= training_Y_std
+        Y_pred += training_Y_mean
+        return Y_pred
 
     def _stateless_fit_predict_eval(
         self,
@@ -528,7 +775,7 @@ class PLS:
             The result of evaluating `metric_function` on the validation set.
         """
         matrices = self._stateless_fit(validation_indices)
-        B = matrices[0]
+        B, _, _, Q, R = matrices[:5]
         training_X_mean = matrices[-4]
         training_Y_mean = matrices[-3]
         training_X_std = matrices[-2]
@@ -536,6 +783,8 @@ class PLS:
         Y_pred = self._stateless_predict(
             validation_indices,
             B,
+            R,
+            Q,
             training_X_mean,
             training_Y_mean,
             training_X_std,
@@ -571,6 +820,136 @@ class PLS:
             index_dict[key] = np.asarray(index_dict[key], dtype=int)
         return index_dict
 
+    def _compute_global_products(self, block_size: int = 2**22) -> None:
+        """
+        Computes `XTY` (for Improved Kernel PLS Algorithm #1 and #2), `XTX` (for
+        Algorithm #2), `XXT` (for Algorithm #3 without scaling of `X`), and the
+        column-wise sums of squares of
+        the entire dataset. If any centering or scaling is applied, the products are
+        computed on `X` and `Y` shifted by their global means. The rows, or the
+        columns for `XXT`, are processed in blocks to avoid a shifted copy of `X`.
+
+        Parameters
+        ----------
+        block_size : int, optional, default=2**22
+            Approximate number of elements of `X` in each block.
+
+        Returns
+        -------
+        None.
+        """
+        self.XTY = (
+            np.zeros(shape=(self.K, self.M), dtype=self.dtype)
+            if self.selected_algorithm != 3
+            else None
+        )
+        self.XTX = (
+            np.zeros(shape=(self.K, self.K), dtype=self.dtype)
+            if self.selected_algorithm == 2
+            else None
+        )
+        self.XXT = None
+        self.sum_sq_X = (
+            np.zeros(shape=(1, self.K), dtype=self.dtype) if self.scale_X else None
+        )
+        self.sum_sq_Y = (
+            np.zeros(shape=(1, self.M), dtype=self.dtype) if self.scale_Y else None
+        )
+        if sp.issparse(self.X):
+            self._compute_sparse_global_products()
+            return
+        rows_per_block = max(block_size // self.K, 1)
+        for start in range(0, self.N, rows_per_block):
+            X_block = self.X[start : start + rows_per_block]
+            Y_block = self.Y[start : start + rows_per_block]
+            if self.X_mean is not None:
+                X_block = X_block - self.X_mean
+                Y_block = Y_block - self.Y_mean
+            if self.XTY is not None:
+                self.XTY += X_block.T @ Y_block
+            if self.XTX is not None:
+                self.XTX += X_block.T @ X_block
+            if self.scale_X:
+                self.sum_sq_X += np.einsum("ij,ij -> j", X_block, X_block)
+            if self.scale_Y:
+                self.sum_sq_Y += np.einsum("ij,ij -> j", Y_block, Y_block)
+
+        # The Gram matrices of the training sets are sub-blocks of the global Gram
+        # matrix unless the training set scaling must be applied to X.
+        if self.selected_algorithm == 3 and not self.scale_X:
+            self.XXT = np.zeros(shape=(self.N, self.N), dtype=self.dtype)
+            columns_per_block = max(block_size // self.N, 1)
+            for start in range(0, self.K, columns_per_block):
+                X_block = self.X[:, start : start + columns_per_block]
+                if self.center_X:
+                    X_block = (
+                        X_block - self.X_mean[:, start : start + columns_per_block]
+                    )
+                self.XXT += X_block @ X_block.T
+
+    def _compute_sparse_global_products(self) -> None:
+        """
+        Computes the same global products as `_compute_global_products` for a sparse
+        `X`. The shift by the global means is applied implicitly with rank-one
+        corrections, so `X` stays sparse.
+
+        Returns
+        -------
+        None.
+        """
+        X_offset = self.X_mean
+        Y = self.Y if self.Y_mean is None else self.Y - self.Y_mean
+        if self.selected_algorithm != 3:
+            self.XTY = sparse.transpose_product(self.X, Y, X_offset)
+        if self.selected_algorithm == 2:
+            self.XTX = sparse.cross_product(self.X, X_offset)
+        if self.scale_X:
+            self.sum_sq_X = sparse.column_sums_of_squares(self.X, X_offset)
+        if self.scale_Y:
+            self.sum_sq_Y = np.expand_dims(np.einsum("ij,ij -> j", Y, Y), axis=0)
+        if self.selected_algorithm == 3 and not self.scale_X:
+            self.XXT = sparse.gram(self.X, X_offset if self.center_X else None)
+
+    def _share_arrays(self, folder: str) -> dict[str, npt.NDArray[np.floating]]:
+        """
+        Replaces the arrays used by the workers with read-only memory maps of
+        copies written to `folder`.
+
+        Parameters
+        ----------
+        folder : str
+            Folder in which to write the arrays.
+
+        Returns
+        -------
+        originals : dict of str to Array
+            A dictionary mapping the name of each replaced attribute to its original
+            array.
+        """
+        originals = {}
+        for name in (
+            "X",
+            "Y",
+            "XTX",
+            "XTY",
+            "XXT",
+            "X_mean",
+            "Y_mean",
+            "sum_sq_X",
+            "sum_sq_Y",
+            "all_indices",
+        ):
+            array = getattr(self, name, None)
+            # Sparse matrices cannot be memory-mapped and are sent to each worker
+            if array is None or sp.issparse(array):
+                continue
+            path = os.path.join(folder, f"{name}.npy")
+            np.save(path, array)
+            originals[name] = array
+            # joblib sends file-backed memory maps to the workers by reference.
+            setattr(self, name, np.load(path, mmap_mode="r"))
+        return originals
+
     def cross_validate(
         self,
         X: npt.ArrayLike,
@@ -580,6 +959,10 @@ class PLS:
         metric_function: Callable[[npt.ArrayLike, npt.ArrayLike], Any],
         n_jobs=-1,
         verbose=10,
+        shared_memory: bool = False,
+        temp_folder: Union[None, str] = None,
+        backend: Union[None, str] = None,
+        blas_threads: Union[None, int] = None,
     ) -> dict[Hashable, Any]:
         """
         Cross-validates the PLS model using `cv_splits` splits on `X` and `Y` with
@@ -587,7 +970,7 @@ class PLS:
 
         Parameters
         ----------
-        X : Array of shape (N, K)
+        X : Array or scipy.sparse matrix of shape (N, K)
             Predictor variables.
 
         Y : Array of shape (N, M) or (N,)
@@ -608,11 +991,49 @@ class PLS:
 
         n_jobs : int, optional default=-1
             Number of parallel jobs to use. A value of -1 will use the minimum of all
-            available cores and the number of unique values in `cv_splits`.
+            available cores and the number of unique values in `cv_splits`. If
+            `blas_threads` is set, a value of -1 will instead use the number of
+            available cores divided by `blas_threads`, so that `n_jobs` times
+            `blas_threads` does not exceed the number of available cores.
 
         verbose : int, optional default=10
             Controls verbosity of parallel jobs.
 
+        shared_memory : bool, optional default=False
+            If True, `X`, `Y`, `XTX`, `XTY`, and the column-wise sums of squares and
+            means are written once to read-only memory-mapped files before the
+            parallel jobs are dispatched. Each worker process then maps the same
+            physical pages instead of receiving its own copy, and only the
+            validation indices are sent with each job. This bounds memory usage
+            when `XTX` is large. The files are deleted when cross-validation
+            finishes. A sparse `X` cannot be memory-mapped and is sent to each
+            worker process.
+
+        temp_folder : str or None, optional default=None
+            Folder in which to create the memory-mapped files when
+            `shared_memory=True`. If None, `/dev/shm` is used if it exists, and the
+            default temporary folder of the system is used otherwise.
+
+        backend : str or None, optional default=None
+            The joblib backend used to run the parallel jobs. Must be None, "loky",
+            "multiprocessing", or "threading". If None, the backend active in the
+            calling context is used, e.g., one set with `joblib.parallel_config`,
+            which defaults to "loky". "loky" and "multiprocessing" run each job in a
+            separate worker process. "threading" runs the jobs in threads of the
+            calling process. The threads share a single copy of all arrays,
+            and the work in each fold is dominated by BLAS and LAPACK calls that
+            release the GIL. `shared_memory` has no effect with thread-based
+            backends.
+
+        blas_threads : int or None, optional default=None
+            Maximum number of threads that BLAS may use within each parallel job. If
+            None, the BLAS thread count is left untouched. Setting this avoids
+            oversubscription when `n_jobs` is large. With `backend="loky"`, the
+            limit is passed to joblib as `inner_max_num_threads`, which only takes
+            effect with the loky backend. With a thread-based backend, the limit is
+            applied to the calling process while the jobs run. With any other
+            backend, each job applies the limit itself.
+
         Returns
         -------
         metrics : dict of Hashable to Any
@@ -620,6 +1041,11 @@ class PLS:
             evaluating `metric_function` on the validation set corresponding to that
             value.
 
+        Raises
+        ------
+        ValueError
+            If `backend` is not None, "loky", "multiprocessing", or "threading".
+
         Notes
         -----
         The order of cross-validation folds is determined by the order of the unique
@@ -627,7 +1053,33 @@ class PLS:
         same order.
         """
 
-        self.X = np.asarray(X, dtype=self.dtype)
+        if backend is not None and backend not in _BACKEND_USES_THREADS:
+            raise ValueError(
+                f"Unknown backend {backend!r}. Expected None or one of "
+                f"{sorted(_BACKEND_USES_THREADS)}."
+            )
+        if backend is None:
+            # joblib has no public accessor for the active backend, but a Parallel
+            # object picks it up on construction. If it cannot be read, processes
+            # are assumed, for which each job applies the BLAS limit itself.
+            active_backend = getattr(Parallel(), "_backend", None)
+            uses_threads = getattr(active_backend, "uses_threads", False) is True
+        else:
+            uses_threads = _BACKEND_USES_THREADS[backend]
+        # The loky backend limits the BLAS threads of its worker processes, and
+        # thread-based backends share the limit of the calling process. Jobs run by
+        # any other backend apply the limit themselves.
+        limit_in_jobs = (
+            blas_threads is not None and not uses_threads and backend != "loky"
+        )
+
+        if sp.issparse(X):
+            # Row indexing is efficient in the CSR format
+            self.X = sparse.as_sparse(X, self.dtype).tocsr()
+        else:
+            self.X = np.asarray(X, dtype=self.dtype)
+        if sp.issparse(Y):
+            Y = Y.toarray()
         self.Y = np.asarray(Y, dtype=self.dtype)
         if self.Y.ndim == 1:
             self.Y = self.Y.reshape(-1, 1)
@@ -637,59 +1089,107 @@ class PLS:
         validation_indices_dict = self._generate_validation_indices_dict(cv_splits)
         num_splits = len(validation_indices_dict)
 
-        if self.algorithm == 1:
+        if self.algorithm == "auto" or isinstance(self.algorithm, CostModel):
+            self.selected_algorithm = select_algorithm(
+                self.N,
+                self.K,
+                self.M,
+                A,
+                validation_sizes=[
+                    indices.size for indices in validation_indices_dict.values()
+                ],
+                cost_model=None if self.algorithm == "auto" else self.algorithm,
+                dtype=self.dtype,
+                nnz=self.X.nnz if sp.issparse(self.X) else None,
+            )
+            self.name = f"Improved Kernel PLS Algorithm #{self.selected_algorithm}"
+
+        if self.selected_algorithm in [1, 3]:
             self.all_indices = np.arange(self.N, dtype=int)
 
         if n_jobs == -1:
-            n_jobs = min(joblib.cpu_count(), num_splits)
+            n_cores = joblib.cpu_count()
+            if blas_threads is not None:
+                n_cores = max(n_cores // blas_threads, 1)
+            n_jobs = min(n_cores, num_splits)
 
         print(
-            f"Cross-validating Improved Kernel PLS Algorithm {self.algorithm} with {A}"
-            f" components on {num_splits} unique splits using {n_jobs} "
-            f"parallel processes."
+            "Cross-validating Improved Kernel PLS Algorithm "
+            f"{self.selected_algorithm} with {A} components on {num_splits} unique "
+            f"splits using {n_jobs} "
+            f"parallel {'threads' if uses_threads else 'processes'}."
         )
 
         # We can compute these once for the entire dataset and subtract the
         # validation parts during cross-validation.
-        if self.center_X or self.center_Y or self.scale_X:
-            self.X_mean = np.mean(self.X, axis=0, keepdims=True)
-        if self.center_X or self.center_Y or self.scale_Y:
-            self.Y_mean = np.mean(self.Y, axis=0, keepdims=True)
-        if self.scale_X:
-            self.sum_X = np.expand_dims(np.einsum("ij->j", self.X), axis=0)
-            self.sum_sq_X = np.expand_dims(
-                np.einsum("ij,ij->j", self.X, self.X), axis=0
-            )
-        if self.scale_Y:
-            self.sum_Y = np.expand_dims(np.einsum("ij->j", self.Y), axis=0)
-            self.sum_sq_Y = np.expand_dims(
-                np.einsum("ij,ij->j", self.Y, self.Y), axis=0
-            )
+        if self.center_X or self.center_Y or self.scale_X or self.scale_Y:
+            if sp.issparse(self.X):
+                self.X_mean = sparse.column_sums(self.X) / self.N
+            else:
+                self.X_mean = np.mean(self.X, axis=0, dtype=self.dtype, keepdims=True)
+            self.Y_mean = np.mean(self.Y, axis=0, dtype=self.dtype, keepdims=True)
+        else:
+            self.X_mean = None
+            self.Y_mean = None
 
         if verbose > 0:
             print("Computing total XTY...")
-        self.XTY = self.X.T @ self.Y
+        self._compute_global_products()
         if verbose > 0:
             print("Done!")
-        if self.algorithm == 2:
-            if verbose > 0:
-                print("Computing total XTX...")
-            self.XTX = self.X.T @ self.X
-            if verbose > 0:
-                print("Done!")
 
         def worker(validation_indices: npt.NDArray[np.int_],
                    metric_function: Callable[[npt.ArrayLike, npt.ArrayLike], Any]
                    ) -> Any:
-            return self._stateless_fit_predict_eval(
+            if limit_in_jobs:
+                limits = threadpool_limits(limits=blas_threads, user_api="blas")
+            else:
+                limits = contextlib.nullcontext()
+            with limits:
+                return self._stateless_fit_predict_eval(
                     validation_indices,
                     metric_function
-                   )
+                )
 
-        metrics_list = Parallel(n_jobs=n_jobs, verbose=verbose)(
-            delayed(worker)(validation_indices, metric_function)
-            for validation_indices in validation_indices_dict.values()
-        )
+        def run_parallel() -> list[Any]:
+            if blas_threads is not None and uses_threads:
+                # The BLAS thread pool is shared by all threads in the process, so
+                # the limit is applied to this process.
+                limits = threadpool_limits(limits=blas_threads, user_api="blas")
+            else:
+                limits = contextlib.nullcontext()
+            # A backend set by the caller with joblib.parallel_config is only
+            # overridden if a backend is passed explicitly.
+            if backend == "loky":
+                config = parallel_config(
+                    backend=backend, inner_max_num_threads=blas_threads
+                )
+            elif backend is not None:
+                config = parallel_config(backend=backend)
+            else:
+                config = contextlib.nullcontext()
+            with limits, config:
+                return Parallel(n_jobs=n_jobs, verbose=verbose)(
+                    delayed(worker)(validation_indices, metric_function)
+                    for validation_indices in validation_indices_dict.values()
+                )
+
+        if shared_memory and not uses_threads:
+            if temp_folder is None and os.path.isdir("/dev/shm"):
+                temp_folder = "/dev/shm"
+            with tempfile.TemporaryDirectory(
+                prefix="ikpls_", dir=temp_folder, ignore_cleanup_errors=True
+            ) as folder:
+                originals = self._share_arrays(folder)
+                try:
+                    metrics_list = run_parallel()
+                finally:
+                    # Drop the references to the memory maps so that the files
+                    # can be removed.
+                    for name, array in originals.items():
+                        setattr(self, name, array)
+        else:
+            metrics_list = run_parallel()
 
         metrics_dict = dict(zip(validation_indices_dict.keys(), metrics_list))
 
@@ -0,0 +1,476 @@
+"""
+Contains the GramStatistics class which accumulates the statistics needed by Improved
+Kernel PLS Algorithm #2 by Dayal and MacGregor:
+https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+
+The statistics can be computed separately on shards of the rows of `X` and `Y` and
+merged afterwards, allowing map-reduce style fitting without concatenating the shards.
+The module also contains the `preprocess_products` function which applies centering
+and scaling to `XTX` and `XTY` given column-wise statistics. It is shared by the NumPy
+and JAX implementations. The implementation is written using NumPy.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+import os
+from types import ModuleType
+from typing import Any, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+
+
+class GramStatistics:
+    """
+    Column-wise means and centered cross-products of `X` and `Y` that are sufficient
+    to fit Improved Kernel PLS Algorithm #2 with any combination of centering and
+    scaling.
+
+    Statistics of disjoint sets of rows are combined with the pairwise update by Chan,
+    Golub, and LeVeque:
+    https://doi.org/10.1080/00031305.1983.10483115
+    The update is associative and commutative up to rounding errors and avoids the
+    loss of precision of accumulating raw sums of squares.
+
+    Parameters
+    ----------
+    K : int
+        Number of predictor variables.
+
+    M : int
+        Number of response variables.
+
+    dtype : numpy.float, default=numpy.float64
+        The float datatype used to accumulate the statistics.
+
+    Attributes
+    ----------
+    N : int
+        Number of rows accumulated so far.
+
+    X_mean : Array of shape (1, K)
+        Column-wise mean of the accumulated predictor variables.
+
+    Y_mean : Array of shape (1, M)
+        Column-wise mean of the accumulated response variables.
+
+    XTX_centered : Array of shape (K, K)
+        Product of the transposed centered predictor variables and the centered
+        predictor variables.
+
+    XTY_centered : Array of shape (K, M)
+        Product of the transposed centered predictor variables and the centered
+        response variables.
+
+    YTY_centered_diag : Array of shape (1, M)
+        Column-wise sums of squares of the centered response variables.
+
+    See Also
+    --------
+    ikpls.numpy_ikpls.PLS.fit_from_statistics : Fits a model on the statistics.
+    """
+
+    def __init__(self, K: int, M: int, dtype: np.floating = np.float64) -> None:
+        self.K = K
+        self.M = M
+        self.dtype = dtype
+        self.N = 0
+        self.X_mean = np.zeros(shape=(1, K), dtype=dtype)
+        self.Y_mean = np.zeros(shape=(1, M), dtype=dtype)
+        self.XTX_centered = np.zeros(shape=(K, K), dtype=dtype)
+        self.XTY_centered = np.zeros(shape=(K, M), dtype=dtype)
+        self.YTY_centered_diag = np.zeros(shape=(1, M), dtype=dtype)
+
+    @classmethod
+    def from_arrays(
+        cls, X: npt.ArrayLike, Y: npt.ArrayLike, dtype: np.floating = np.float64
+    ) -> "GramStatistics":
+        """
+        Computes the statistics of `X` and `Y`.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M) or (N,)
+            Response variables.
+
+        dtype : numpy.float, default=numpy.float64
+            The float datatype used to compute the statistics.
+
+        Returns
+        -------
+        statistics : GramStatistics
+            The statistics of `X` and `Y`.
+        """
+        X = np.asarray(X, dtype=dtype)
+        Y = np.asarray(Y, dtype=dtype)
+        if Y.ndim == 1:
+            Y = Y.reshape(-1, 1)
+        statistics = cls(X.shape[1], Y.shape[1], dtype)
+        N = X.shape[0]
+        if N == 0:
+            return statistics
+        statistics.N = N
+        statistics.X_mean = X.mean(axis=0, dtype=dtype, keepdims=True)
+        statistics.Y_mean = Y.mean(axis=0, dtype=dtype, keepdims=True)
+        X = X - statistics.X_mean
+        Y = Y - statistics.Y_mean
+        statistics.XTX_centered = X.T @ X
+        statistics.XTY_centered = X.T @ Y
+        statistics.YTY_centered_diag = np.expand_dims(
+            np.einsum("ij,ij->j", Y, Y), axis=0
+        )
+        return statistics
+
+    def update(self, X: npt.ArrayLike, Y: npt.ArrayLike) -> "GramStatistics":
+        """
+        Adds the rows of `X` and `Y` to the statistics in place.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M) or (N,)
+            Response variables.
+
+        Returns
+        -------
+        self : GramStatistics
+            The updated statistics.
+
+        Raises
+        ------
+        ValueError
+            If the number of columns of `X` or `Y` does not match `K` or `M`.
+        """
+        return self._merge_into(
+            self.from_arrays(X, Y, dtype=self.dtype), inplace=True
+        )
+
+    def merge(self, other: "GramStatistics") -> "GramStatistics":
+        """
+        Combines the statistics with the statistics of a disjoint set of rows.
+
+        Parameters
+        ----------
+        other : GramStatistics
+            Statistics of other rows with the same predictor and response variables.
+
+        Returns
+        -------
+        merged : GramStatistics
+            New statistics of the rows of both `self` and `other`.
+
+        Raises
+        ------
+        ValueError
+            If `K` or `M` of `other` does not match `K` or `M` of `self`.
+        """
+        return self._merge_into(other, inplace=False)
+
+    def __add__(self, other: "GramStatistics") -> "GramStatistics":
+        return self.merge(other)
+
+    def _merge_into(
+        self, other: "GramStatistics", inplace: bool
+    ) -> "GramStatistics":
+        """
+        Combines the statistics with `other` using the pairwise update by Chan, Golub,
+        and LeVeque.
+
+        Parameters
+        ----------
+        other : GramStatistics
+            Statistics of other rows with the same predictor and response variables.
+
+        inplace : bool
+            Whether to store the result in `self` or in a new instance.
+
+        Returns
+        -------
+        merged : GramStatistics
+            Statistics of the rows of both `self` and `other`.
+        """
+        if other.K != self.K or other.M != self.M:
+            raise ValueError(
+                f"Expected statistics of {self.K} predictor and {self.M} response "
+                f"variables, got {other.K} and {other.M}."
+            )
+        merged = self if inplace else self.copy()
+        N_a = self.N
+        N_b = other.N
+        if N_b == 0:
+            return merged
+        N = N_a + N_b
+        delta_X = other.X_mean - self.X_mean
+        delta_Y = other.Y_mean - self.Y_mean
+        correction = N_a * N_b / N
+        merged.XTX_centered = (
+            self.XTX_centered
+            + other.XTX_centered
+            + correction * (delta_X.T @ delta_X)
+        )
+        merged.XTY_centered = (
+            self.XTY_centered
+            + other.XTY_centered
+            + correction * (delta_X.T @ delta_Y)
+        )
+        merged.YTY_centered_diag = (
+            self.YTY_centered_diag + other.YTY_centered_diag + correction * delta_Y**2
+        )
+        merged.X_mean = self.X_mean + delta_X * (N_b / N)
+        merged.Y_mean = self.Y_mean + delta_Y * (N_b / N)
+        merged.N = N
+        return merged
+
+    def copy(self) -> "GramStatistics":
+        """
+        Returns a copy of the statistics.
+
+        Returns
+        -------
+        statistics : GramStatistics
+            A copy of the statistics.
+        """
+        statistics = GramStatistics(self.K, self.M, self.dtype)
+        statistics.N = self.N
+        statistics.X_mean = self.X_mean.copy()
+        statistics.Y_mean = self.Y_mean.copy()
+        statistics.XTX_centered = self.XTX_centered.copy()
+        statistics.XTY_centered = self.XTY_centered.copy()
+        statistics.YTY_centered_diag = self.YTY_centered_diag.copy()
+        return statistics
+
+    @property
+    def X_std(self) -> npt.NDArray[np.floating]:
+        """
+        Column-wise sample standard deviation of the predictor variables using
+        Bessel's correction.
+        """
+        return np.sqrt(np.diag(self.XTX_centered).reshape(1, -1) / (self.N - 1))
+
+    @property
+    def Y_std(self) -> npt.NDArray[np.floating]:
+        """
+        Column-wise sample standard deviation of the response variables using Bessel's
+        correction.
+        """
+        return np.sqrt(self.YTY_centered_diag / (self.N - 1))
+
+    @property
+    def XTX(self) -> npt.NDArray[np.floating]:
+        """
+        Product of the transposed uncentered predictor variables and the predictor
+        variables.
+        """
+        return self.XTX_centered + self.N * (self.X_mean.T @ self.X_mean)
+
+    @property
+    def XTY(self) -> npt.NDArray[np.floating]:
+        """
+        Product of the transposed uncentered predictor variables and the response
+        variables.
+        """
+        return self.XTY_centered + self.N * (self.X_mean.T @ self.Y_mean)
+
+    def save(self, file: Union[str, os.PathLike]) -> None:
+        """
+        Saves the statistics to a NumPy `.npz` file.
+
+        Parameters
+        ----------
+        file : str or os.PathLike
+            Path of the file.
+
+        Returns
+        -------
+        None.
+
+        See Also
+        --------
+        load : Loads statistics saved with `save`.
+        """
+        np.savez(
+            file,
+            N=self.N,
+            X_mean=self.X_mean,
+            Y_mean=self.Y_mean,
+            XTX_centered=self.XTX_centered,
+            XTY_centered=self.XTY_centered,
+            YTY_centered_diag=self.YTY_centered_diag,
+        )
+
+    @classmethod
+    def load(cls, file: Union[str, os.PathLike]) -> "GramStatistics":
+        """
+        Loads statistics saved with `save`.
+
+        Parameters
+        ----------
+        file : str or os.PathLike
+            Path of the file.
+
+        Returns
+        -------
+        statistics : GramStatistics
+            The loaded statistics.
+        """
+        with np.load(file, allow_pickle=False) as data:
+            XTY_centered = data["XTY_centered"]
+            K, M = XTY_centered.shape
+            statistics = cls(K, M, XTY_centered.dtype.type)
+            statistics.N = int(data["N"])
+            statistics.X_mean = data["X_mean"]
+            statistics.Y_mean = data["Y_mean"]
+            statistics.XTX_centered = data["XTX_centered"]
+            statistics.XTY_centered = XTY_centered
+            statistics.YTY_centered_diag = data["YTY_centered_diag"]
+        return statistics
+
+
+def preprocess_products(
+    XTX: Any,
+    XTY: Any,
+    N: int,
+    X_mean: Any,
+    Y_mean: Any,
+    X_std: Any,
+    Y_std: Any,
+    center_X: bool,
+    center_Y: bool,
+    scale_X: bool,
+    scale_Y: bool,
+    centered: bool = False,
+    eps: float = 0.0,
+    dtype: np.floating = np.float64,
+    xp: ModuleType = np,
+) -> Tuple[Any, Any, Any, Any, Any, Any]:
+    """
+    Applies centering and scaling to `XTX` and `XTY` as if they had been computed
+    from the centered and scaled `X` and `Y`.
+
+    Parameters
+    ----------
+    XTX : Array of shape (K, K)
+        Product of the transposed predictor variables and the predictor variables.
+
+    XTY : Array of shape (K, M) or (K,)
+        Product of the transposed predictor variables and the response variables.
+
+    N : int
+        Number of samples used to compute `XTX` and `XTY`.
+
+    X_mean : Array of shape (1, K) or (K,) or None
+        Column-wise mean of the predictor variables. Needed if `centered` is True or
+        if `center_X` or `center_Y` is True.
+
+    Y_mean : Array of shape (1, M) or (M,) or None
+        Column-wise mean of the response variables. Needed under the same conditions
+        as `X_mean`.
+
+    X_std : Array of shape (1, K) or (K,) or None
+        Column-wise sample standard deviation of the predictor variables. Needed if
+        `scale_X` is True.
+
+    Y_std : Array of shape (1, M) or (M,) or None
+        Column-wise sample standard deviation of the response variables. Needed if
+        `scale_Y` is True.
+
+    center_X, center_Y, scale_X, scale_Y : bool
+        The centering and scaling to apply.
+
+    centered : bool, default=False
+        Whether `XTX` and `XTY` are computed from `X` and `Y` centered by their
+        column-wise means, as in `GramStatistics`. Otherwise, they are computed from
+        the raw `X` and `Y`.
+
+    eps : float, default=0.0
+        Standard deviations at or below `eps` are replaced by 1.
+
+    dtype : numpy.float, default=numpy.float64
+        The float datatype of the results.
+
+    xp : module, default=numpy
+        The array module used for the computation, e.g., `numpy` or `jax.numpy`.
+
+    Returns
+    -------
+    XTX : Array of shape (K, K)
+        Product of the transposed preprocessed predictor variables and the
+        preprocessed predictor variables.
+
+    XTY : Array of shape (K, M)
+        Product of the transposed preprocessed predictor variables and the
+        preprocessed response variables.
+
+    X_mean : Array of shape (1, K) or None
+        Mean of X. If centering is not performed, this is None.
+
+    Y_mean : Array of shape (1, M) or None
+        Mean of Y. If centering is not performed, this is None.
+
+    X_std : Array of shape (1, K) or None
+        Sample standard deviation of X. If scaling is not performed, this is None.
+
+    Y_std : Array of shape (1, M) or None
+        Sample standard deviation of Y. If scaling is not performed, this is None.
+
+    Raises
+    ------
+    ValueError
+        If a statistic needed for the requested centering or scaling is None.
+    """
+    XTX = xp.asarray(XTX, dtype=dtype)
+    XTY = xp.asarray(XTY, dtype=dtype)
+    if XTY.ndim == 1:
+        XTY = XTY.reshape(-1, 1)
+    K, M = XTY.shape
+
+    def get_statistic(value, name, length):
+        if value is None:
+            raise ValueError(
+                f"{name} must be given with center_X={center_X}, "
+                f"center_Y={center_Y}, scale_X={scale_X}, and scale_Y={scale_Y}."
+            )
+        return xp.array(value, dtype=dtype).reshape(1, length)
+
+    if centered or center_X or center_Y:
+        X_mean = get_statistic(X_mean, "X_mean", K)
+        Y_mean = get_statistic(Y_mean, "Y_mean", M)
+    if centered:
+        # Products of the centered data are shifted back by the outer products of
+        # the means where no centering is requested. Centering either X or Y
+        # removes the term from XTY.
+        if not center_X:
+            XTX = XTX + N * (X_mean.T @ X_mean)
+            if not center_Y:
+                XTY = XTY + N * (X_mean.T @ Y_mean)
+    else:
+        if center_X or center_Y:
+            XTY = XTY - N * (X_mean.T @ Y_mean)
+        if center_X:
+            XTX = XTX - N * (X_mean.T @ X_mean)
+    if not center_X:
+        X_mean = None
+    if not center_Y:
+        Y_mean = None
+
+    if scale_X:
+        X_std = get_statistic(X_std, "X_std", K)
+        X_std = xp.where(xp.abs(X_std) <= eps, 1, X_std).astype(dtype)
+        XTX = XTX / (X_std.T @ X_std)
+        XTY = XTY / X_std.T
+    else:
+        X_std = None
+
+    if scale_Y:
+        Y_std = get_statistic(Y_std, "Y_std", M)
+        Y_std = xp.where(xp.abs(Y_std) <= eps, 1, Y_std).astype(dtype)
+        XTY = XTY / Y_std
+    else:
+        Y_std = None
+    return XTX, XTY, X_mean, Y_mean, X_std, Y_std
@@ -10,14 +10,16 @@ Author: Ole-Christian Galbo Engstrøm
 E-mail: ole.e@di.ku.dk
 """
 
+from collections import OrderedDict
 from functools import partial
-from typing import Tuple
+from typing import Tuple, Union
 
 import jax
 import jax.numpy as jnp
 from jax.typing import ArrayLike, DTypeLike
 
-from ikpls.jax_ikpls_base import PLSBase
+from ikpls.gram_statistics import preprocess_products
+from ikpls.jax_ikpls_base import PLSBase, _jit_method
 
 
 class PLS(PLSBase):
@@ -67,6 +69,49 @@ class PLS(PLSBase):
         useful to track if recompilation is triggered due to passing inputs with
         different shapes.
 
+    weight_callback : bool, optional, default=True
+        Whether to check for weights that are close to zero with a host callback in
+        every iteration. If False, no callbacks are issued inside the compiled loop.
+        Instead, the index of the first component with a weight close to zero is
+        returned by `stateless_fit` with `return_status=True`, and `fit` issues a
+        single warning after fitting. Cross-validation does not issue any warnings
+        when this is False.
+
+    eigensolver : str, optional, default="eigh"
+        How to compute the weight vector if there are multiple response variables.
+        If "eigh", then the smaller of the two products of the cross-covariance matrix
+        with its transpose is formed and fully eigendecomposed for each component. If
+        "lanczos", then only the dominant singular pair of the cross-covariance matrix
+        is computed with the restarted Lanczos method, warm-started from the loadings
+        of the previous component. This avoids the cubic cost of the
+        eigendecomposition if both `K` and `M` are large. The Lanczos method is not
+        reverse differentiable, so "eigh" is always used if `reverse_differentiable`
+        is True.
+
+    max_iter : int, optional, default=100
+        Maximum number of Lanczos restarts per component. Only used if `eigensolver`
+        is "lanczos".
+
+    tol : float or None, optional, default=None
+        Tolerance on the residual of the dominant eigenpair relative to its
+        eigenvalue. If None, then 1000 times the machine epsilon of `dtype` is used.
+        Only used if `eigensolver` is "lanczos".
+
+    store_B : str, optional, default="all"
+        Which regression coefficients `stateless_fit` returns as `B`. If "all", then
+        `B` is the full tensor of shape (A, K, M) with the coefficients for every
+        number of components. If "last", then `B` is an array of shape (K, M) with only
+        the coefficients for `A` components. If "none", then `B` is None. Coefficients
+        that are not stored are computed from `R` and `Q` by `get_B` when they are
+        needed, and the most recently used ones are cached.
+
+    Raises
+    ------
+    ValueError
+        If `eigensolver` is not "eigh" or "lanczos".
+
+        If `store_B` is not "all", "last", or "none".
+
     Notes
     -----
     Any centering and scaling is undone before returning predictions with `fit` to
@@ -84,6 +129,11 @@ class PLS(PLSBase):
         dtype: DTypeLike = jnp.float64,
         reverse_differentiable: bool = False,
         verbose: bool = False,
+        weight_callback: bool = True,
+        eigensolver: str = "eigh",
+        max_iter: int = 100,
+        tol: Union[None, float] = None,
+        store_B: str = "all",
     ) -> None:
         super().__init__(
             center_X=center_X,
@@ -94,8 +144,14 @@ class PLS(PLSBase):
             dtype=dtype,
             reverse_differentiable=reverse_differentiable,
             verbose=verbose,
+            weight_callback=weight_callback,
+            eigensolver=eigensolver,
+            max_iter=max_iter,
+            tol=tol,
+            store_B=store_B,
         )
         self.name += " #2"
+        self._XTX = None
 
     def _get_initial_matrices(
         self, A: int, K: int, M: int
@@ -134,9 +190,9 @@ class PLS(PLSBase):
         """
         if self.verbose:
             print(f"_get_initial_matrices for {self.name} will be JIT compiled...")
-        return super()._get_initial_matrices(A, K, M)
+        return PLSBase._get_initial_matrices(self, A, K, M)
 
-    @partial(jax.jit, static_argnums=(0,))
+    @partial(_jit_method, static_argnums=(0,))
     def _step_1(self, X: ArrayLike, Y: ArrayLike) -> Tuple[jax.Array, jax.Array]:
         """
         Perform the first step of Improved Kernel PLS Algorithm #2.
@@ -165,7 +221,7 @@ class PLS(PLSBase):
         XTY = self._compute_initial_XTY(XT, Y)
         return XTX, XTY
 
-    @partial(jax.jit, static_argnums=(0,))
+    @partial(_jit_method, static_argnums=(0,))
     def _step_4(
         self, XTX: jax.Array, XTY: jax.Array, r: jax.Array
     ) -> Tuple[jax.Array, jax.Array, jax.Array]:
@@ -202,7 +258,7 @@ class PLS(PLSBase):
         q = (r.T @ XTY).T / tTt
         return tTt, p, q
 
-    @partial(jax.jit, static_argnums=(0, 1, 5, 6, 9))
+    @partial(_jit_method, static_argnums=(0, 1, 5, 6, 9))
     def _main_loop_body(
         self,
         A: int,
@@ -214,6 +270,7 @@ class PLS(PLSBase):
         P: jax.Array,
         R: jax.Array,
         reverse_differentiable: bool,
+        q_last: Union[None, jax.Array] = None,
     ) -> Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array]:
         """
         Execute the main loop body of Improved Kernel PLS Algorithm #2. This function
@@ -248,6 +305,9 @@ class PLS(PLSBase):
         reverse_differentiable : bool
             Whether to use a reverse_differentiable version of the algorithm.
 
+        q_last : Array of shape (M, 1) or None, optional, default=None
+            Loadings of the previous component used to warm-start the Lanczos method.
+
         Returns
         -------
         XTY : Array of shape (K, M)
@@ -264,12 +324,16 @@ class PLS(PLSBase):
 
         r : Array of shape (K, K)
             PLS weight vector.
+
+        norm : Array of shape ()
+            Norm used to determine whether the weight vector is close to zero.
         """
         if self.verbose:
             print(f"_main_loop_body for {self.name} will be JIT compiled...")
         # step 2
-        w, norm = self._step_2(XTY, M, K)
-        jax.debug.callback(self._weight_warning, (i, norm))
+        w, norm = self._step_2(XTY, M, K, q_last)
+        if self.weight_callback:
+            jax.debug.callback(self._weight_warning, (i, norm))
         # step 3
         if reverse_differentiable:
             r = self._step_3(A, w, P, R)
@@ -279,7 +343,7 @@ class PLS(PLSBase):
         tTt, p, q = self._step_4(XTX, XTY, r)
         # step 5
         XTY = self._step_5(XTY, p, q, tTt)
-        return XTY, w, p, q, r
+        return XTY, w, p, q, r, norm
 
     def fit(self, X: ArrayLike, Y: ArrayLike, A: int) -> None:
         """
@@ -298,8 +362,8 @@ class PLS(PLSBase):
 
         Attributes
         ----------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (K, A)
             PLS weights matrix for X.
@@ -340,24 +404,72 @@ class PLS(PLSBase):
         stateless_fit : Performs the same operation but returns the output matrices
         instead of storing them in the class instance.
         """
-        self.B, W, P, Q, R, self.X_mean, self.Y_mean, self.X_std, self.Y_std = (
-            self.stateless_fit(
-                X,
-                Y,
-                A,
-                self.center_X,
-                self.center_Y,
-                self.scale_X,
-                self.scale_Y,
-                self.copy,
-            )
+        outputs, has_status = self._fit_outputs(X, Y, A)
+        *outputs, self._XTY, self._XTX = outputs
+        if has_status:
+            *outputs, zero_weight_index = outputs
+            self._zero_weight_warning(zero_weight_index)
+        self.B, W, P, Q, R, self.X_mean, self.Y_mean, self.X_std, self.Y_std = outputs
+        self.W = W.T
+        self.P = P.T
+        self.Q = Q.T
+        self.R = R.T
+        self._B_cache = OrderedDict()
+
+    def extend(
+        self, additional_components: int, X: Union[None, ArrayLike] = None
+    ) -> None:
+        """
+        Extends the fitted model by `additional_components` components. The deflated
+        `XTY` and the matrices of the previous fit are kept, so only the additional
+        components are computed. The result is the same as calling `fit` with
+        `A + additional_components` components on the same data.
+
+        Parameters
+        ----------
+        additional_components : int
+            Number of components to add to the PLS model.
+
+        X : None, optional, default=None
+            Not used by Improved Kernel PLS Algorithm #2, which uses the `XTX` kept from
+            the previous fit. Present for API consistency.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+
+        Notes
+        -----
+        Keeping the state of the previous fit requires storing `XTY` and `XTX`.
+        """
+        if self._XTY is None:
+            raise ValueError("The model must be fitted before it can be extended.")
+        A = self.R.shape[1] + additional_components
+        previous = (self.B, self.W.T, self.P.T, self.Q.T, self.R.T)
+        *outputs, self._XTY, zero_weight_index = self._fit_main_loop(
+            A, self._XTX, self._XTY, previous
         )
+        if not self.weight_callback:
+            self._zero_weight_warning(zero_weight_index)
+        self.B, W, P, Q, R = outputs
         self.W = W.T
         self.P = P.T
         self.Q = Q.T
         self.R = R.T
+        self._B_cache = OrderedDict()
 
-    @partial(jax.jit, static_argnums=(0, 3, 4, 5, 6, 7, 8))
+    @partial(_jit_method, static_argnums=(0, 3, 4, 5, 6, 7, 8, 10, 11))
     def stateless_fit(
         self,
         X: ArrayLike,
@@ -368,6 +480,9 @@ class PLS(PLSBase):
         scale_X: bool = True,
         scale_Y: bool = True,
         copy: bool = True,
+        weights: Union[None, jax.Array] = None,
+        return_status: bool = False,
+        return_state: bool = False,
     ) -> Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array]:
         """
         Fits Improved Kernel PLS Algorithm #1 on `X` and `Y` using `A` components.
@@ -404,10 +519,24 @@ class PLS(PLSBase):
             `X`'s column-wise standard deviations. Bessel's correction for the unbiased
             estimate of the sample standard deviation is used.
 
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, the model is fitted only on the rows of
+            `X` and `Y` with a weight of 1.
+
+        return_status : bool, optional, default=False
+            Whether to also return the index of the first component with a weight
+            close to zero. This allows checking the weights without host callbacks if
+            `weight_callback` is False.
+
+        return_state : bool, optional, default=False
+            Whether to also return the deflated cross-covariance matrix `XTY` and the
+            potentially centered and scaled `XTX`. These are kept by `fit` to allow
+            extending the model with more components with `extend`.
+
         Returns
         -------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (A, K)
             PLS weights matrix for X.
@@ -433,6 +562,19 @@ class PLS(PLSBase):
         Y_std : Array of shape (1, M) or None
             Sample standard deviation of Y. If scaling is not performed, this is None.
 
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component. Only returned if `return_status` is True.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components. Only returned if
+            `return_state` is True.
+
+        XTX : Array of shape (K, K)
+            Potentially centered and scaled product of the transposed predictor
+            variables and the predictor variables. Only returned if `return_state` is
+            True.
+
         Warns
         -----
         UserWarning.
@@ -454,29 +596,401 @@ class PLS(PLSBase):
 
         X, Y = self._initialize_input_matrices(X, Y)
         X, Y, X_mean, Y_mean, X_std, Y_std = self._center_scale_input_matrices(
-            X, Y, center_X, center_Y, scale_X, scale_Y, copy
+            X, Y, center_X, center_Y, scale_X, scale_Y, copy, weights
+        )
+
+        # step 1
+        XTX, XTY = self._step_1(X, Y)
+
+        # steps 2-6
+        B, W, P, Q, R, XTY_deflated, zero_weight_index = self._fit_main_loop(
+            A, XTX, XTY
+        )
+
+        outputs = (B, W, P, Q, R, X_mean, Y_mean, X_std, Y_std)
+        if return_status:
+            outputs = outputs + (zero_weight_index,)
+        if return_state:
+            outputs = outputs + (XTY_deflated, XTX)
+        return outputs
+
+    def fit_from_gram(
+        self,
+        XTX: ArrayLike,
+        XTY: ArrayLike,
+        N: int,
+        X_mean: Union[None, ArrayLike],
+        Y_mean: Union[None, ArrayLike],
+        X_std: Union[None, ArrayLike],
+        Y_std: Union[None, ArrayLike],
+        A: int,
+    ) -> None:
+        """
+        Fits Improved Kernel PLS Algorithm #2 using `A` components directly from the
+        products and column-wise statistics of `X` and `Y` without accessing `X` and `Y`
+        themselves. Centering and scaling are applied to `XTX` and `XTY` as specified
+        by `center_X`, `center_Y`, `scale_X`, and `scale_Y`.
+
+        Parameters
+        ----------
+        XTX : Array of shape (K, K)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the predictor variables.
+
+        XTY : Array of shape (K, M) or (K,)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the response variables.
+
+        N : int
+            Number of samples used to compute `XTX` and `XTY`.
+
+        X_mean : Array of shape (1, K) or (K,) or None
+            Column-wise mean of the predictor variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        Y_mean : Array of shape (1, M) or (M,) or None
+            Column-wise mean of the response variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        X_std : Array of shape (1, K) or (K,) or None
+            Column-wise sample standard deviation of the predictor variables. Only used
+            if `scale_X` is True.
+
+        Y_std : Array of shape (1, M) or (M,) or None
+            Column-wise sample standard deviation of the response variables. Only used
+            if `scale_Y` is True.
+
+        A : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If a statistic needed for the requested centering or scaling is None.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+
+        See Also
+        --------
+        stateless_fit_from_gram : Performs the same operation but returns the output
+        matrices instead of storing them in the class instance.
+        """
+        outputs = self.stateless_fit_from_gram(
+            XTX,
+            XTY,
+            N,
+            X_mean,
+            Y_mean,
+            X_std,
+            Y_std,
+            A,
+            self.center_X,
+            self.center_Y,
+            self.scale_X,
+            self.scale_Y,
+            return_status=not self.weight_callback,
+            return_state=True,
+        )
+        *outputs, self._XTY, self._XTX = outputs
+        if not self.weight_callback:
+            *outputs, zero_weight_index = outputs
+            self._zero_weight_warning(zero_weight_index)
+        self.B, W, P, Q, R, self.X_mean, self.Y_mean, self.X_std, self.Y_std = outputs
+        self.W = W.T
+        self.P = P.T
+        self.Q = Q.T
+        self.R = R.T
+        self._B_cache = OrderedDict()
+
+    @partial(_jit_method, static_argnums=(0, 8, 9, 10, 11, 12, 13, 14))
+    def stateless_fit_from_gram(
+        self,
+        XTX: ArrayLike,
+        XTY: ArrayLike,
+        N: int,
+        X_mean: Union[None, ArrayLike],
+        Y_mean: Union[None, ArrayLike],
+        X_std: Union[None, ArrayLike],
+        Y_std: Union[None, ArrayLike],
+        A: int,
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        return_status: bool = False,
+        return_state: bool = False,
+    ) -> Tuple[
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        Union[None, jax.Array],
+        Union[None, jax.Array],
+        Union[None, jax.Array],
+        Union[None, jax.Array],
+    ]:
+        """
+        Fits Improved Kernel PLS Algorithm #2 using `A` components directly from the
+        products and column-wise statistics of `X` and `Y`. Returns the internal
+        matrices instead of storing them in the class instance.
+
+        Parameters
+        ----------
+        XTX : Array of shape (K, K)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the predictor variables.
+
+        XTY : Array of shape (K, M) or (K,)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the response variables.
+
+        N : int
+            Number of samples used to compute `XTX` and `XTY`.
+
+        X_mean : Array of shape (1, K) or (K,) or None
+            Column-wise mean of the predictor variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        Y_mean : Array of shape (1, M) or (M,) or None
+            Column-wise mean of the response variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        X_std : Array of shape (1, K) or (K,) or None
+            Column-wise sample standard deviation of the predictor variables. Only used
+            if `scale_X` is True.
+
+        Y_std : Array of shape (1, M) or (M,) or None
+            Column-wise sample standard deviation of the response variables. Only used
+            if `scale_Y` is True.
+
+        A : int
+            Number of components in the PLS model.
+
+        center_X : bool, default=True
+            Whether to center `XTX` and `XTY` as if `X` was centered.
+
+        center_Y : bool, default=True
+            Whether to center `XTY` as if `Y` was centered.
+
+        scale_X : bool, default=True
+            Whether to scale `XTX` and `XTY` as if `X` was scaled.
+
+        scale_Y : bool, default=True
+            Whether to scale `XTY` as if `Y` was scaled.
+
+        return_status : bool, optional, default=False
+            Whether to also return the index of the first component with a weight
+            close to zero. This allows checking the weights without host callbacks if
+            `weight_callback` is False.
+
+        return_state : bool, optional, default=False
+            Whether to also return the deflated cross-covariance matrix `XTY` and the
+            potentially centered and scaled `XTX`. These are kept by `fit` to allow
+            extending the model with more components with `extend`.
+
+        Returns
+        -------
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
+
+        W : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        P : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        X_mean : Array of shape (1, K) or None
+            Mean of X. If centering is not performed, this is None.
+
+        Y_mean : Array of shape (1, M) or None
+            Mean of Y. If centering is not performed, this is None.
+
+        X_std : Array of shape (1, K) or None
+            Sample standard deviation of X. If scaling is not performed, this is None.
+
+        Y_std : Array of shape (1, M) or None
+            Sample standard deviation of Y. If scaling is not performed, this is None.
+
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component. Only returned if `return_status` is True.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components. Only returned if
+            `return_state` is True.
+
+        XTX : Array of shape (K, K)
+            Potentially centered and scaled product of the transposed predictor
+            variables and the predictor variables. Only returned if `return_state` is
+            True.
+
+        Raises
+        ------
+        ValueError
+            If a statistic needed for the requested centering or scaling is None.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+
+        See Also
+        --------
+        fit_from_gram : Performs the same operation but stores the output matrices in
+        the class instance instead of returning them.
+        """
+        if self.verbose:
+            print(f"stateless_fit_from_gram for {self.name} will be JIT compiled...")
+
+        XTX, XTY, X_mean, Y_mean, X_std, Y_std = preprocess_products(
+            XTX,
+            XTY,
+            N,
+            X_mean,
+            Y_mean,
+            X_std,
+            Y_std,
+            center_X,
+            center_Y,
+            scale_X,
+            scale_Y,
+            eps=self.eps,
+            dtype=self.dtype,
+            xp=jnp,
+        )
+
+        # steps 2-6
+        B, W, P, Q, R, XTY_deflated, zero_weight_index = self._fit_main_loop(
+            A, XTX, XTY
         )
 
+        outputs = (B, W, P, Q, R, X_mean, Y_mean, X_std, Y_std)
+        if return_status:
+            outputs = outputs + (zero_weight_index,)
+        if return_state:
+            outputs = outputs + (XTY_deflated, XTX)
+        return outputs
+
+    @partial(_jit_method, static_argnums=(0, 1))
+    def _fit_main_loop(
+        self,
+        A: int,
+        XTX: jax.Array,
+        XTY: jax.Array,
+        previous: Union[None, Tuple[jax.Array, ...]] = None,
+    ) -> Tuple[
+        jax.Array, jax.Array, jax.Array, jax.Array, jax.Array, jax.Array, jax.Array
+    ]:
+        """
+        Executes steps 2-6 of Improved Kernel PLS Algorithm #2 for `A` components
+        given the products of the potentially centered and scaled predictor and
+        response variables.
+
+        Parameters
+        ----------
+        A : int
+            Number of components in the PLS model.
+
+        XTX : Array of shape (K, K)
+            Product of transposed predictor variables and predictor variables.
+
+        XTY : Array of shape (K, M)
+            Initial cross-covariance matrix of the predictor variables and the response
+            variables.
+
+        previous : tuple of arrays or None, optional, default=None
+            The matrices `B`, `W`, `P`, `Q`, and `R` of a previous fit with fewer than
+            `A` components in the internal representation. If given, then they are
+            kept, and the loop continues from the next component. `XTY` must then be
+            deflated by the components of the previous fit.
+
+        Returns
+        -------
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
+
+        W : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        P : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components.
+
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component.
+        """
+        if self.verbose:
+            print(f"_fit_main_loop for {self.name} will be JIT compiled...")
+
         # Get shapes
-        _N, K = X.shape
-        M = Y.shape[1]
+        K, M = XTY.shape
 
         # Initialize matrices
         B, W, P, Q, R = self._get_initial_matrices(A, K, M)
 
-        # step 1
-        XTX, XTY = self._step_1(X, Y)
-
-        # steps 2-6
-        for i in range(A):
-            XTY, w, p, q, r = self._main_loop_body(
-                A, i, XTX, XTY, M, K, P, R, self.reverse_differentiable
+        def body(carry, i):
+            XTY, b_last, P, R, q_last = carry
+            XTY, w, p, q, r, norm = self._main_loop_body(
+                A, i, XTX, XTY, M, K, P, R, self.reverse_differentiable, q_last
             )
-            W = W.at[i].set(w.squeeze())
             P = P.at[i].set(p.squeeze())
-            Q = Q.at[i].set(q.squeeze())
             R = R.at[i].set(r.squeeze())
-            b = self._compute_regression_coefficients(B[i - 1], r, q)
-            B = B.at[i].set(b)
+            b = None
+            if b_last is not None:
+                b = self._compute_regression_coefficients(b_last, r, q)
+            b_all = b if self.store_B == "all" else None
+            return (XTY, b, P, R, q), (b_all, w.reshape(-1), q.reshape(-1), norm)
+
+        # The loadings of the previous component warm-start the Lanczos method
+        q_last = jnp.zeros((M, 1), dtype=self.dtype)
+
+        # Only the regression coefficients selected by store_B are accumulated
+        b = None if self.store_B == "none" else B[0]
+
+        start = 0
+        if previous is not None:
+            B_prev, W_prev, P_prev, Q_prev, R_prev = previous
+            start, b, q_last = self._continue_from(B_prev, W_prev, Q_prev)
+            P = P.at[:start].set(P_prev)
+            R = R.at[:start].set(R_prev)
+
+        # Scan over the components so that the loop body is traced and compiled once
+        # regardless of A
+        (XTY, b, P, R, _), (B, W, Q, norms) = jax.lax.scan(
+            body, (XTY, b, P, R, q_last), jnp.arange(start, A)
+        )
+        if self.store_B == "last":
+            B = b
+
+        if previous is not None:
+            W = jnp.concatenate([W_prev, W])
+            Q = jnp.concatenate([Q_prev, Q])
+            if self.store_B == "all":
+                B = jnp.concatenate([B_prev, B])
 
-        return B, W, P, Q, R, X_mean, Y_mean, X_std, Y_std
+        return B, W, P, Q, R, XTY, self._get_zero_weight_index(norms, start)
@@ -0,0 +1,439 @@
+"""
+Contains the PLS Class which implements partial least-squares regression using the
+wide kernel form of PLS, here called Improved Kernel PLS Algorithm #3. It yields the
+same model as Improved Kernel PLS Algorithm #1 by Dayal and MacGregor:
+https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+but works with the (N, N) Gram matrix of the predictor variables, which is faster if
+there are many more predictor variables than samples.
+
+The class is implemented using JAX for end-to-end differentiability. Additionally, JAX
+allows CPU, GPU, and TPU execution.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+from functools import partial
+from typing import Tuple, Union
+
+import jax
+import jax.numpy as jnp
+from jax.typing import ArrayLike, DTypeLike
+
+from ikpls.jax_ikpls_alg_1 import PLS as PLSAlg1
+from ikpls.jax_ikpls_base import _jit_method
+
+
+class PLS(PLSAlg1):
+    """
+    Implements partial least-squares regression using the wide kernel form of PLS by
+    Rännar et al., here called Improved Kernel PLS Algorithm #3. The scores are
+    extracted from the (N, N) Gram matrix `XXT` instead of the (K, M) cross-covariance
+    matrix `XTY`, and the weights and loadings are computed from `X` after all
+    components are extracted. The resulting model is the same as that of Improved
+    Kernel PLS Algorithm #1 by Dayal and MacGregor:
+    https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+    It is faster if the number of predictor variables `K` is much larger than the
+    number of samples `N`.
+
+    Parameters
+    ----------
+    center_X : bool, default=True
+        Whether to center `X` before fitting by subtracting its row of
+        column-wise means from each row.
+
+    center_Y : bool, default=True
+        Whether to center `Y` before fitting by subtracting its row of
+        column-wise means from each row.
+
+    scale_X : bool, default=True
+        Whether to scale `X` before fitting by dividing each row with the row of `X`'s
+        column-wise standard deviations. Bessel's correction for the unbiased estimate
+        of the sample standard deviation is used.
+
+    scale_Y : bool, default=True
+        Whether to scale `Y` before fitting by dividing each row with the row of `X`'s
+        column-wise standard deviations. Bessel's correction for the unbiased estimate
+        of the sample standard deviation is used.
+
+    copy : bool, optional, default=True
+        Whether to copy `X` and `Y` in fit before potentially applying centering and
+        scaling. If True, then the data is copied before fitting. If False, and `dtype`
+        matches the type of `X` and `Y`, then centering and scaling is done inplace,
+        modifying both arrays.
+
+    dtype : DTypeLike, optional, default=jnp.float64
+        The float datatype to use in computation of the PLS algorithm. Using a lower
+        precision than float64 will yield significantly worse results when using an
+        increasing number of components due to propagation of numerical errors.
+
+    reverse_differentiable: bool, optional, default=False
+        Whether to make the implementation end-to-end differentiable. The
+        differentiable version is slightly slower. Results among the two versions are
+        identical.
+
+    verbose : bool, optional, default=False
+        If True, each sub-function will print when it will be JIT compiled. This can be
+        useful to track if recompilation is triggered due to passing inputs with
+        different shapes.
+
+    weight_callback : bool, optional, default=True
+        Whether to check for weights that are close to zero with a host callback in
+        every iteration. If False, no callbacks are issued inside the compiled loop.
+        Instead, the index of the first component with a weight close to zero is
+        returned by `stateless_fit` with `return_status=True`, and `fit` issues a
+        single warning after fitting. Cross-validation does not issue any warnings
+        when this is False.
+
+    eigensolver : str, optional, default="eigh"
+        How to compute the weight vector if there are multiple response variables in
+        `extend`, which continues with the steps of Improved Kernel PLS Algorithm #1.
+        See `ikpls.jax_ikpls_alg_1.PLS`. `fit` always fully eigendecomposes the
+        (M, M) product of the cross-covariance matrix with its transpose, which is
+        cheap for wide data.
+
+    max_iter : int, optional, default=100
+        Maximum number of Lanczos restarts per component in `extend`. Only used if
+        `eigensolver` is "lanczos".
+
+    tol : float or None, optional, default=None
+        Tolerance on the residual of the dominant eigenpair relative to its
+        eigenvalue in `extend`. If None, then 1000 times the machine epsilon of
+        `dtype` is used. Only used if `eigensolver` is "lanczos".
+
+    store_B : str, optional, default="all"
+        Which regression coefficients `stateless_fit` returns as `B`. If "all", then
+        `B` is the full tensor of shape (A, K, M) with the coefficients for every
+        number of components. If "last", then `B` is an array of shape (K, M) with only
+        the coefficients for `A` components. If "none", then `B` is None. Coefficients
+        that are not stored are computed from `R` and `Q` by `get_B` when they are
+        needed, and the most recently used ones are cached.
+
+    Raises
+    ------
+    ValueError
+        If `eigensolver` is not "eigh" or "lanczos".
+
+        If `store_B` is not "all", "last", or "none".
+
+    Notes
+    -----
+    The class extends `ikpls.jax_ikpls_alg_1.PLS`, so `predict`, `extend`, and the
+    cross-validation methods are shared with Improved Kernel PLS Algorithm #1.
+
+    Any centering and scaling is undone before returning predictions with `fit` to
+    ensure that predictions are on the original scale. If both centering and scaling
+    are True, then the data is first centered and then scaled.
+    """
+
+    def __init__(
+        self,
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        copy: bool = True,
+        dtype: DTypeLike = jnp.float64,
+        reverse_differentiable: bool = False,
+        verbose: bool = False,
+        weight_callback: bool = True,
+        eigensolver: str = "eigh",
+        max_iter: int = 100,
+        tol: Union[None, float] = None,
+        store_B: str = "all",
+    ) -> None:
+        super().__init__(
+            center_X=center_X,
+            center_Y=center_Y,
+            scale_X=scale_X,
+            scale_Y=scale_Y,
+            copy=copy,
+            dtype=dtype,
+            reverse_differentiable=reverse_differentiable,
+            verbose=verbose,
+            weight_callback=weight_callback,
+            eigensolver=eigensolver,
+            max_iter=max_iter,
+            tol=tol,
+            store_B=store_B,
+        )
+        self.name = "Improved Kernel PLS Algorithm #3"
+
+    @partial(_jit_method, static_argnums=(0, 3, 4, 5, 6, 7, 8, 10, 11))
+    def stateless_fit(
+        self,
+        X: ArrayLike,
+        Y: ArrayLike,
+        A: int,
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        copy: bool = True,
+        weights: Union[None, jax.Array] = None,
+        return_status: bool = False,
+        return_state: bool = False,
+    ) -> Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array, jax.Array]:
+        """
+        Fits Improved Kernel PLS Algorithm #3 on `X` and `Y` using `A` components.
+        Returns the internal matrices instead of storing them in the class instance.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables. Its dtype will be converted to float64 for reliable
+            results.
+
+        Y : Array of shape (N, M) or (N,)
+            Response variables. Its dtype will be converted to float64 for reliable
+            results.
+
+        A : int
+            Number of components in the PLS model.
+
+        center_X : bool, default=True
+            Whether to center `X` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        center_Y : bool, default=True
+            Whether to center `Y` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        scale_X : bool, default=True
+            Whether to scale `X` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        scale_Y : bool, default=True
+            Whether to scale `Y` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        copy : bool, optional, default=True
+            Whether to copy `X` and `Y` in fit before potentially applying centering
+            and scaling. If True, then the data is copied before fitting. If False, and
+            `dtype` matches the type of `X` and `Y`, then centering and scaling is done
+            inplace, modifying both arrays.
+
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, the model is fitted only on the rows of
+            `X` and `Y` with a weight of 1. Rows with a weight of 0 get a score of
+            zero in `T`.
+
+        return_status : bool, optional, default=False
+            Whether to also return the index of the first component with a weight
+            close to zero. This allows checking the weights without host callbacks if
+            `weight_callback` is False.
+
+        return_state : bool, optional, default=False
+            Whether to also return the deflated cross-covariance matrix `XTY`. It is
+            kept by `fit` to allow extending the model with more components with
+            `extend`.
+
+        Returns
+        -------
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
+
+        W : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        P : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        T : Array of shape (A, N)
+            PLS scores matrix of X.
+
+        X_mean : Array of shape (1, K) or None
+            Mean of X. If centering is not performed, this is None.
+
+        Y_mean : Array of shape (1, M) or None
+            Mean of Y. If centering is not performed, this is None.
+
+        X_std : Array of shape (1, K) or None
+            Sample standard deviation of X. If scaling is not performed, this is None.
+
+        Y_std : Array of shape (1, M) or None
+            Sample standard deviation of Y. If scaling is not performed, this is None.
+
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component. Only returned if `return_status` is True.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components. Only returned if
+            `return_state` is True.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+
+        See Also
+        --------
+        fit : Performs the same operation but stores the output matrices in the class
+        instance instead of returning them.
+
+        Notes
+        -----
+        For optimization purposes, the internal representation of all matrices
+        (except B) is transposed from the usual representation.
+        """
+
+        if self.verbose:
+            print(f"stateless_fit for {self.name} will be JIT compiled...")
+
+        X, Y = self._initialize_input_matrices(X, Y)
+        X, Y, X_mean, Y_mean, X_std, Y_std = self._center_scale_input_matrices(
+            X, Y, center_X, center_Y, scale_X, scale_Y, copy, weights
+        )
+
+        B, W, P, Q, R, T, XTY, zero_weight_index = self._fit_kernel_main_loop(A, X, Y)
+
+        outputs = (B, W, P, Q, R, T, X_mean, Y_mean, X_std, Y_std)
+        if return_status:
+            outputs = outputs + (zero_weight_index,)
+        if return_state:
+            outputs = outputs + (XTY,)
+        return outputs
+
+    @partial(_jit_method, static_argnums=(0, 1))
+    def _fit_kernel_main_loop(
+        self, A: int, X: jax.Array, Y: jax.Array
+    ) -> Tuple[
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+        jax.Array,
+    ]:
+        """
+        Extracts `A` components from the Gram matrix of the potentially centered and
+        scaled predictor variables and computes the PLS matrices from them.
+
+        Parameters
+        ----------
+        A : int
+            Number of components in the PLS model.
+
+        X : Array of shape (N, K)
+            Potentially centered and scaled predictor variables.
+
+        Y : Array of shape (N, M)
+            Potentially centered and scaled response variables.
+
+        Returns
+        -------
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
+
+        W : Array of shape (A, K)
+            PLS weights matrix for X.
+
+        P : Array of shape (A, K)
+            PLS loadings matrix for X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        T : Array of shape (A, N)
+            PLS scores matrix of X.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components.
+
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component.
+        """
+        if self.verbose:
+            print(f"_fit_kernel_main_loop for {self.name} will be JIT compiled...")
+
+        N = X.shape[0]
+        M = Y.shape[1]
+
+        # Step 1
+        XXT = X @ X.T
+        YTXXTY = Y.T @ XXT @ Y
+        T = jnp.zeros((A, N), dtype=self.dtype)
+        tTts = jnp.ones((A, 1), dtype=self.dtype)
+
+        def body(carry, i):
+            XXT, YTXXTY, T, tTts = carry
+            # Step 2. The weight is X^T u up to normalization, where Y^T u is the
+            # dominant eigenvector of YTXXTY = XTY^T XTY.
+            if M == 1:
+                u = Y
+            else:
+                eig_vals, eig_vecs = jnp.linalg.eigh(YTXXTY)
+                u = Y @ eig_vecs[:, -1:]
+            XXTu = XXT @ u
+            norm = jnp.sqrt(jnp.maximum(u.T @ XXTu, 0)).reshape(())
+            if self.weight_callback:
+                jax.debug.callback(self._weight_warning, (i, norm))
+
+            # A weight close to zero yields a zero component that leaves the deflated
+            # matrices unchanged.
+            is_nonzero = norm > self.eps
+            safe_norm = jnp.where(is_nonzero, norm, 1)
+
+            # Step 3. Project u onto the orthogonal complement of the previous scores
+            # to express the weight with the undeflated X.
+            v = jnp.where(is_nonzero, (u - T.T @ ((T @ u) / tTts)) / safe_norm, 0)
+
+            # Step 4
+            t = jnp.where(is_nonzero, XXTu / safe_norm, 0)
+            tTt = jnp.where(is_nonzero, t.T @ t, 1)
+            q = (Y.T @ t) / tTt
+
+            # Step 5. Deflate XXT by projecting out t from both sides.
+            XXTt = XXT @ t
+            c = (t.T @ XXTt) / tTt**2
+            XXT = XXT - (t @ XXTt.T + XXTt @ t.T) / tTt + c * (t @ t.T)
+            YTt = Y.T @ t
+            YTXXTt = Y.T @ XXTt
+            YTXXTY = (
+                YTXXTY - (YTt @ YTXXTt.T + YTXXTt @ YTt.T) / tTt + c * (YTt @ YTt.T)
+            )
+            T = T.at[i].set(t.reshape(-1))
+            tTts = tTts.at[i].set(tTt.reshape(-1))
+            return (XXT, YTXXTY, T, tTts), (v.reshape(-1), q.reshape(-1), norm)
+
+        (_, _, T, tTts), (V, Q, norms) = jax.lax.scan(
+            body, (XXT, YTXXTY, T, tTts), jnp.arange(A)
+        )
+
+        # Compute the weights and the X loadings from X
+        WP = jnp.concatenate([V, T]) @ X
+        W = WP[:A]
+        P = WP[A:] / tTts
+
+        # P W^T is upper triangular with a unit diagonal for the nonzero components,
+        # so R = (P W^T)^-T W. Zero components get a unit diagonal and zero rows in R.
+        PWT = P @ W.T
+        PWT = PWT + jnp.diag(jnp.where(norms > self.eps, 0, 1).astype(self.dtype))
+        R = jax.scipy.linalg.solve_triangular(PWT.T, W, lower=True)
+
+        # Keep the deflated XTY to allow extending the model with Algorithm #1
+        XTY = X.T @ (Y - T.T @ ((T @ Y) / tTts))
+
+        if self.store_B == "all":
+            B = jnp.cumsum(R[:, :, jnp.newaxis] * Q[:, jnp.newaxis, :], axis=0)
+        elif self.store_B == "last":
+            B = R.T @ Q
+        else:
+            B = None
+        return B, W, P, Q, R, T, XTY, self._get_zero_weight_index(norms)
@@ -13,10 +13,15 @@ E-mail: ole.e@di.ku.dk
 """
 
 import abc
+import functools
+import json
+import os
 import warnings
+from collections import OrderedDict
 from collections.abc import Callable
+from dataclasses import dataclass
 from functools import partial
-from typing import Any, Tuple, Union
+from typing import Any, Hashable, Tuple, Union
 
 import jax
 import jax.numpy as jnp
@@ -26,6 +31,83 @@ from jax.typing import ArrayLike, DTypeLike
 from numpy import typing as npt
 from tqdm import tqdm
 
+# Number of regression coefficient matrices kept by `PLSBase.get_B` if `B` is not
+# stored.
+_B_CACHE_SIZE = 8
+
+
+@dataclass(frozen=True)
+class _StaticConfig:
+    """
+    Frozen and hashable configuration of a JAX PLS instance. It is passed instead of
+    the instance as the static `self` argument of the jitted methods, so JAX caches
+    compiled executables by configuration rather than by object identity, and all
+    instances with the same configuration share them.
+
+    While tracing, the configuration stands in for the instance. Configuration
+    parameters are read from `params`, and methods and other class attributes are
+    looked up on `cls` and bound to the configuration.
+
+    Parameters
+    ----------
+    cls : type
+        The class of the instance.
+
+    params : tuple of (str, Hashable) pairs
+        The names and values of the attributes that are read while tracing.
+    """
+
+    cls: type
+    params: Tuple[Tuple[str, Hashable], ...]
+
+    def __getattr__(self, name: str) -> Any:
+        # Fields and special methods are never delegated to avoid recursion while
+        # the instance is being constructed, copied, or unpickled.
+        if name in ("cls", "params") or name.startswith("__"):
+            raise AttributeError(name)
+        for param_name, value in self.params:
+            if param_name == name:
+                return value
+        attribute = getattr(self.cls, name)
+        if hasattr(attribute, "__get__"):
+            return attribute.__get__(self, self.cls)
+        return attribute
+
+
+def _jit_method(fun: Callable, static_argnums: Union[int, Tuple[int, ...]] = 0):
+    """
+    Jits a method with `jax.jit` and passes the static configuration of the instance
+    as its static `self` argument.
+
+    Parameters
+    ----------
+    fun : Callable
+        The method to jit. Its first argument is the instance.
+
+    static_argnums : int or tuple of int, default=0
+        Passed to `jax.jit`. Must include 0.
+
+    Returns
+    -------
+    method : Callable
+        The jitted method. It exposes `lower` of the underlying jitted function,
+        taking the instance as its first argument.
+    """
+    jitted = jax.jit(fun, static_argnums=static_argnums)
+
+    def as_static(self: Any) -> _StaticConfig:
+        return self if isinstance(self, _StaticConfig) else self._static_config()
+
+    @functools.wraps(fun)
+    def method(self, *args, **kwargs):
+        return jitted(as_static(self), *args, **kwargs)
+
+    def lower(self, *args, **kwargs):
+        return jitted.lower(as_static(self), *args, **kwargs)
+
+    method.lower = lower
+    return method
+
 
 class PLSBase(abc.ABC):
     """
@@ -77,6 +159,49 @@ class PLSBase(abc.ABC):
         useful to track if recompilation is triggered due to passing inputs with
         different shapes.
 
+    weight_callback : bool, optional, default=True
+        Whether to check for weights that are close to zero with a host callback in
+        every iteration. If False, no callbacks are issued inside the compiled loop.
+        Instead, the index of the first component with a weight close to zero is
+        returned by `stateless_fit` with `return_status=True`, and `fit` issues a
+        single warning after fitting. Cross-validation does not issue any warnings
+        when this is False.
+
+    eigensolver : str, optional, default="eigh"
+        How to compute the weight vector if there are multiple response variables.
+        If "eigh", then the smaller of the two products of the cross-covariance matrix
+        with its transpose is formed and fully eigendecomposed for each component. If
+        "lanczos", then only the dominant singular pair of the cross-covariance matrix
+        is computed with the restarted Lanczos method, warm-started from the loadings
+        of the previous component. This avoids the cubic cost of the
+        eigendecomposition if both `K` and `M` are large. The Lanczos method is not
+        reverse differentiable, so "eigh" is always used if `reverse_differentiable`
+        is True.
+
+    max_iter : int, optional, default=100
+        Maximum number of Lanczos restarts per component. Only used if `eigensolver`
+        is "lanczos".
+
+    tol : float or None, optional, default=None
+        Tolerance on the residual of the dominant eigenpair relative to its
+        eigenvalue. If None, then 1000 times the machine epsilon of `dtype` is used.
+        Only used if `eigensolver` is "lanczos".
+
+    store_B : str, optional, default="all"
+        Which regression coefficients `stateless_fit` returns as `B`. If "all", then
+        `B` is the full tensor of shape (A, K, M) with the coefficients for every
+        number of components. If "last", then `B` is an array of shape (K, M) with only
+        the coefficients for `A` components. If "none", then `B` is None. Coefficients
+        that are not stored are computed from `R` and `Q` by `get_B` when they are
+        needed, and the most recently used ones are cached.
+
+    Raises
+    ------
+    ValueError
+        If `eigensolver` is not "eigh" or "lanczos".
+
+        If `store_B` is not "all", "last", or "none".
+
     Notes
     -----
     Any centering and scaling is undone before returning predictions with `fit` to
@@ -94,6 +219,11 @@ class PLSBase(abc.ABC):
         dtype: DTypeLike = jnp.float64,
         reverse_differentiable: bool = False,
         verbose: bool = False,
+        weight_callback: bool = True,
+        eigensolver: str = "eigh",
+        max_iter: int = 100,
+        tol: Union[None, float] = None,
+        store_B: str = "all",
     ) -> None:
         self.center_X = center_X
         self.center_Y = center_Y
@@ -104,6 +234,21 @@ class PLSBase(abc.ABC):
         self.eps = jnp.finfo(self.dtype).eps
         self.reverse_differentiable = reverse_differentiable
         self.verbose = verbose
+        self.weight_callback = weight_callback
+        self.eigensolver = eigensolver
+        self.max_iter = max_iter
+        self.tol = tol
+        self.store_B = store_B
+        if self.eigensolver not in ["eigh", "lanczos"]:
+            raise ValueError(
+                f"Invalid eigensolver: {self.eigensolver}. Eigensolver must be 'eigh' "
+                "or 'lanczos'."
+            )
+        if self.store_B not in ["all", "last", "none"]:
+            raise ValueError(
+                f"Invalid store_B: {self.store_B}. store_B must be 'all', 'last', or "
+                "'none'."
+            )
         self.name = "Improved Kernel PLS Algorithm"
         self.B = None
         self.W = None
@@ -114,6 +259,157 @@ class PLSBase(abc.ABC):
         self.Y_mean = None
         self.X_std = None
         self.Y_std = None
+        self._B_cache = OrderedDict()
+        self._XTY = None
+        self._precompiled = {}
+
+    def _static_config(self) -> _StaticConfig:
+        """
+        Returns the attributes that are read when tracing the jitted methods.
+
+        Returns
+        -------
+        config : _StaticConfig
+            The class and the parameters that determine the compiled computation.
+
+        Notes
+        -----
+        The jitted methods receive this configuration as their static `self`
+        argument, so all instances with the same configuration share compiled
+        executables. Fitted attributes such as `B` are only read outside of the
+        jitted methods and are therefore excluded. The configuration is a snapshot,
+        so changing a parameter of the instance afterwards yields a new
+        configuration.
+        """
+        return _StaticConfig(
+            type(self),
+            (
+                ("name", self.name),
+                ("center_X", self.center_X),
+                ("center_Y", self.center_Y),
+                ("scale_X", self.scale_X),
+                ("scale_Y", self.scale_Y),
+                ("copy", self.copy),
+                ("dtype", jnp.dtype(self.dtype)),
+                ("eps", self.eps),
+                ("reverse_differentiable", self.reverse_differentiable),
+                ("verbose", self.verbose),
+                ("weight_callback", self.weight_callback),
+                ("eigensolver", self.eigensolver),
+                ("max_iter", self.max_iter),
+                ("tol", self.tol),
+                ("store_B", self.store_B),
+            ),
+        )
+
+    def _export_config(self) -> dict:
+        """
+        Returns the configuration that the functions exported by `precompile` are
+        specific to.
+
+        Returns
+        -------
+        config : dict
+            The qualified name of the class and the representations of the parameters
+            of `_static_config` except `verbose` and `weight_callback`, which do not
+            affect the exported functions.
+        """
+        cls = type(self)
+        return {
+            "class": f"{cls.__module__}.{cls.__qualname__}",
+            "params": {
+                name: repr(value)
+                for name, value in self._static_config().params
+                if name not in ("verbose", "weight_callback")
+            },
+        }
+
+    def _get_precompiled(
+        self, name: str, static: Union[None, int], *args: Any
+    ) -> Union[None, Callable]:
+        """
+        Returns the function `name` loaded with `load_precompiled` if it was exported
+        for the current configuration, the static argument `static`, and the shapes of
+        `args`.
+
+        Parameters
+        ----------
+        name : str
+            "stateless_fit" or "stateless_predict".
+
+        static : int or None
+            `A` for "stateless_fit" and `n_components` for "stateless_predict".
+
+        *args : Array or None
+            The arguments of the exported function.
+
+        Returns
+        -------
+        function : Callable or None
+            The jitted exported function or None if no matching function was loaded.
+        """
+        if name not in self._precompiled:
+            return None
+        function, exported, exported_static, config = self._precompiled[name]
+        leaves, tree = jax.tree_util.tree_flatten((args, {}))
+        if (
+            static != exported_static
+            or tree != exported.in_tree
+            or [np.shape(leaf) for leaf in leaves]
+            != [aval.shape for aval in exported.in_avals]
+            or config != self._export_config()
+        ):
+            return None
+        return function
+
+    def _fit_outputs(self, X: ArrayLike, Y: ArrayLike, A: int) -> Tuple[tuple, bool]:
+        """
+        Calls `stateless_fit` with the parameters of the instance for `fit`. If a fit
+        exported by `precompile` for `X`, `Y`, and `A` was loaded with
+        `load_precompiled`, then it is called instead.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M) or (N,)
+            Response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        outputs : tuple
+            The outputs of `stateless_fit` with `return_state=True`.
+
+        has_status : bool
+            Whether `outputs` contain the index of the first component with a weight
+            close to zero before the state.
+        """
+        if "stateless_fit" in self._precompiled:
+            X = jnp.asarray(X, dtype=self.dtype)
+            Y = jnp.asarray(Y, dtype=self.dtype)
+            if Y.ndim == 1:
+                Y = Y[:, jnp.newaxis]
+            exported_fit = self._get_precompiled("stateless_fit", A, X, Y)
+            if exported_fit is not None:
+                return exported_fit(X, Y), True
+        has_status = not self.weight_callback
+        outputs = self.stateless_fit(
+            X,
+            Y,
+            A,
+            self.center_X,
+            self.center_Y,
+            self.scale_X,
+            self.scale_Y,
+            self.copy,
+            return_status=has_status,
+            return_state=True,
+        )
+        return outputs, has_status
 
     def _weight_warning(self, arg: Tuple[npt.NDArray[np.int_], npt.NDArray[np.floating]]):
         """
@@ -137,15 +433,93 @@ class PLSBase(abc.ABC):
         higher number of components.
         """
         i, norm = arg
-        if np.isclose(norm, 0, atol=np.finfo(self.dtype).eps, rtol=0):
-            with warnings.catch_warnings():
-                warnings.simplefilter("always", UserWarning)
-                warnings.warn(
-                    f"Weight is close to zero. Results with A = {i} component(s) or "
-                    "higher may be unstable."
-                )
+        # The norm is an array of norms if the fit is batched over folds with vmap
+        if np.any(np.isclose(norm, 0, atol=np.finfo(self.dtype).eps, rtol=0)):
+            self._zero_weight_warning(i)
+
+    def _zero_weight_warning(self, zero_weight_index: ArrayLike) -> None:
+        """
+        Display a warning message if a component has a weight close to zero.
+
+        Parameters
+        ----------
+        zero_weight_index : int
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component.
+
+        Warns
+        -----
+        UserWarning.
+            If `zero_weight_index` is not -1.
+        """
+        zero_weight_index = int(zero_weight_index)
+        if zero_weight_index < 0:
+            return
+        with warnings.catch_warnings():
+            warnings.simplefilter("always", UserWarning)
+            warnings.warn(
+                f"Weight is close to zero. Results with A = {zero_weight_index} "
+                "component(s) or higher may be unstable."
+            )
+
+    @partial(_jit_method, static_argnums=0)
+    def _get_zero_weight_index(self, norms: jax.Array, start: int = 0) -> jax.Array:
+        """
+        Get the index of the first component with a weight close to zero.
+
+        Parameters
+        ----------
+        norms : Array of shape (A,)
+            Norms of the weights of each component.
+
+        start : int, optional, default=0
+            Index of the component corresponding to the first norm.
+
+        Returns
+        -------
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight norm below machine epsilon or
+            -1 if there is no such component.
+        """
+        is_zero = jnp.abs(norms) <= self.eps
+        return jnp.where(jnp.any(is_zero), start + jnp.argmax(is_zero), -1)
 
-    @partial(jax.jit, static_argnums=0)
+    def _continue_from(
+        self, B: Union[None, jax.Array], W: jax.Array, Q: jax.Array
+    ) -> Tuple[int, Union[None, jax.Array], jax.Array]:
+        """
+        Get the state needed to continue the main loop after the components of a
+        previous fit.
+
+        Parameters
+        ----------
+        B : Array of shape (A_prev, K, M) or (K, M) or None
+            PLS regression coefficients tensor of the previous fit. Depends on
+            `store_B`.
+
+        W : Array of shape (A_prev, K)
+            PLS weights matrix for X of the previous fit.
+
+        Q : Array of shape (A_prev, M)
+            PLS Loadings matrix for Y of the previous fit.
+
+        Returns
+        -------
+        start : int
+            Index of the first new component.
+
+        b_last : Array of shape (K, M) or None
+            Regression coefficients of the last component of the previous fit or None
+            if `store_B` is "none".
+
+        q_last : Array of shape (M, 1)
+            Loadings of the last component of the previous fit.
+        """
+        start = W.shape[0]
+        b_last = B[-1] if self.store_B == "all" else B
+        return start, b_last, Q[-1].reshape(-1, 1)
+
+    @partial(_jit_method, static_argnums=0)
     def _compute_regression_coefficients(
         self, b_last: jax.Array, r: jax.Array, q: jax.Array
     ) -> jax.Array:
@@ -177,7 +551,7 @@ class PLSBase(abc.ABC):
         b = b_last + r @ q.T
         return b
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _initialize_input_matrices(self, X: jax.Array, Y: jax.Array):
         """
         Initialize the input matrices used in the PLS algorithm.
@@ -197,8 +571,8 @@ class PLSBase(abc.ABC):
             Y = Y.reshape(-1, 1)
         return X, Y
 
-    @partial(jax.jit, static_argnums=0)
-    def get_mean(self, A: ArrayLike):
+    @partial(_jit_method, static_argnums=0)
+    def get_mean(self, A: ArrayLike, weights: Union[None, jax.Array] = None):
         """
         Get the mean of the a matrix.
 
@@ -207,6 +581,10 @@ class PLSBase(abc.ABC):
         A : Array of shape (N, K) or (N, M)
             Predictor variables matrix or response variables matrix.
 
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, only the rows with a weight of 1
+            contribute to the mean.
+
         Returns
         -------
         A_mean : Array of shape (1, K) or (1, M)
@@ -215,11 +593,17 @@ class PLSBase(abc.ABC):
         if self.verbose:
             print(f"get_means for {self.name} will be JIT compiled...")
 
-        A_mean = jnp.mean(A, axis=0, dtype=self.dtype, keepdims=True)
+        if weights is None:
+            A_mean = jnp.mean(A, axis=0, dtype=self.dtype, keepdims=True)
+        else:
+            weights = weights.reshape(-1, 1)
+            A_mean = jnp.sum(
+                weights * A, axis=0, dtype=self.dtype, keepdims=True
+            ) / jnp.sum(weights, dtype=self.dtype)
         return A_mean
 
-    @partial(jax.jit, static_argnums=0)
-    def get_std(self, A: ArrayLike):
+    @partial(_jit_method, static_argnums=0)
+    def get_std(self, A: ArrayLike, weights: Union[None, jax.Array] = None):
         """
         Get the standard deviation of a matrix.
 
@@ -228,6 +612,10 @@ class PLSBase(abc.ABC):
         A : Array of shape (N, K) or (N, M)
             Predictor variables matrix or response variables matrix.
 
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, only the rows with a weight of 1
+            contribute to the standard deviation.
+
         Returns
         -------
         A_std : Array of shape (1, K) or (1, M)
@@ -236,11 +624,19 @@ class PLSBase(abc.ABC):
         if self.verbose:
             print(f"get_stds for {self.name} will be JIT compiled...")
 
-        A_std = jnp.std(A, axis=0, dtype=self.dtype, keepdims=True, ddof=1)
+        if weights is None:
+            A_std = jnp.std(A, axis=0, dtype=self.dtype, keepdims=True, ddof=1)
+        else:
+            A_mean = self.get_mean(A, weights)
+            weights = weights.reshape(-1, 1)
+            A_var = jnp.sum(
+                weights * (A - A_mean) ** 2, axis=0, dtype=self.dtype, keepdims=True
+            ) / (jnp.sum(weights, dtype=self.dtype) - 1)
+            A_std = jnp.sqrt(A_var)
         A_std = jnp.where(jnp.abs(A_std) <= self.eps, 1, A_std)
         return A_std
 
-    @partial(jax.jit, static_argnums=(0, 3, 4, 5, 6, 7))
+    @partial(_jit_method, static_argnums=(0, 3, 4, 5, 6, 7))
     def _center_scale_input_matrices(
         self,
         X: jax.Array,
@@ -250,6 +646,7 @@ class PLSBase(abc.ABC):
         scale_X: bool,
         scale_Y: bool,
         copy: bool,
+        weights: Union[None, jax.Array] = None,
     ):
         """
         Preprocess the input matrices based on the centering and scaling parameters.
@@ -274,6 +671,15 @@ class PLSBase(abc.ABC):
         scale_Y : bool
             Whether to scale the response variables (Y) before fitting.
 
+        copy : bool
+            Whether to copy `X` and `Y` before potentially applying centering and
+            scaling.
+
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, the statistics are computed only on the
+            rows with a weight of 1, and the rows with a weight of 0 are set to zero
+            in the returned matrices.
+
         Returns
         -------
         X : Array of shape (N, K)
@@ -292,33 +698,38 @@ class PLSBase(abc.ABC):
             Y = Y.copy()
 
         if center_X:
-            X_mean = self.get_mean(X)
+            X_mean = self.get_mean(X, weights)
             X = X - X_mean
         else:
             X_mean = None
 
         if center_Y:
-            Y_mean = self.get_mean(Y)
+            Y_mean = self.get_mean(Y, weights)
             Y = Y - Y_mean
         else:
             Y_mean = None
 
         if scale_X:
-            X_std = self.get_std(X)
+            X_std = self.get_std(X, weights)
             X = X / X_std
         else:
             X_std = None
 
         if scale_Y:
-            Y_std = self.get_std(Y)
+            Y_std = self.get_std(Y, weights)
             Y = Y / Y_std
         else:
             Y_std = None
 
+        # Zero the excluded rows so they do not contribute to XTY, XTX, or T
+        if weights is not None:
+            X = X * weights.reshape(-1, 1)
+            Y = Y * weights.reshape(-1, 1)
+
         return X, Y, X_mean, Y_mean, X_std, Y_std
 
     @abc.abstractmethod
-    @partial(jax.jit, static_argnums=(0, 1, 2, 3))
+    @partial(_jit_method, static_argnums=(0, 1, 2, 3))
     def _get_initial_matrices(
         self, A: int, K: int, M: int
     ) -> Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array]:
@@ -367,7 +778,7 @@ class PLSBase(abc.ABC):
         R = jnp.zeros(shape=(A, K), dtype=self.dtype)
         return B, W, P, Q, R
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _compute_XT(self, X: jax.Array) -> jax.Array:
         """
         Compute the transposed predictor variable matrix.
@@ -389,7 +800,7 @@ class PLSBase(abc.ABC):
         """
         return X.T
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _compute_initial_XTY(self, XT: jax.Array, Y: jax.Array) -> jax.Array:
         """
         Compute the initial cross-covariance matrix of the predictor variables and the
@@ -416,7 +827,7 @@ class PLSBase(abc.ABC):
         """
         return XT @ Y
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _compute_XTX(self, XT: jax.Array, X: jax.Array) -> jax.Array:
         """
         Compute the product of the transposed predictor variables matrix and the
@@ -443,7 +854,7 @@ class PLSBase(abc.ABC):
         return XT @ X
 
     @abc.abstractmethod
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _step_1(self, X: jax.Array, Y: jax.Array):
         """
         Abstract method representing the first step in the PLS algorithm. This step
@@ -463,9 +874,101 @@ class PLSBase(abc.ABC):
         implemented in concrete PLS classes.
         """
 
-    @partial(jax.jit, static_argnums=(0, 2, 3))
+    @partial(_jit_method, static_argnums=0)
+    def _lanczos(
+        self, XTY: jax.Array, q_last: Union[None, jax.Array] = None
+    ) -> Tuple[jax.Array, jax.Array]:
+        """
+        Computes the dominant left singular vector of `XTY` with the restarted Lanczos
+        method applied to `XTY.T @ XTY` without forming the product.
+
+        Parameters
+        ----------
+        XTY : Array of shape (K, M)
+            The cross-covariance matrix of the predictor variables and the response
+            variables.
+
+        q_last : Array of shape (M, 1) or None, optional, default=None
+            Loadings of the previous component used as the starting vector. If None or
+            if it is nearly orthogonal to the rows of `XTY`, then the row of `XTY` with
+            the largest norm is used instead.
+
+        Returns
+        -------
+        w : Array of shape (K, 1)
+            The dominant left singular vector of `XTY`.
+
+        norm : Array of shape ()
+            The dominant singular value of `XTY`.
+
+        Notes
+        -----
+        The Krylov subspace has a fixed dimension of at most 20 so that all shapes are
+        known at compile time.
+        """
+        if self.verbose:
+            print(f"_lanczos for {self.name} will be JIT compiled...")
+        K, M = XTY.shape
+        n_vectors = min(20, K, M)
+        tol = 1000 * self.eps if self.tol is None else self.tol
+        v = XTY[jnp.argmax(jnp.sum(XTY * XTY, axis=1))]
+        if q_last is not None:
+            q_last = q_last.reshape(-1)
+            start_norm = jla.norm(XTY @ q_last)
+            min_norm = self.eps * jla.norm(XTY) * jla.norm(q_last)
+            v = jnp.where(start_norm > min_norm, q_last, v)
+        v_norm = jla.norm(v)
+        v = v / jnp.where(v_norm > 0, v_norm, 1)
+
+        def lanczos_step(j, carry):
+            V, alpha, beta = carry
+            z = XTY.T @ (XTY @ V[:, j])
+            alpha = alpha.at[j].set(V[:, j] @ z)
+            # Full reorthogonalization, repeated once to counter cancellation
+            z = z - V @ (V.T @ z)
+            z = z - V @ (V.T @ z)
+            beta_j = jla.norm(z)
+            beta = beta.at[j].set(beta_j)
+            # A zero vector is appended if the Krylov subspace is invariant
+            invariant = beta_j <= self.eps * alpha[0]
+            z = jnp.where(invariant, 0, z / jnp.where(invariant, 1, beta_j))
+            V = V.at[:, j + 1].set(z)
+            return V, alpha, beta
+
+        def restart(v):
+            V = jnp.zeros((M, n_vectors + 1), dtype=self.dtype).at[:, 0].set(v)
+            alpha = jnp.zeros(n_vectors, dtype=self.dtype)
+            beta = jnp.zeros(n_vectors, dtype=self.dtype)
+            V, alpha, beta = jax.lax.fori_loop(
+                0, n_vectors, lanczos_step, (V, alpha, beta)
+            )
+            T = jnp.diag(alpha) + jnp.diag(beta[:-1], k=1) + jnp.diag(beta[:-1], k=-1)
+            theta, S = jla.eigh(T)
+            v = V[:, :n_vectors] @ S[:, -1]
+            converged = jnp.abs(beta[-1] * S[-1, -1]) <= tol * theta[-1]
+            return v, converged
+
+        def cond(carry):
+            i, _, converged = carry
+            return (i < self.max_iter) & ~converged
+
+        def body(carry):
+            i, v, _ = carry
+            v, converged = restart(v)
+            return i + 1, v, converged
+
+        _, v, _ = jax.lax.while_loop(cond, body, (0, v, False))
+        w = XTY @ v.reshape(-1, 1)
+        norm = jla.norm(w)
+        return w / norm, norm
+
+    @partial(_jit_method, static_argnums=(0, 2, 3))
     def _step_2(
-        self, XTY: jax.Array, M: int, K: int
+        self,
+        XTY: jax.Array,
+        M: int,
+        K: int,
+        q_last: Union[None, jax.Array] = None,
     ) -> Tuple[jax.Array, DTypeLike]:
         """
         The second step of the PLS algorithm. Computes the next weight vector and the
@@ -483,6 +986,10 @@ class PLSBase(abc.ABC):
         K : int
             Number of predictor variables.
 
+        q_last : Array of shape (M, 1) or None, optional, default=None
+            Loadings of the previous component used as the starting vector if
+            `eigensolver` is "lanczos".
+
         Returns
         -------
         w : Array of shape (K, 1)
@@ -501,6 +1008,8 @@ class PLSBase(abc.ABC):
         if M == 1:
             norm = jla.norm(XTY)
             w = XTY / norm
+        elif self.eigensolver == "lanczos" and not self.reverse_differentiable:
+            w, norm = self._lanczos(XTY, q_last)
         else:
             if M < K:
                 XTYTXTY = XTY.T @ XTY
@@ -595,7 +1104,7 @@ class PLSBase(abc.ABC):
             jax.jit(self._step_3_base, static_argnums=(0))
             return self._step_3_base(i, w, P, R)
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _step_3_body(
         self, j: int, carry: Tuple[jax.Array, jax.Array, jax.Array, jax.Array]
     ) -> Tuple[jax.Array, jax.Array, jax.Array, jax.Array]:
@@ -628,7 +1137,7 @@ class PLSBase(abc.ABC):
         return r, P, w, R
 
     @abc.abstractmethod
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _step_4(self):
         """
         Abstract method representing the fourth step in the PLS algorithm. This step
@@ -648,7 +1157,7 @@ class PLSBase(abc.ABC):
         implemented in concrete PLS classes.
         """
 
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _step_5(
         self, XTY: jax.Array, p: jax.Array, q: jax.Array, tTt: jax.Array
     ) -> jax.Array:
@@ -657,7 +1166,7 @@ class PLSBase(abc.ABC):
         return XTY - (p @ q.T) * tTt
 
     @abc.abstractmethod
-    @partial(jax.jit, static_argnums=0)
+    @partial(_jit_method, static_argnums=0)
     def _main_loop_body(self):
         """
         Abstract method representing the main loop body in the PLS algorithm. This
@@ -678,7 +1187,7 @@ class PLSBase(abc.ABC):
         """
 
     @abc.abstractmethod
-    @partial(jax.jit, static_argnums=(0, 3, 4, 5, 6, 7, 8))
+    @partial(_jit_method, static_argnums=(0, 3, 4, 5, 6, 7, 8, 10, 11))
     def stateless_fit(
         self,
         X: ArrayLike,
@@ -689,6 +1198,9 @@ class PLSBase(abc.ABC):
         scale_X: bool = True,
         scale_Y: bool = True,
         copy: bool = True,
+        weights: Union[None, jax.Array] = None,
+        return_status: bool = False,
+        return_state: bool = False,
     ) -> Union[
         Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array],
         Tuple[jax.Array, jax.Array, jax.Array, jax.Array, jax.Array, jax.Array],
@@ -732,10 +1244,26 @@ class PLSBase(abc.ABC):
             `dtype` matches the type of `X` and `Y`, then centering and scaling is done
             inplace, modifying both arrays.
 
+        weights : Array of shape (N,) or None, optional, default=None
+            Binary row weights. If not None, the model is fitted only on the rows of
+            `X` and `Y` with a weight of 1. This allows fitting on different subsets of
+            the same data without changing the shapes of the inputs.
+
+        return_status : bool, optional, default=False
+            Whether to also return the index of the first component with a weight
+            close to zero. This allows checking the weights without host callbacks if
+            `weight_callback` is False.
+
+        return_state : bool, optional, default=False
+            Whether to also return the deflated cross-covariance matrix `XTY` and, for
+            Improved Kernel PLS Algorithm #2, the potentially centered and scaled
+            `XTX`. These are kept by `fit` to allow extending the model with more
+            components with `extend`.
+
         Returns
         -------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (A, K)
             PLS weights matrix for X.
@@ -766,6 +1294,19 @@ class PLSBase(abc.ABC):
             Sample standard deviation of the response variables `scale_Y` is True,
             otherwise None.
 
+        zero_weight_index : Array of shape ()
+            Index of the first component with a weight close to zero or -1 if there is
+            no such component. Only returned if `return_status` is True.
+
+        XTY : Array of shape (K, M)
+            Cross-covariance matrix deflated by all `A` components. Only returned if
+            `return_state` is True.
+
+        XTX : Array of shape (K, K)
+            Potentially centered and scaled product of the transposed predictor
+            variables and the predictor variables. Only returned for Improved Kernel
+            PLS Algorithm #2 if `return_state` is True.
+
         Warns
         -----
         UserWarning.
@@ -801,8 +1342,8 @@ class PLSBase(abc.ABC):
 
         Attributes
         ----------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (K, A)
             PLS weights matrix for X.
@@ -835,16 +1376,54 @@ class PLSBase(abc.ABC):
         instead of storing them in the class instance.
         """
 
-    @partial(jax.jit, static_argnums=(0, 3))
+    @abc.abstractmethod
+    def extend(
+        self, additional_components: int, X: Union[None, ArrayLike] = None
+    ) -> None:
+        """
+        Extends the fitted model by `additional_components` components. The deflated
+        `XTY` and the matrices of the previous fit are kept, so only the additional
+        components are computed. The result is the same as calling `fit` with
+        `A + additional_components` components on the same data.
+
+        Parameters
+        ----------
+        additional_components : int
+            Number of components to add to the PLS model.
+
+        X : Array of shape (N, K) or None, optional, default=None
+            Predictor variables passed to the previous fit. Only used by Improved
+            Kernel PLS Algorithm #1, which requires it. Algorithm #2 uses the `XTX`
+            kept from the previous fit.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine epsilon.
+        """
+
+    @partial(_jit_method, static_argnums=(0, 3))
     def stateless_predict(
         self,
         X: ArrayLike,
-        B: jax.Array,
+        B: Union[None, jax.Array],
         n_components: Union[None, int] = None,
         X_mean: Union[None, jax.Array] = None,
         X_std: Union[None, jax.Array] = None,
         Y_mean: Union[None, jax.Array] = None,
         Y_std: Union[None, jax.Array] = None,
+        R: Union[None, jax.Array] = None,
+        Q: Union[None, jax.Array] = None,
     ) -> jax.Array:
         """
         Predicts with Improved Kernel PLS Algorithm #1 on `X` with `B` using
@@ -856,8 +1435,10 @@ class PLSBase(abc.ABC):
         X : Array of shape (N, K)
             Predictor variables.
 
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. If it has shape (K, M), then it must
+            hold the coefficients for `n_components` components. May be None if `R`
+            and `Q` are given.
 
         n_components : int or None, optional
             Number of components in the PLS model. If None, then all number of
@@ -879,6 +1460,13 @@ class PLSBase(abc.ABC):
             Sample standard deviation of the response variables. If None, then no
             scaling is applied to `Y`.
 
+        R : Array of shape (A, K) or None, optional, default=None
+            PLS weights matrix to compute scores T directly from original X as
+            returned by `stateless_fit`.
+
+        Q : Array of shape (A, M) or None, optional, default=None
+            PLS Loadings matrix for Y as returned by `stateless_fit`.
+
         Returns
         -------
         Y_pred : Array of shape (N, M) or (A, N, M)
@@ -887,6 +1475,14 @@ class PLSBase(abc.ABC):
             `n_components` is None, returns a prediction for each number of components
             up to `A`.
 
+        Notes
+        -----
+        If `n_components` is None and `R` and `Q` are given, then the scores
+        T = X R are computed once, and the predictions for all numbers of components
+        are formed as cumulative sums of the outer products of the columns of T and
+        Q. This requires O(NKA + NAM) operations instead of the O(NKAM) operations of
+        the product with `B`.
+
         See Also
         --------
         predict : Performs the same operation but uses the class instances of `B`,
@@ -902,10 +1498,18 @@ class PLSBase(abc.ABC):
         if X_std is not None:
             X = X / X_std
 
-        if n_components is None:
+        if n_components is None and R is not None and Q is not None:
+            T = X @ R.T
+            Y_pred = jnp.cumsum(T.T[:, :, jnp.newaxis] * Q[:, jnp.newaxis, :], axis=0)
+        elif n_components is None:
             Y_pred = X @ B
-        else:
+        elif B is not None and B.ndim == 3:
             Y_pred = X @ B[n_components - 1]
+        elif B is not None:
+            Y_pred = X @ B
+        else:
+            T = X @ R[:n_components].T
+            Y_pred = T @ Q[:n_components]
 
         if Y_std is not None:
             Y_pred = Y_pred * Y_std
@@ -913,6 +1517,34 @@ class PLSBase(abc.ABC):
             Y_pred = Y_pred + Y_mean
         return Y_pred
 
+    def get_B(self, n_components: int) -> jax.Array:
+        """
+        Returns the regression coefficients for `n_components` components. If they are
+        not stored in `B`, then they are computed from `R` and `Q` and cached.
+
+        Parameters
+        ----------
+        n_components : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        B : Array of shape (K, M)
+            PLS regression coefficients matrix for `n_components` components.
+        """
+        if self.B is not None and self.B.ndim == 3:
+            return self.B[n_components - 1]
+        if self.B is not None and n_components == self.R.shape[1]:
+            return self.B
+        if n_components in self._B_cache:
+            self._B_cache.move_to_end(n_components)
+            return self._B_cache[n_components]
+        B = self.R[:, :n_components] @ self.Q[:, :n_components].T
+        self._B_cache[n_components] = B
+        if len(self._B_cache) > _B_CACHE_SIZE:
+            self._B_cache.popitem(last=False)
+        return B
+
     def predict(self, X: ArrayLike, n_components: Union[None, int] = None) -> jax.Array:
         """
         Predicts with Improved Kernel PLS Algorithm #1 on `X` with `B` using
@@ -942,11 +1574,267 @@ class PLSBase(abc.ABC):
         `X_std`, `Y_mean`, and `Y_std` instead of the ones stored in the class
         instance.
         """
+        B = self.B
+        if n_components is not None and self.store_B != "all":
+            B = self.get_B(n_components)
+        args = (
+            B,
+            self.X_mean,
+            self.X_std,
+            self.Y_mean,
+            self.Y_std,
+            self.R.T,
+            self.Q.T,
+        )
+        exported_predict = self._get_precompiled(
+            "stateless_predict", n_components, X, *args
+        )
+        if exported_predict is not None:
+            return exported_predict(jnp.asarray(X, dtype=self.dtype), *args)
         return self.stateless_predict(
-            X, self.B, n_components, self.X_mean, self.X_std, self.Y_mean, self.Y_std
+            X,
+            B,
+            n_components,
+            self.X_mean,
+            self.X_std,
+            self.Y_mean,
+            self.Y_std,
+            self.R.T,
+            self.Q.T,
+        )
+
+    def precompile(
+        self,
+        N: int,
+        K: int,
+        M: int,
+        A: int,
+        predict_N: Union[None, int] = None,
+        n_components: Union[None, int] = None,
+        path: Union[None, str, os.PathLike] = None,
+    ) -> None:
+        """
+        Ahead-of-time compiles `fit` and `predict` for the given shapes without
+        requiring any data. Subsequent calls to `fit` and `predict` with inputs of
+        these shapes and of dtype `dtype` reuse the compiled executables. If `path` is
+        given, then `fit` and `predict` are also exported to it, so they can be loaded
+        with `load_precompiled` in another process without tracing them again.
+
+        Parameters
+        ----------
+        N : int
+            Number of samples passed to `fit`.
+
+        K : int
+            Number of predictor variables.
+
+        M : int
+            Number of response variables. `Y` is assumed to be passed to `fit` as a
+            2-dimensional array of shape (N, M).
+
+        A : int
+            Number of components passed to `fit`.
+
+        predict_N : int or None, optional, default=None
+            Number of samples passed to `predict`. If None, then `N` is used.
+
+        n_components : int or None, optional, default=None
+            Number of components passed to `predict`.
+
+        path : str, os.PathLike, or None, optional, default=None
+            Directory to which `fit` and `predict` are exported with `jax.export`. It
+            is created if it does not exist. If None, then nothing is exported.
+
+        Returns
+        -------
+        None.
+
+        Warns
+        -----
+        UserWarning
+            If JAX's persistent compilation cache is enabled, `weight_callback` is
+            True, and `path` is None.
+
+        Notes
+        -----
+        `precompile` does not change any global JAX settings. To reuse the compiled
+        executables in a new process, enable JAX's persistent compilation cache
+        before anything is compiled, e.g., with
+        `jax.config.update("jax_compilation_cache_dir", path)`. Calling `precompile`
+        with the same arguments in a new process then loads the executables from the
+        cache instead of compiling them again.
+
+        Executables that contain host callbacks are not written to the persistent
+        compilation cache by JAX. This applies to `stateless_fit` unless
+        `weight_callback` is False, so only `stateless_predict` is persisted by
+        default.
+
+        The exported `fit` never contains host callbacks. Like with `weight_callback`
+        set to False, it warns at most once after fitting if a weight is close to
+        zero. Loading the exported functions skips tracing and lowering, but they are
+        still compiled for the current device unless the persistent compilation cache
+        holds them. The exported functions are specific to the platform they were
+        exported on.
+
+        See Also
+        --------
+        load_precompiled : Loads the functions exported to `path`.
+        fit : Fits the model using the compiled executable.
+        predict : Predicts using the compiled executable.
+        """
+        if (
+            jax.config.jax_enable_compilation_cache
+            and jax.config.jax_compilation_cache_dir is not None
+            and self.weight_callback
+            and path is None
+        ):
+            warnings.warn(
+                "stateless_fit contains host callbacks and is not written to the "
+                "persistent compilation cache. Set weight_callback=False or pass "
+                "path to export it without host callbacks."
+            )
+        if predict_N is None:
+            predict_N = N
+
+        def spec(*shape: int) -> jax.ShapeDtypeStruct:
+            return jax.ShapeDtypeStruct(shape, self.dtype)
+
+        # predict passes the coefficients according to store_B
+        if self.store_B == "all":
+            b_spec = spec(A, K, M)
+        elif n_components is not None or self.store_B == "last":
+            b_spec = spec(K, M)
+        else:
+            b_spec = None
+
+        type(self).stateless_fit.lower(
+            self,
+            spec(N, K),
+            spec(N, M),
+            A,
+            self.center_X,
+            self.center_Y,
+            self.scale_X,
+            self.scale_Y,
+            self.copy,
+            return_status=not self.weight_callback,
+            return_state=True,
+        ).compile()
+        type(self).stateless_predict.lower(
+            self,
+            spec(predict_N, K),
+            b_spec,
+            n_components,
+            spec(1, K) if self.center_X else None,
+            spec(1, K) if self.scale_X else None,
+            spec(1, M) if self.center_Y else None,
+            spec(1, M) if self.scale_Y else None,
+            spec(A, K),
+            spec(A, M),
+        ).compile()
+        if path is None:
+            return
+
+        cls = type(self)
+        flags = (self.center_X, self.center_Y, self.scale_X, self.scale_Y, self.copy)
+        # Host callbacks cannot be exported, so fit is traced without them.
+        config = self._static_config()
+        config = _StaticConfig(
+            config.cls,
+            tuple(
+                (name, False if name == "weight_callback" else value)
+                for name, value in config.params
+            ),
+        )
+
+        def fit(X: jax.Array, Y: jax.Array) -> tuple:
+            return cls.stateless_fit(
+                config, X, Y, A, *flags, return_status=True, return_state=True
+            )
+
+        def predict(
+            X: jax.Array,
+            B: Union[None, jax.Array],
+            X_mean: Union[None, jax.Array],
+            X_std: Union[None, jax.Array],
+            Y_mean: Union[None, jax.Array],
+            Y_std: Union[None, jax.Array],
+            R: jax.Array,
+            Q: jax.Array,
+        ) -> jax.Array:
+            return cls.stateless_predict(
+                self, X, B, n_components, X_mean, X_std, Y_mean, Y_std, R, Q
+            )
+
+        exported_fit = jax.export.export(jax.jit(fit))(spec(N, K), spec(N, M))
+        exported_predict = jax.export.export(jax.jit(predict))(
+            spec(predict_N, K),
+            b_spec,
+            spec(1, K) if self.center_X else None,
+            spec(1, K) if self.scale_X else None,
+            spec(1, M) if self.center_Y else None,
+            spec(1, M) if self.scale_Y else None,
+            spec(A, K),
+            spec(A, M),
         )
+        os.makedirs(path, exist_ok=True)
+        for name, exported in [
+            ("stateless_fit", exported_fit),
+            ("stateless_predict", exported_predict),
+        ]:
+            with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+                f.write(exported.serialize())
+        with open(os.path.join(path, "config.json"), "w") as f:
+            json.dump(
+                {**self._export_config(), "A": A, "n_components": n_components}, f
+            )
+
+    def load_precompiled(self, path: Union[str, os.PathLike]) -> None:
+        """
+        Loads `fit` and `predict` exported to `path` by `precompile`. Subsequent calls
+        to `fit` and `predict` with inputs of the shapes passed to `precompile` call
+        the exported functions instead of tracing `stateless_fit` and
+        `stateless_predict`. Calls with other shapes are not affected.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            Directory passed as `path` to `precompile`.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If the functions in `path` were exported by another class or for another
+            configuration. The parameters `verbose` and `weight_callback` may differ.
+
+        See Also
+        --------
+        precompile : Exports `fit` and `predict` to `path`.
+        """
+        with open(os.path.join(path, "config.json")) as f:
+            config = json.load(f)
+        A = config.pop("A")
+        n_components = config.pop("n_components")
+        if config != self._export_config():
+            raise ValueError(
+                f"The functions in {path} were exported by another class or for "
+                "another configuration than the one of this instance."
+            )
+        for name, static in [("stateless_fit", A), ("stateless_predict", n_components)]:
+            with open(os.path.join(path, f"{name}.bin"), "rb") as f:
+                exported = jax.export.deserialize(bytearray(f.read()))
+            self._precompiled[name] = (
+                jax.jit(exported.call),
+                exported,
+                static,
+                config,
+            )
 
-    @partial(jax.jit, static_argnums=(0, 3, 6, 7, 8, 9, 10, 11))
+    @partial(_jit_method, static_argnums=(0, 3, 6, 7, 8, 9, 10, 11))
     def stateless_fit_predict_eval(
         self,
         X_train: ArrayLike,
@@ -1041,10 +1929,17 @@ class PLSBase(abc.ABC):
             scale_Y=scale_Y,
             copy=copy,
         )
-        B = matrices[0]
+        B, _, _, Q, R = matrices[:5]
         X_mean, Y_mean, X_std, Y_std = matrices[-4:]
         Y_pred = self.stateless_predict(
-            X_test, B, X_mean=X_mean, X_std=X_std, Y_mean=Y_mean, Y_std=Y_std
+            X_test,
+            B,
+            X_mean=X_mean,
+            X_std=X_std,
+            Y_mean=Y_mean,
+            Y_std=Y_std,
+            R=R,
+            Q=Q,
         )
         return metric_function(Y_test, Y_pred)
 
@@ -1155,7 +2050,7 @@ class PLSBase(abc.ABC):
             )
         return self._finalize_metric_values(metric_value_lists, metric_names)
 
-    @partial(jax.jit, static_argnums=(0, 5, 6, 7, 8, 9, 10, 11, 12))
+    @partial(_jit_method, static_argnums=(0, 5, 6, 7, 8, 9, 10, 11, 12))
     def _inner_cross_validate(
         self,
         X: ArrayLike,
@@ -1266,6 +2161,517 @@ class PLSBase(abc.ABC):
         )
         return metric_values
 
+    def masked_cross_validate(
+        self,
+        X: ArrayLike,
+        Y: ArrayLike,
+        A: int,
+        cv_splits: ArrayLike,
+        preprocessing_function: Callable[
+            [jax.Array, jax.Array, jax.Array, jax.Array],
+            Tuple[jax.Array, jax.Array, jax.Array, jax.Array],
+        ],
+        metric_function: Callable[[jax.Array, jax.Array], Any],
+        metric_names: list[str],
+        show_progress=True,
+        fold_batch_size: Union[None, int] = None,
+        pass_val_weights: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Performs cross-validation for the Partial Least-Squares (PLS) model on given
+        data using fixed-shape inputs for all folds. Instead of gathering the training
+        samples of each fold, the model is fitted on all of `X` and `Y` with the
+        validation samples weighted by zero. The validation samples are gathered with
+        indices padded to the size of the largest fold. As a result, all folds share
+        the same input shapes, and the fold computation is JIT compiled only once
+        regardless of the sizes of the folds. Any potential centering and scaling as
+        determined by `self.center_X`, `self.center_Y`, `self.scale_X`, and
+        `self.scale_Y` is applied for each split using training set statistics to avoid
+        data leakage from the validation set.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M) or (N,)
+            Response variables.
+
+        A : int
+            Number of components in the PLS model.
+
+        cv_splits : Array of shape (N,)
+            An array defining cross-validation splits. Each unique value in `cv_splits`
+            corresponds to a different fold.
+
+        preprocessing_function : Callable receiving arrays `X_train`, `Y_train`,
+        `X_val`, and `Y_val`
+            A function that preprocesses the training and validation data for each
+            fold. It should return preprocessed arrays for `X_train`, `Y_train`,
+            `X_val`, and `Y_val`. `X_train` and `Y_train` contain all N samples, and
+            `X_val` and `Y_val` contain padding samples. The function must therefore
+            operate on each sample independently.
+
+        metric_function : Callable receiving arrays `Y_test` and `Y_pred` and returning
+        Any
+            Computes a metric based on true values `Y_test` and predicted values
+            `Y_pred`. `Y_pred` contains a prediction for all `A` components. If all
+            folds have the same size, then `Y_test` and `Y_pred` contain exactly the
+            validation samples, as in `cross_validate`. Otherwise, the validation set
+            is padded to the size of the largest fold, and `pass_val_weights` must be
+            True.
+
+        metric_names : list of str
+            A list of names for the metrics used for evaluation.
+
+        show_progress : bool, optional, default=True
+            If True, displays a progress bar for the cross-validation.
+
+        fold_batch_size : int or None, optional, default=None
+            Number of folds to evaluate at once using `jax.vmap`. If None, the folds
+            are evaluated one at a time. Larger values allow XLA to parallelize over
+            folds at the cost of memory consumption that grows linearly with
+            `fold_batch_size`. If the number of folds is not divisible by
+            `fold_batch_size`, the last batch is padded so that all batches share the
+            same shape and are JIT compiled only once.
+
+        pass_val_weights : bool, optional, default=False
+            If True, `metric_function` additionally receives the keyword argument
+            `val_weights`, an array of shape (N_val_max,) which is 1 for the
+            validation samples and 0 for the padding samples. The padding samples are
+            zero in both `Y_test` and `Y_pred`, and `metric_function` must use
+            `val_weights` to exclude them, e.g., from a mean. Required if the folds
+            have different sizes.
+
+        Returns
+        -------
+        metrics : dict[str, Any]
+            A dictionary containing evaluation metrics for each metric specified in
+            `metric_names`. The keys are metric names, and the values are lists of
+            metric values for each cross-validation fold.
+
+        Raises
+        ------
+        ValueError
+            If `fold_batch_size` is not None and less than 1.
+
+            If the folds have different sizes and `pass_val_weights` is False.
+
+        See Also
+        --------
+        cross_validate : Performs cross-validation by gathering the training and
+        validation samples of each fold. This triggers a JIT compilation for each
+        distinct fold size.
+
+        _inner_masked_cross_validate : Performs cross-validation for a single fold
+        with fixed-shape inputs and computes evaluation metrics.
+
+        _batched_inner_masked_cross_validate : Performs cross-validation for a batch
+        of folds with fixed-shape inputs and computes evaluation metrics.
+        """
+        X = jnp.asarray(X, dtype=self.dtype)
+        Y = jnp.asarray(Y, dtype=self.dtype)
+        val_idxs, val_weights = self._get_fold_masks(cv_splits)
+        if not pass_val_weights and not bool(jnp.all(val_weights == 1)):
+            raise ValueError(
+                "The folds in cv_splits have different sizes, so the validation sets "
+                "of the smaller folds are padded. Set pass_val_weights=True and use "
+                "val_weights in metric_function to exclude the padding samples."
+            )
+        metric_value_lists = [[] for _ in metric_names]
+        if fold_batch_size is not None:
+            if fold_batch_size < 1:
+                raise ValueError(
+                    f"Invalid fold_batch_size: {fold_batch_size}. fold_batch_size must"
+                    " be a positive integer or None."
+                )
+            num_folds = val_idxs.shape[0]
+            # Pad with copies of the last fold so every batch has the same shape
+            num_padding_folds = -num_folds % fold_batch_size
+            fold_idxs = jnp.concatenate(
+                [
+                    jnp.arange(num_folds),
+                    jnp.full(num_padding_folds, num_folds - 1, dtype=int),
+                ]
+            )
+            for start in tqdm(
+                range(0, num_folds, fold_batch_size), disable=not show_progress
+            ):
+                batch_idxs = fold_idxs[start : start + fold_batch_size]
+                batch_metric_values = self._batched_inner_masked_cross_validate(
+                    X,
+                    Y,
+                    val_idxs[batch_idxs],
+                    val_weights[batch_idxs],
+                    A,
+                    preprocessing_function,
+                    metric_function,
+                    self.center_X,
+                    self.center_Y,
+                    self.scale_X,
+                    self.scale_Y,
+                    self.copy,
+                    pass_val_weights,
+                )
+                for j in range(min(fold_batch_size, num_folds - start)):
+                    metric_values = jax.tree_util.tree_map(
+                        lambda x, j=j: x[j], batch_metric_values
+                    )
+                    metric_value_lists = self._update_metric_value_lists(
+                        metric_value_lists, metric_names, metric_values
+                    )
+            return self._finalize_metric_values(metric_value_lists, metric_names)
+        for fold_val_idxs, fold_val_weights in tqdm(
+            zip(val_idxs, val_weights),
+            total=val_idxs.shape[0],
+            disable=not show_progress,
+        ):
+            metric_values = self._inner_masked_cross_validate(
+                X,
+                Y,
+                fold_val_idxs,
+                fold_val_weights,
+                A,
+                preprocessing_function,
+                metric_function,
+                self.center_X,
+                self.center_Y,
+                self.scale_X,
+                self.scale_Y,
+                self.copy,
+                pass_val_weights,
+            )
+            metric_value_lists = self._update_metric_value_lists(
+                metric_value_lists, metric_names, metric_values
+            )
+        return self._finalize_metric_values(metric_value_lists, metric_names)
+
+    def _get_fold_masks(self, cv_splits: ArrayLike) -> Tuple[jax.Array, jax.Array]:
+        """
+        Computes fixed-shape padded validation indices and their weights for each fold
+        in `cv_splits`.
+
+        Parameters
+        ----------
+        cv_splits : Array of shape (N,)
+            An array defining cross-validation splits. Each unique value in `cv_splits`
+            corresponds to a different fold.
+
+        Returns
+        -------
+        val_idxs : Array of shape (n_folds, N_val_max)
+            Indices of the validation samples of each fold. Padded with zeros to the
+            size of the largest fold.
+
+        val_weights : Array of shape (n_folds, N_val_max)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+        """
+        cv_splits = np.asarray(cv_splits).reshape(-1)
+        _unique_splits, fold_of_sample, val_sizes = np.unique(
+            cv_splits, return_inverse=True, return_counts=True
+        )
+        sorted_idxs = np.argsort(fold_of_sample, kind="stable")
+        fold_starts = np.concatenate([[0], np.cumsum(val_sizes)[:-1]])
+        val_idxs = np.zeros((val_sizes.size, np.max(val_sizes)), dtype=int)
+        val_weights = np.zeros(val_idxs.shape, dtype=self.dtype)
+        for i, (start, size) in enumerate(zip(fold_starts, val_sizes)):
+            val_idxs[i, :size] = sorted_idxs[start : start + size]
+            val_weights[i, :size] = 1
+        return jnp.asarray(val_idxs), jnp.asarray(val_weights)
+
+    def _get_train_weights(
+        self, N: int, val_idxs: jax.Array, val_weights: jax.Array
+    ) -> jax.Array:
+        """
+        Computes binary training row weights from padded validation indices.
+
+        Parameters
+        ----------
+        N : int
+            Number of samples.
+
+        val_idxs : Array of shape (N_val_max,)
+            Indices of the validation samples padded to the size of the largest fold.
+
+        val_weights : Array of shape (N_val_max,)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+
+        Returns
+        -------
+        train_weights : Array of shape (N,)
+            Binary row weights which are 1 for the training samples.
+        """
+        return jnp.ones(N, dtype=self.dtype).at[val_idxs].add(-val_weights)
+
+    @partial(_jit_method, static_argnums=(0, 5, 6, 7, 8, 9, 10, 11, 12, 13))
+    def _inner_masked_cross_validate(
+        self,
+        X: jax.Array,
+        Y: jax.Array,
+        val_idxs: jax.Array,
+        val_weights: jax.Array,
+        A: int,
+        preprocessing_function: Callable[
+            [jax.Array, jax.Array, jax.Array, jax.Array],
+            Tuple[jax.Array, jax.Array, jax.Array, jax.Array],
+        ],
+        metric_function: Callable[[jax.Array, jax.Array], Any],
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        copy: bool = True,
+        pass_val_weights: bool = False,
+    ):
+        """
+        Performs cross-validation for a single fold of the data with fixed-shape
+        inputs and computes evaluation metrics.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M)
+            Response variables.
+
+        val_idxs : Array of shape (N_val_max,)
+            Indices of data points in the validation set padded to the size of the
+            largest fold. All other data points are in the training set.
+
+        val_weights : Array of shape (N_val_max,)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+
+        A : int
+            Number of components in the PLS model.
+
+        preprocessing_function : Callable receiving arrays `X_train`, `Y_train`,
+        `X_val`, and `Y_val`
+            A function that preprocesses the training and validation data for each
+            fold. It should return preprocessed arrays for `X_train`, `Y_train`,
+            `X_val`, and `Y_val`.
+
+        metric_function : Callable receiving arrays `Y_test` and `Y_pred` and returning
+        Any
+            Computes a metric based on true values `Y_test` and predicted values
+            `Y_pred`.
+
+        center_X : bool, default=True
+            Whether to center `X` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        center_Y : bool, default=True
+            Whether to center `Y` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        scale_X : bool, default=True
+            Whether to scale `X` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        scale_Y : bool, default=True
+            Whether to scale `Y` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        copy : bool, optional, default=True
+            Whether to copy `X` and `Y` in stateless_fit before potentially applying
+            centering and scaling.
+
+        pass_val_weights : bool, optional, default=False
+            Whether to pass `val_weights` to `metric_function` as a keyword argument.
+
+        Returns
+        -------
+        metric_values : Any
+            metric values based on the true and predicted values for a single fold.
+        """
+        if self.verbose:
+            print(f"_inner_masked_cv for {self.name} will be JIT compiled...")
+
+        train_weights = self._get_train_weights(X.shape[0], val_idxs, val_weights)
+        X_val = jnp.take(X, val_idxs, axis=0)
+        Y_val = jnp.take(Y, val_idxs, axis=0)
+        X_train, Y_train, X_val, Y_val = preprocessing_function(X, Y, X_val, Y_val)
+        X_train, Y_train = self._initialize_input_matrices(X=X_train, Y=Y_train)
+        X_val, Y_val = self._initialize_input_matrices(X=X_val, Y=Y_val)
+        matrices = self.stateless_fit(
+            X_train,
+            Y_train,
+            A,
+            center_X,
+            center_Y,
+            scale_X,
+            scale_Y,
+            copy,
+            train_weights,
+        )
+        B = matrices[0]
+        X_mean, Y_mean, X_std, Y_std = matrices[-4:]
+        Y_pred = self.stateless_predict(
+            X_val, B, X_mean=X_mean, X_std=X_std, Y_mean=Y_mean, Y_std=Y_std
+        )
+        return self._evaluate_masked_metric(
+            metric_function, Y_val, Y_pred, val_weights, pass_val_weights
+        )
+
+    @partial(_jit_method, static_argnums=(0, 5, 6, 7, 8, 9, 10, 11, 12, 13))
+    def _batched_inner_masked_cross_validate(
+        self,
+        X: jax.Array,
+        Y: jax.Array,
+        val_idxs: jax.Array,
+        val_weights: jax.Array,
+        A: int,
+        preprocessing_function: Callable[
+            [jax.Array, jax.Array, jax.Array, jax.Array],
+            Tuple[jax.Array, jax.Array, jax.Array, jax.Array],
+        ],
+        metric_function: Callable[[jax.Array, jax.Array], Any],
+        center_X: bool = True,
+        center_Y: bool = True,
+        scale_X: bool = True,
+        scale_Y: bool = True,
+        copy: bool = True,
+        pass_val_weights: bool = False,
+    ):
+        """
+        Performs cross-validation for a batch of folds of the data with fixed-shape
+        inputs and computes evaluation metrics. The folds are evaluated at once by
+        vectorizing `_inner_masked_cross_validate` with `jax.vmap`.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K)
+            Predictor variables.
+
+        Y : Array of shape (N, M)
+            Response variables.
+
+        val_idxs : Array of shape (fold_batch_size, N_val_max)
+            Indices of data points in the validation set of each fold padded to the
+            size of the largest fold.
+
+        val_weights : Array of shape (fold_batch_size, N_val_max)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding in `val_idxs`.
+
+        A : int
+            Number of components in the PLS model.
+
+        preprocessing_function : Callable receiving arrays `X_train`, `Y_train`,
+        `X_val`, and `Y_val`
+            A function that preprocesses the training and validation data for each
+            fold. It should return preprocessed arrays for `X_train`, `Y_train`,
+            `X_val`, and `Y_val`.
+
+        metric_function : Callable receiving arrays `Y_test` and `Y_pred` and returning
+        Any
+            Computes a metric based on true values `Y_test` and predicted values
+            `Y_pred`.
+
+        center_X : bool, default=True
+            Whether to center `X` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        center_Y : bool, default=True
+            Whether to center `Y` before fitting by subtracting its row of
+            column-wise means from each row.
+
+        scale_X : bool, default=True
+            Whether to scale `X` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        scale_Y : bool, default=True
+            Whether to scale `Y` before fitting by dividing each row with the row of
+            `X`'s column-wise standard deviations. Bessel's correction for the unbiased
+            estimate of the sample standard deviation is used.
+
+        copy : bool, optional, default=True
+            Whether to copy `X` and `Y` in stateless_fit before potentially applying
+            centering and scaling.
+
+        pass_val_weights : bool, optional, default=False
+            Whether to pass `val_weights` to `metric_function` as a keyword argument.
+
+        Returns
+        -------
+        metric_values : Any
+            metric values based on the true and predicted values for each fold in the
+            batch. Each leaf has a leading axis of size `fold_batch_size`.
+        """
+        if self.verbose:
+            print(f"_batched_inner_masked_cv for {self.name} will be JIT compiled...")
+
+        def inner_masked_cross_validate(
+            fold_val_idxs: jax.Array, fold_val_weights: jax.Array
+        ) -> Any:
+            return self._inner_masked_cross_validate(
+                X,
+                Y,
+                fold_val_idxs,
+                fold_val_weights,
+                A,
+                preprocessing_function,
+                metric_function,
+                center_X,
+                center_Y,
+                scale_X,
+                scale_Y,
+                copy,
+                pass_val_weights,
+            )
+
+        return jax.vmap(inner_masked_cross_validate)(val_idxs, val_weights)
+
+    def _evaluate_masked_metric(
+        self,
+        metric_function: Callable[..., Any],
+        Y_val: jax.Array,
+        Y_pred: jax.Array,
+        val_weights: jax.Array,
+        pass_val_weights: bool,
+    ) -> Any:
+        """
+        Evaluates a metric on a validation set padded to a fixed shape.
+
+        Parameters
+        ----------
+        metric_function : Callable receiving arrays `Y_test` and `Y_pred` and returning
+        Any
+            Computes a metric based on true values `Y_test` and predicted values
+            `Y_pred`.
+
+        Y_val : Array of shape (N_val_max, M)
+            True values of the padded validation set.
+
+        Y_pred : Array of shape (A, N_val_max, M)
+            Predicted values of the padded validation set.
+
+        val_weights : Array of shape (N_val_max,)
+            Binary weights which are 1 for the validation samples and 0 for the
+            padding samples.
+
+        pass_val_weights : bool
+            Whether to pass `val_weights` to `metric_function` as a keyword argument.
+
+        Returns
+        -------
+        metric_values : Any
+            The result of `metric_function` with the padding samples set to zero in
+            both `Y_val` and `Y_pred`.
+        """
+        val_weights_col = val_weights.reshape(-1, 1)
+        Y_val = Y_val * val_weights_col
+        Y_pred = Y_pred * val_weights_col
+        if pass_val_weights:
+            return metric_function(Y_val, Y_pred, val_weights=val_weights)
+        return metric_function(Y_val, Y_pred)
+
     def _update_metric_value_lists(
         self,
         metric_value_lists: list[list[Any]],
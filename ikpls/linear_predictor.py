@@ -0,0 +1,140 @@
+"""
+Contains the LinearPredictor class which predicts with a fitted PLS model as a single
+affine map from the original predictor variables to the original response variables.
+The centering and scaling of the PLS model are folded into the regression coefficients
+and an intercept, so predicting takes one matrix product and one addition. The
+predictor is immutable and can write its predictions into a preallocated array, which
+makes it suitable for low-latency serving of small batches. The implementation is
+written using NumPy.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+from typing import Any, Union
+
+import numpy as np
+import numpy.typing as npt
+
+
+class LinearPredictor:
+    """
+    Immutable affine predictor computing `Y_pred = X @ coefficients + intercept`.
+
+    Parameters
+    ----------
+    coefficients : Array of shape (K, M)
+        Regression coefficients for the original predictor and response variables.
+
+    intercept : Array of shape (M,) or (1, M)
+        Intercept added to each prediction.
+
+    dtype : numpy.float or None, default=None
+        The float datatype of the coefficients and the intercept. If None, the
+        datatype of `coefficients` is used.
+
+    Attributes
+    ----------
+    coefficients : Array of shape (K, M)
+        Read-only C-contiguous regression coefficients.
+
+    intercept : Array of shape (M,)
+        Read-only intercept.
+
+    Raises
+    ------
+    ValueError
+        If `coefficients` is not two-dimensional or the size of `intercept` does not
+        match the number of columns of `coefficients`.
+
+    See Also
+    --------
+    ikpls.numpy_ikpls.PLS.export_predictor : Creates a predictor from a fitted model.
+    """
+
+    __slots__ = ("coefficients", "intercept")
+
+    def __init__(
+        self,
+        coefficients: npt.ArrayLike,
+        intercept: npt.ArrayLike,
+        dtype: Union[None, np.floating] = None,
+    ) -> None:
+        coefficients = np.array(coefficients, dtype=dtype, order="C")
+        intercept = np.array(intercept, dtype=coefficients.dtype).reshape(-1)
+        if coefficients.ndim != 2:
+            raise ValueError(
+                "Expected coefficients of shape (K, M), got shape "
+                f"{coefficients.shape}."
+            )
+        if intercept.size != coefficients.shape[1]:
+            raise ValueError(
+                f"Expected an intercept of size {coefficients.shape[1]}, got size "
+                f"{intercept.size}."
+            )
+        coefficients.flags.writeable = False
+        intercept.flags.writeable = False
+        object.__setattr__(self, "coefficients", coefficients)
+        object.__setattr__(self, "intercept", intercept)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("LinearPredictor is immutable.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("LinearPredictor is immutable.")
+
+    def __reduce__(self):
+        return (LinearPredictor, (self.coefficients, self.intercept))
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        The float datatype of the coefficients and the intercept.
+        """
+        return self.coefficients.dtype
+
+    def predict(self, X: npt.ArrayLike) -> npt.NDArray[np.floating]:
+        """
+        Predicts on `X`.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K) or (K,)
+            Predictor variables.
+
+        Returns
+        -------
+        Y_pred : Array of shape (N, M) or (M,)
+            Predictions on the original scale of the response variables.
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        out = np.empty(
+            shape=X.shape[:-1] + (self.coefficients.shape[1],), dtype=self.dtype
+        )
+        return self.predict_into(X, out)
+
+    def predict_into(
+        self, X: npt.NDArray[np.floating], out: npt.NDArray[np.floating]
+    ) -> npt.NDArray[np.floating]:
+        """
+        Predicts on `X` and writes the predictions into `out` without allocating
+        temporary arrays.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K) or (K,)
+            Predictor variables. No conversion is applied, so `X` should have the
+            datatype of the predictor to avoid casting.
+
+        out : Array of shape (N, M) or (M,)
+            Preallocated array in which to write the predictions.
+
+        Returns
+        -------
+        out : Array of shape (N, M) or (M,)
+            `out` holding the predictions on the original scale of the response
+            variables.
+        """
+        np.matmul(X, self.coefficients, out=out)
+        np.add(out, self.intercept, out=out)
+        return out
@@ -11,13 +11,259 @@ E-mail: ole.e@di.ku.dk
 """
 
 import warnings
-from typing import Union
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Tuple, Union
 
 import numpy as np
 import numpy.linalg as la
 import numpy.typing as npt
+import scipy.sparse as sp
 from sklearn.base import BaseEstimator
 
+from ikpls import sparse
+from ikpls.algorithm_selection import CostModel, select_algorithm
+from ikpls.gram_statistics import GramStatistics, preprocess_products
+from ikpls.linear_predictor import LinearPredictor
+
+# Number of regression coefficient matrices kept by `PLS.get_B` if `B` is not stored.
+_B_CACHE_SIZE = 8
+
+# Approximate number of elements of `X` in each chunk if `chunk_size` is None.
+_CHUNK_ELEMENTS = 2**22
+
+
+def _cumulative_outer_products(
+    U: npt.NDArray[np.floating], V: npt.NDArray[np.floating]
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the cumulative sums of the outer products of the rows of `U` and `V`.
+    The sums are accumulated in place in the output, so no temporary of the same
+    size as the output is allocated.
+
+    Parameters
+    ----------
+    U : Array of shape (A, P)
+        Left factors, e.g., `R.T` or the scores `T.T`.
+
+    V : Array of shape (A, M)
+        Right factors, e.g., `Q.T`.
+
+    Returns
+    -------
+    sums : Array of shape (A, P, M)
+        `sums[a]` is the sum of the outer products of the first `a + 1` rows.
+    """
+    sums = np.empty(
+        shape=(U.shape[0], U.shape[1], V.shape[1]), dtype=np.result_type(U, V)
+    )
+    for a in range(U.shape[0]):
+        np.outer(U[a], V[a], out=sums[a])
+        if a > 0:
+            sums[a] += sums[a - 1]
+    return sums
+
+
+class _RowChunks:
+    """
+    Streams the rows of `X` in chunks and applies centering and scaling to one chunk
+    at a time. Only a single chunk of the preprocessed `X` is held in memory.
+
+    Parameters
+    ----------
+    X : Array of shape (N, K) or callable
+        Predictor variables, e.g., a numpy.memmap, or a callable that takes no
+        arguments and returns an iterable over consecutive row chunks of `X`.
+
+    chunk_size : int or None
+        Number of rows in each chunk. If None, chunks of approximately
+        `_CHUNK_ELEMENTS` elements are used. Ignored if `X` is callable.
+
+    dtype : numpy.float
+        The float datatype to convert each chunk to.
+
+    X_mean : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of a chunk. If None, no centering is applied.
+
+    X_std : Array of shape (1, K) or None, optional, default=None
+        Row that divides each row of a chunk. If None, no scaling is applied.
+    """
+
+    def __init__(
+        self,
+        X: Union[npt.ArrayLike, Callable[[], Iterable[npt.ArrayLike]]],
+        chunk_size: Union[None, int],
+        dtype: np.floating,
+        X_mean: Union[None, npt.NDArray[np.floating]] = None,
+        X_std: Union[None, npt.NDArray[np.floating]] = None,
+    ) -> None:
+        self.X = X
+        self.dtype = dtype
+        self.X_mean = X_mean
+        self.X_std = X_std
+        self.shape = None if callable(X) else X.shape
+        if chunk_size is None and self.shape is not None:
+            chunk_size = max(_CHUNK_ELEMENTS // max(self.shape[1], 1), 1)
+        self.chunk_size = chunk_size
+
+    def raw_chunks(self) -> Iterator[npt.NDArray[np.floating]]:
+        """
+        Yields the chunks of `X` converted to `dtype` without preprocessing.
+
+        Yields
+        ------
+        chunk : Array of shape (N_chunk, K)
+            Consecutive rows of `X`.
+        """
+        if callable(self.X):
+            chunks = self.X()
+        else:
+            chunks = (
+                self.X[start : start + self.chunk_size]
+                for start in range(0, self.shape[0], self.chunk_size)
+            )
+        for chunk in chunks:
+            yield np.asarray(chunk, dtype=self.dtype)
+
+    def chunks(self) -> Iterator[Tuple[int, int, npt.NDArray[np.floating]]]:
+        """
+        Yields the centered and scaled chunks of `X` with their row ranges.
+
+        Yields
+        ------
+        start : int
+            Index of the first row of the chunk.
+
+        stop : int
+            Index after the last row of the chunk.
+
+        chunk : Array of shape (N_chunk, K)
+            Consecutive preprocessed rows of `X`.
+        """
+        start = 0
+        for chunk in self.raw_chunks():
+            if self.X_mean is not None:
+                chunk = chunk - self.X_mean
+            if self.X_std is not None:
+                chunk = chunk / self.X_std
+            stop = start + chunk.shape[0]
+            yield start, stop, chunk
+            start = stop
+
+    def statistics(
+        self,
+    ) -> Tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """
+        Computes the column-wise means and centered sums of squares of `X` in a single
+        pass. The statistics of the chunks are combined with the pairwise update by
+        Chan, Golub, and LeVeque, as in `ikpls.gram_statistics.GramStatistics`. The
+        number of rows is stored in `shape`.
+
+        Returns
+        -------
+        mean : Array of shape (1, K)
+            Column-wise means of `X`.
+
+        sum_sq : Array of shape (1, K)
+            Column-wise sums of squares of the centered `X`.
+        """
+        N = 0
+        mean = None
+        sum_sq = None
+        for chunk in self.raw_chunks():
+            N_b = chunk.shape[0]
+            if N_b == 0:
+                continue
+            mean_b = chunk.mean(axis=0, dtype=self.dtype, keepdims=True)
+            centered = chunk - mean_b
+            sum_sq_b = np.expand_dims(
+                np.einsum("ij,ij->j", centered, centered), axis=0
+            )
+            if mean is None:
+                N, mean, sum_sq = N_b, mean_b, sum_sq_b
+                continue
+            delta = mean_b - mean
+            sum_sq = sum_sq + sum_sq_b + (N * N_b / (N + N_b)) * delta**2
+            mean = mean + delta * (N_b / (N + N_b))
+            N = N + N_b
+        self.shape = (N, mean.shape[1])
+        return mean, sum_sq
+
+    def transpose_product(
+        self, Z: npt.NDArray[np.floating]
+    ) -> npt.NDArray[np.floating]:
+        """
+        Computes the product of the transpose of the preprocessed `X` with `Z`.
+
+        Parameters
+        ----------
+        Z : Array of shape (N, L)
+            Dense right-hand side.
+
+        Returns
+        -------
+        XTZ : Array of shape (K, L)
+            Product of the transpose of the preprocessed `X` with `Z`.
+        """
+        XTZ = np.zeros(shape=(self.shape[1], Z.shape[1]), dtype=self.dtype)
+        for start, stop, chunk in self.chunks():
+            XTZ += chunk.T @ Z[start:stop]
+        return XTZ
+
+    def products(
+        self, Z: npt.NDArray[np.floating]
+    ) -> Tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """
+        Computes the products of the transpose of the preprocessed `X` with itself
+        and with `Z` in a single pass.
+
+        Parameters
+        ----------
+        Z : Array of shape (N, L)
+            Dense right-hand side.
+
+        Returns
+        -------
+        XTX : Array of shape (K, K)
+            Product of the transpose of the preprocessed `X` with itself.
+
+        XTZ : Array of shape (K, L)
+            Product of the transpose of the preprocessed `X` with `Z`.
+        """
+        XTX = np.zeros(shape=(self.shape[1], self.shape[1]), dtype=self.dtype)
+        XTZ = np.zeros(shape=(self.shape[1], Z.shape[1]), dtype=self.dtype)
+        for start, stop, chunk in self.chunks():
+            XTX += chunk.T @ chunk
+            XTZ += chunk.T @ Z[start:stop]
+        return XTX, XTZ
+
+    def scores(
+        self, r: npt.NDArray[np.floating]
+    ) -> Tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """
+        Computes the scores `t` of the preprocessed `X` for the weight `r` and the
+        product of the transpose of the preprocessed `X` with `t` in a single pass.
+
+        Parameters
+        ----------
+        r : Array of shape (K, 1)
+            PLS weight vector to compute scores directly from the preprocessed `X`.
+
+        Returns
+        -------
+        t : Array of shape (N, 1)
+            Scores of the preprocessed `X`.
+
+        XTt : Array of shape (K, 1)
+            Product of the transpose of the preprocessed `X` with `t`.
+        """
+        t = np.zeros(shape=(self.shape[0], 1), dtype=self.dtype)
+        XTt = np.zeros(shape=(self.shape[1], 1), dtype=self.dtype)
+        for start, stop, chunk in self.chunks():
+            t_chunk = chunk @ r
+            t[start:stop] = t_chunk
+            XTt += chunk.T @ t_chunk
+        return t, XTt
+
 
 class PLS(BaseEstimator):
     """
@@ -27,8 +273,17 @@ class PLS(BaseEstimator):
 
     Parameters
     ----------
-    algorithm : int, default=1
-        Whether to use Improved Kernel PLS Algorithm #1 or #2.
+    algorithm : int, str, or CostModel, default=1
+        Whether to use Improved Kernel PLS Algorithm #1, #2, or #3. Algorithm #3 is
+        the wide kernel form of PLS by Rännar et al., which extracts the scores from
+        the (N, N) Gram matrix `XXT` instead of working with (K, M) and (K, K)
+        matrices. It yields the same model and is faster if `K` is much larger than
+        `N`. If "auto" or a CostModel, then the one of Algorithm #1 and #2 that the
+        cost model estimates to be faster for the shape and sparsity of `X`, the
+        shape of `Y`, and the number of components is selected when fitting. "auto"
+        uses a cost model with default throughputs. Use `CostModel.calibrate` to
+        measure the throughputs on the host. `fit_from_gram`, `partial_fit`, and
+        `fit_from_statistics` always use Algorithm #2.
 
     center_X : bool, default=True
         Whether to center `X` before fitting by subtracting its row of
@@ -52,34 +307,121 @@ class PLS(BaseEstimator):
         Whether to copy `X` and `Y` in fit before potentially applying centering and
         scaling. If True, then the data is copied before fitting. If False, and `dtype`
         matches the type of `X` and `Y`, then centering and scaling is done inplace,
-        modifying both arrays.
+        modifying both arrays. With Algorithm #2, `X` is never copied or modified, as
+        its centering and scaling are fused into the computation of `XTX` and `XTY`.
 
     dtype : numpy.float, default=numpy.float64
         The float datatype to use in computation of the PLS algorithm. Using a lower
         precision than float64 will yield significantly worse results when using an
         increasing number of components due to propagation of numerical errors.
 
+    eigensolver : str, default="eigh"
+        How to compute the weight vector if there are multiple response variables.
+        If "eigh", then the smaller of the two products of the cross-covariance matrix
+        with its transpose is formed and fully eigendecomposed for each component. If
+        "lanczos", then only the dominant singular pair of the cross-covariance matrix
+        is computed with the restarted Lanczos method, warm-started from the loadings
+        of the previous component. This avoids the cubic cost of the
+        eigendecomposition if both `K` and `M` are large.
+
+    max_iter : int, default=100
+        Maximum number of Lanczos restarts per component. Only used if `eigensolver`
+        is "lanczos".
+
+    tol : float or None, default=None
+        Tolerance on the residual of the dominant eigenpair relative to its
+        eigenvalue. If None, then 1000 times the machine epsilon of `dtype` is used.
+        Only used if `eigensolver` is "lanczos".
+
+    store_B : str, default="all"
+        Which regression coefficients to store in `B` when fitting. If "all", then `B`
+        is the full tensor of shape (A, K, M) with the coefficients for every number
+        of components. If "last", then `B` is an array of shape (K, M) with only the
+        coefficients for `A` components. If "none", then `B` is None. Coefficients that
+        are not stored are computed from `R` and `Q` by `get_B` when they are needed,
+        and the most recently used ones are cached.
+
+    stop_XTY_norm : float or None, default=None
+        If not None, then component extraction stops once the Frobenius norm of the
+        deflated cross-covariance matrix `XTY` relative to its norm before extracting
+        the first component is below this tolerance.
+
+    stop_explained_variance : float or None, default=None
+        If not None, then component extraction stops once the fraction of the total
+        sum of squares of the preprocessed `Y` that is explained by a single component
+        is below this threshold. Not supported by `fit_from_gram`, which does not
+        receive the sum of squares of `Y`.
+
+    stop_callback : callable or None, default=None
+        If not None, then it is called after each extracted component as
+        `stop_callback(n_components, state)`, where `n_components` is the number of
+        components extracted so far, and `state` is a dict with the weight `w`, the
+        loadings `p` and `q`, the direct weight `r`, the squared norm of the scores
+        `tTt`, and the deflated `XTY`. Component extraction stops if it returns True.
+        With Algorithm #3, `state` only has `q`, the scores `t`, and `tTt`, as the
+        weights are computed after all components are extracted.
+
+    chunk_size : int or None, default=None
+        Number of rows of `X` to process at a time if `X` is streamed in chunks. If
+        None, chunks of approximately 2**22 elements are used. Setting `chunk_size`
+        also streams an `X` that is an in-memory array.
+
     Raises
     ------
     ValueError
-        If `algorithm` is not 1 or 2.
+        If `algorithm` is not 1, 2, 3, "auto", or a CostModel.
+
+        If `eigensolver` is not "eigh" or "lanczos".
+
+        If `store_B` is not "all", "last", or "none".
 
     Notes
     -----
+    The stopping rules are checked after each component is extracted. The component
+    that triggers a rule is kept, no further components are extracted, and `A` and the
+    fitted matrices are truncated to the number of extracted components.
+
     Any centering and scaling is undone before returning predictions to ensure that
     predictions are on the original scale. If both centering and scaling are True, then
-    the data is first centered and then scaled.
+    the data is first centered and then scaled. `predict` folds the centering and
+    scaling of `X` and `Y` into the regression coefficients and an intercept, so no
+    preprocessed copy of `X` is formed.
+
+    `X` may be a scipy.sparse matrix in `fit`, `extend`, and `predict`. It is kept
+    sparse in the CSR or CSC format, and scaling is applied to its nonzero entries.
+    Centering is applied implicitly by correcting the products with `X` with rank-one
+    terms in `X_mean`, so the centered `X` is never formed. `copy` has no effect on a
+    sparse `X`, which is never modified.
+
+    `X` is streamed in chunks of rows in `fit`, `extend`, and `predict` if it is a
+    numpy.memmap, if it is a callable, or if `chunk_size` is not None. A callable must
+    take no arguments and return an iterable over consecutive row chunks of `X`. It
+    is called once per pass over `X` and must yield the same rows in the same order
+    every time. Centering and scaling are applied to one chunk at a time, so no
+    preprocessed copy of `X` is formed, and `copy` has no effect on `X`. Fitting
+    makes one pass over `X` for its means and standard deviations, one for `XTY`
+    (and `XTX` for Algorithm #2), and, for Algorithm #1, one per component that
+    computes both the scores and the loadings. Algorithm #3 does not support
+    streaming.
     """
 
     def __init__(
         self,
-        algorithm: int = 1,
+        algorithm: Union[int, str, CostModel] = 1,
         center_X: bool = True,
         center_Y: bool = True,
         scale_X: bool = True,
         scale_Y: bool = True,
         copy: bool = True,
         dtype: np.floating = np.float64,
+        eigensolver: str = "eigh",
+        max_iter: int = 100,
+        tol: Union[None, float] = None,
+        store_B: str = "all",
+        stop_XTY_norm: Union[None, float] = None,
+        stop_explained_variance: Union[None, float] = None,
+        stop_callback: Union[None, Callable[[int, dict], bool]] = None,
+        chunk_size: Union[None, int] = None,
     ) -> None:
         self.algorithm = algorithm
         self.center_X = center_X
@@ -88,12 +430,37 @@ class PLS(BaseEstimator):
         self.scale_Y = scale_Y
         self.copy = copy
         self.dtype = dtype
+        self.eigensolver = eigensolver
+        self.max_iter = max_iter
+        self.tol = tol
+        self.store_B = store_B
+        self.stop_XTY_norm = stop_XTY_norm
+        self.stop_explained_variance = stop_explained_variance
+        self.stop_callback = stop_callback
+        self.chunk_size = chunk_size
         self.eps = np.finfo(dtype).eps
-        self.name = f"Improved Kernel PLS Algorithm #{algorithm}"
-        if self.algorithm not in [1, 2]:
+        is_cost_model = isinstance(self.algorithm, CostModel)
+        if not is_cost_model and self.algorithm not in [1, 2, 3, "auto"]:
+            raise ValueError(
+                f"Invalid algorithm: {self.algorithm}. Algorithm must be 1, 2, 3, "
+                "'auto', or a CostModel."
+            )
+        if self.eigensolver not in ["eigh", "lanczos"]:
+            raise ValueError(
+                f"Invalid eigensolver: {self.eigensolver}. Eigensolver must be 'eigh' "
+                "or 'lanczos'."
+            )
+        if self.store_B not in ["all", "last", "none"]:
             raise ValueError(
-                f"Invalid algorithm: {self.algorithm}. Algorithm must be 1 or 2."
+                f"Invalid store_B: {self.store_B}. store_B must be 'all', 'last', or "
+                "'none'."
             )
+        if self.algorithm in [1, 2, 3]:
+            self._set_selected_algorithm(self.algorithm)
+        else:
+            # The name is set once the algorithm is selected
+            self.selected_algorithm = None
+            self.name = "Improved Kernel PLS"
         self.A = None
         self.N = None
         self.K = None
@@ -108,6 +475,22 @@ class PLS(BaseEstimator):
         self.Y_mean = None
         self.X_std = None
         self.Y_std = None
+        self._B_cache = OrderedDict()
+        self._XTY = None
+        self._XTX = None
+        self._XTY_norm = None
+        self._Y_ss = None
+        self._reset_partial_fit()
+
+    def _reset_partial_fit(self) -> None:
+        """
+        Discards the statistics accumulated by `partial_fit`.
+
+        Returns
+        -------
+        None.
+        """
+        self.statistics = None
 
     def _weight_warning(self, i: int) -> None:
         """
@@ -135,8 +518,9 @@ class PLS(BaseEstimator):
 
         Parameters
         ----------
-        X : Array of shape (N, K)
-            Predictor variables.
+        X : Array or scipy.sparse matrix of shape (N, K) or callable
+            Predictor variables. A numpy.memmap or a callable returning row chunks is
+            streamed in chunks.
 
         Y : Array of shape (N, M) or (N,)
             Response variables.
@@ -146,8 +530,12 @@ class PLS(BaseEstimator):
 
         Attributes
         ----------
-        B : Array of shape (A, K, M)
-            PLS regression coefficients tensor.
+        selected_algorithm : int
+            The Improved Kernel PLS algorithm used for fitting. Differs from
+            `algorithm` only if `algorithm` is "auto" or a CostModel.
+
+        B : Array of shape (A, K, M) or (K, M) or None
+            PLS regression coefficients tensor. Depends on `store_B`.
 
         W : Array of shape (K, A)
             PLS weights matrix for X.
@@ -162,7 +550,8 @@ class PLS(BaseEstimator):
             PLS weights matrix to compute scores T directly from original X.
 
         T : Array of shape (N, A)
-            PLS scores matrix of X. Only assigned for Improved Kernel PLS Algorithm #1.
+            PLS scores matrix of X. Only assigned for Improved Kernel PLS Algorithm #1
+            and #3.
 
         X_mean : Array of shape (1, K) or None
             Mean of X. If centering is not performed, this is None.
@@ -180,162 +569,1312 @@ class PLS(BaseEstimator):
         -------
         None.
 
+        Raises
+        ------
+        ValueError
+            If `X` is streamed in chunks and Improved Kernel PLS Algorithm #3 is used.
+
         Warns
         -----
         UserWarning.
             If at any point during iteration over the number of components `A`, the
             residual goes below machine precision for np.float64.
         """
-        X = np.asarray(X, dtype=self.dtype)
+        if sp.issparse(Y):
+            Y = Y.toarray()
         Y = np.asarray(Y, dtype=self.dtype)
 
         if Y.ndim == 1:
             Y = Y.reshape(-1, 1)
 
-        if (self.center_X or self.scale_X) and self.copy:
-            X = X.copy()
-
         if (self.center_Y or self.scale_Y) and self.copy:
             Y = Y.copy()
 
-        if self.center_X:
-            self.X_mean = X.mean(axis=0, dtype=self.dtype, keepdims=True)
-            X -= self.X_mean
-
         if self.center_Y:
             self.Y_mean = Y.mean(axis=0, dtype=self.dtype, keepdims=True)
             Y -= self.Y_mean
 
-        if self.scale_X:
-            self.X_std = X.std(axis=0, ddof=1, dtype=self.dtype, keepdims=True)
-            self.X_std[np.abs(self.X_std) <= self.eps] = 1
-            X /= self.X_std
-
         if self.scale_Y:
             self.Y_std = Y.std(axis=0, ddof=1, dtype=self.dtype, keepdims=True)
             self.Y_std[np.abs(self.Y_std) <= self.eps] = 1
             Y /= self.Y_std
 
-        N, K = X.shape
         M = Y.shape[1]
+        if not callable(X):
+            # The preprocessing of X depends on the algorithm
+            self._select_algorithm(
+                *np.shape(X), M, A, nnz=X.nnz if sp.issparse(X) else None
+            )
 
-        self.B = np.zeros(shape=(A, K, M), dtype=self.dtype)
-        W = np.zeros(shape=(A, K), dtype=self.dtype)
-        P = np.zeros(shape=(A, K), dtype=self.dtype)
-        Q = np.zeros(shape=(A, M), dtype=self.dtype)
-        R = np.zeros(shape=(A, K), dtype=self.dtype)
-        self.W = W.T
-        self.P = P.T
-        self.Q = Q.T
-        self.R = R.T
-        if self.algorithm == 1:
-            T = np.zeros(shape=(A, N), dtype=self.dtype)
-            self.T = T.T
-        self.A = A
+        X_offset = None
+        XTX = None
+        XTY = None
+        if sp.issparse(X):
+            X, X_offset = self._preprocess_sparse_X(X, compute_statistics=True)
+        elif self._is_chunked(X):
+            if self.selected_algorithm == 3:
+                raise ValueError(
+                    "Improved Kernel PLS Algorithm #3 does not support streaming X in "
+                    "chunks."
+                )
+            X = self._chunked_X(X, compute_statistics=True)
+            if callable(X.X):
+                self._select_algorithm(*X.shape, M, A)
+        elif self.selected_algorithm == 2:
+            # Algorithm #2 only needs XTX and XTY
+            X = np.asarray(X, dtype=self.dtype)
+            XTX, XTY = self._fused_products(X, Y)
+        else:
+            X = np.asarray(X, dtype=self.dtype)
+
+            if (self.center_X or self.scale_X) and self.copy:
+                X = X.copy()
+
+            if self.center_X:
+                self.X_mean = X.mean(axis=0, dtype=self.dtype, keepdims=True)
+                X -= self.X_mean
+
+            if self.scale_X:
+                self.X_std = X.std(axis=0, ddof=1, dtype=self.dtype, keepdims=True)
+                self.X_std[np.abs(self.X_std) <= self.eps] = 1
+                X /= self.X_std
+
+        N, K = X.shape
         self.N = N
-        self.K = K
-        self.M = M
+        self._reset_partial_fit()
+
+        Y_ss = np.einsum("ij,ij->", Y, Y)
+        if self.selected_algorithm == 3:
+            self._kernel_main_loop(A, X, Y, Y_ss, X_offset=X_offset)
+            return
 
         # Step 1
-        XTY = X.T @ Y
+        if isinstance(X, _RowChunks) and self.selected_algorithm == 2:
+            XTX, XTY = X.products(Y)
+        elif isinstance(X, _RowChunks):
+            XTY = X.transpose_product(Y)
+        elif XTY is None:
+            XTY = sparse.transpose_product(X, Y, X_offset)
 
         # Used for algorithm #2
-        if self.algorithm == 2:
-            XTX = X.T @ X
+        if self.selected_algorithm == 2:
+            if XTX is None:
+                XTX = sparse.cross_product(X, X_offset)
+            self._main_loop(A, XTY, XTX=XTX, Y_ss=Y_ss)
+        else:
+            self._main_loop(A, XTY, X=X, Y_ss=Y_ss, X_offset=X_offset)
 
-        for i in range(A):
-            # Step 2
-            if M == 1:
-                norm = la.norm(XTY, ord=2)
-                if np.isclose(norm, 0, atol=self.eps, rtol=0):
-                    self._weight_warning(i)
-                    break
-                w = XTY / norm
-            else:
-                if M < K:
-                    XTYTXTY = XTY.T @ XTY
-                    eig_vals, eig_vecs = la.eigh(XTYTXTY)
-                    q = eig_vecs[:, -1:]
-                    w = XTY @ q
-                    norm = la.norm(w)
-                    if np.isclose(norm, 0, atol=self.eps, rtol=0):
-                        self._weight_warning(i)
-                        break
-                    w = w / norm
-                else:
-                    XTYYTX = XTY @ XTY.T
-                    eig_vals, eig_vecs = la.eigh(XTYYTX)
-                    norm = eig_vals[-1]
-                    if np.isclose(norm, 0, atol=self.eps, rtol=0):
-                        self._weight_warning(i)
-                        break
-                    w = eig_vecs[:, -1:]
-            W[i] = w.squeeze()
+    def _select_algorithm(
+        self, N: int, K: int, M: int, A: int, nnz: Union[None, int] = None
+    ) -> None:
+        """
+        Selects the algorithm with a cost model if `algorithm` is "auto" or a
+        CostModel.
 
-            # Step 3
-            r = np.copy(w)
-            for j in range(i):
-                r = r - P[j].reshape(-1, 1).T @ w * R[j].reshape(-1, 1)
-            R[i] = r.squeeze()
+        Parameters
+        ----------
+        N : int
+            Number of samples.
 
-            # Step 4
-            if self.algorithm == 1:
-                t = X @ r
-                T[i] = t.squeeze()
-                tTt = t.T @ t
-                p = (t.T @ X).T / tTt
-            elif self.algorithm == 2:
-                rXTX = r.T @ XTX
-                tTt = rXTX @ r
-                p = rXTX.T / tTt
-            q = (r.T @ XTY).T / tTt
-            P[i] = p.squeeze()
-            Q[i] = q.squeeze()
+        K : int
+            Number of predictor variables.
 
-            # Step 5
-            XTY = XTY - (p @ q.T) * tTt
+        M : int
+            Number of response variables.
+
+        A : int
+            Number of components in the PLS model.
 
-            # Compute regression coefficients
-            self.B[i] = self.B[i - 1] + r @ q.T
+        nnz : int or None, optional, default=None
+            Number of nonzero entries of `X` if it is a scipy.sparse matrix.
 
-    def predict(
-        self, X: npt.ArrayLike, n_components: Union[None, int] = None
-    ) -> npt.NDArray[np.floating]:
+        Returns
+        -------
+        None.
         """
-        Predicts with Improved Kernel PLS Algorithm #1 on `X` with `B` using
-        `n_components` components. If `n_components` is None, then predictions are
-        returned for all number of components.
+        if self.algorithm == "auto" or isinstance(self.algorithm, CostModel):
+            cost_model = None if self.algorithm == "auto" else self.algorithm
+            self._set_selected_algorithm(
+                select_algorithm(
+                    N, K, M, A, cost_model=cost_model, dtype=self.dtype, nnz=nnz
+                )
+            )
+
+    def _set_selected_algorithm(self, algorithm: int) -> None:
+        """
+        Sets the algorithm used for fitting and the name of the model.
+
+        Parameters
+        ----------
+        algorithm : int
+            The Improved Kernel PLS algorithm used for fitting.
+
+        Returns
+        -------
+        None.
+        """
+        self.selected_algorithm = algorithm
+        self.name = f"Improved Kernel PLS Algorithm #{algorithm}"
+
+    def _fused_products(
+        self, X: npt.NDArray[np.floating], Y: npt.NDArray[np.floating]
+    ) -> Tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """
+        Computes `XTX` and `XTY` of the centered and scaled `X` without forming a
+        preprocessed copy of `X`. The products are computed over blocks of rows
+        shifted by `X_mean` to avoid the catastrophic cancellation of correcting the
+        raw products. Without centering, the shift is undone with rank-one
+        corrections. The standard deviations are read from the diagonal of the
+        shifted `XTX`, and the scaling is applied as a diagonal correction.
 
         Parameters
         ----------
         X : Array of shape (N, K)
             Predictor variables.
 
-        n_components : int or None, optional, default=None.
-            Number of components in the PLS model. If None, then all number of
-            components are used.
+        Y : Array of shape (N, M)
+            Preprocessed response variables.
 
         Returns
         -------
-        Y_pred : Array of shape (N, M) or (A, N, M)
-            If `n_components` is an int, then an array of shape (N, M) with the
-            predictions for that specific number of components is used. If
-            `n_components` is None, returns a prediction for each number of components
-            up to `A`.
+        XTX : Array of shape (K, K)
+            Product of the preprocessed predictor variables with themselves.
+
+        XTY : Array of shape (K, M)
+            Product of the preprocessed predictor and response variables.
         """
-        X = np.asarray(X, dtype=self.dtype)
+        N = X.shape[0]
+        X_mean = None
+        if self.center_X or self.scale_X:
+            X_mean = X.mean(axis=0, dtype=self.dtype, keepdims=True)
+        XTX, XTY = _RowChunks(X, None, self.dtype, X_mean).products(Y)
         if self.center_X:
-            X = X - self.X_mean
+            self.X_mean = X_mean
+        if self.scale_X:
+            self.X_std = np.sqrt(np.diag(XTX).reshape(1, -1) / (N - 1))
+            self.X_std[np.abs(self.X_std) <= self.eps] = 1
+        if X_mean is not None and not self.center_X:
+            XTX = XTX + N * (X_mean.T @ X_mean)
+            XTY = XTY + X_mean.T @ Y.sum(axis=0, keepdims=True)
         if self.scale_X:
-            X = X / self.X_std
+            XTX = XTX / (self.X_std.T @ self.X_std)
+            XTY = XTY / self.X_std.T
+        return XTX, XTY
 
-        if n_components is None:
-            Y_pred = X @ self.B
-        else:
-            Y_pred = X @ self.B[n_components - 1]
+    def _is_chunked(self, X: Union[npt.ArrayLike, Callable]) -> bool:
+        """
+        Checks whether `X` is streamed in chunks of rows.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K) or callable
+            Predictor variables.
+
+        Returns
+        -------
+        bool
+            Whether `X` is a numpy.memmap or a callable, or `chunk_size` is not None.
+        """
+        return isinstance(X, np.memmap) or callable(X) or self.chunk_size is not None
+
+    def _chunked_X(
+        self,
+        X: Union[npt.ArrayLike, Callable[[], Iterable[npt.ArrayLike]]],
+        compute_statistics: bool,
+    ) -> _RowChunks:
+        """
+        Wraps `X` to stream it in chunks of rows with the centering and scaling
+        applied to each chunk.
+
+        Parameters
+        ----------
+        X : Array of shape (N, K) or callable
+            Predictor variables.
+
+        compute_statistics : bool
+            Whether to compute `X_mean` and `X_std` from `X`. If False, the statistics
+            of the previous fit are used. Computing the statistics takes a pass over
+            `X` and sets the shape of a callable `X`.
+
+        Returns
+        -------
+        X : _RowChunks
+            The streamed predictor variables.
+        """
+        X = _RowChunks(X, self.chunk_size, self.dtype)
+        if compute_statistics and (self.center_X or self.scale_X or X.shape is None):
+            X_mean, sum_sq = X.statistics()
+            if self.center_X:
+                self.X_mean = X_mean
+            if self.scale_X:
+                self.X_std = np.sqrt(sum_sq / (X.shape[0] - 1))
+                self.X_std[np.abs(self.X_std) <= self.eps] = 1
+        X.X_mean = self.X_mean if self.center_X else None
+        X.X_std = self.X_std if self.scale_X else None
+        return X
+
+    def _preprocess_sparse_X(
+        self, X: sp.spmatrix, compute_statistics: bool
+    ) -> Tuple[sp.spmatrix, Union[None, npt.NDArray[np.floating]]]:
+        """
+        Applies the scaling of a sparse `X` to its nonzero entries and returns the row
+        that must be subtracted from each row of the result to apply the centering.
+
+        Parameters
+        ----------
+        X : scipy.sparse matrix of shape (N, K)
+            Predictor variables.
+
+        compute_statistics : bool
+            Whether to compute `X_mean` and `X_std` from `X`. If False, the statistics
+            of the previous fit are used.
+
+        Returns
+        -------
+        X : scipy.sparse matrix of shape (N, K)
+            Scaled predictor variables in the CSR or CSC format.
+
+        X_offset : Array of shape (1, K) or None
+            Row of centering offsets on the scale of the returned `X`. None if
+            centering is not performed.
+        """
+        X = sparse.as_sparse(X, self.dtype)
+        if compute_statistics and (self.center_X or self.scale_X):
+            X_mean = sparse.column_sums(X) / X.shape[0]
+            if self.center_X:
+                self.X_mean = X_mean
+            if self.scale_X:
+                self.X_std = np.sqrt(
+                    sparse.column_sums_of_squares(X, X_mean) / (X.shape[0] - 1)
+                )
+                self.X_std[np.abs(self.X_std) <= self.eps] = 1
+        X_offset = self.X_mean if self.center_X else None
+        if self.scale_X:
+            X = sparse.scale_columns(X, self.X_std)
+            if X_offset is not None:
+                X_offset = X_offset / self.X_std
+        return X, X_offset
 
+    def fit_from_gram(
+        self,
+        XTX: npt.ArrayLike,
+        XTY: npt.ArrayLike,
+        N: int,
+        X_mean: Union[None, npt.ArrayLike],
+        Y_mean: Union[None, npt.ArrayLike],
+        X_std: Union[None, npt.ArrayLike],
+        Y_std: Union[None, npt.ArrayLike],
+        A: int,
+    ) -> None:
+        """
+        Fits Improved Kernel PLS Algorithm #2 using `A` components directly from the
+        products and column-wise statistics of `X` and `Y` without accessing `X` and `Y`
+        themselves. Centering and scaling are applied to `XTX` and `XTY` as specified
+        by `center_X`, `center_Y`, `scale_X`, and `scale_Y`. The result is the same as
+        calling `fit` on `X` and `Y`.
+
+        Parameters
+        ----------
+        XTX : Array of shape (K, K)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the predictor variables.
+
+        XTY : Array of shape (K, M) or (K,)
+            Product of the transposed uncentered and unscaled predictor variables and
+            the response variables.
+
+        N : int
+            Number of samples used to compute `XTX` and `XTY`.
+
+        X_mean : Array of shape (1, K) or (K,) or None
+            Column-wise mean of the predictor variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        Y_mean : Array of shape (1, M) or (M,) or None
+            Column-wise mean of the response variables. Only used if `center_X` or
+            `center_Y` is True.
+
+        X_std : Array of shape (1, K) or (K,) or None
+            Column-wise sample standard deviation of the predictor variables. Only used
+            if `scale_X` is True.
+
+        Y_std : Array of shape (1, M) or (M,) or None
+            Column-wise sample standard deviation of the response variables. Only used
+            if `scale_Y` is True.
+
+        A : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If `algorithm` is 1 or 3.
+
+            If a statistic needed for the requested centering or scaling is None.
+
+            If `stop_explained_variance` is not None.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine precision for np.float64.
+
+        See Also
+        --------
+        fit : Fits on `X` and `Y` directly.
+        """
+        if self.algorithm in [1, 3]:
+            raise ValueError(
+                "fit_from_gram is only supported by Improved Kernel PLS Algorithm #2."
+            )
+        XTX, XTY = self._preprocess_products(
+            XTX, XTY, N, X_mean, Y_mean, X_std, Y_std, centered=False
+        )
+        self.N = N
+        self._set_selected_algorithm(2)
+        self._reset_partial_fit()
+        self._main_loop(A, XTY, XTX=XTX)
+
+    def partial_fit(
+        self, X: npt.ArrayLike, Y: npt.ArrayLike, A: Union[None, int] = None
+    ) -> None:
+        """
+        Accumulates the statistics needed by Improved Kernel PLS Algorithm #2 from a
+        chunk of rows of `X` and `Y`. If `A` is given, the model is then fitted with `A`
+        components on all the rows accumulated so far. This allows fitting on data that
+        does not fit in memory by passing it in chunks, e.g. slices of a memory-mapped
+        array or items from a generator. The result is the same as calling `fit` on all
+        the chunks stacked vertically.
+
+        Parameters
+        ----------
+        X : Array of shape (N_chunk, K)
+            Chunk of predictor variables.
+
+        Y : Array of shape (N_chunk, M) or (N_chunk,)
+            Chunk of response variables.
+
+        A : int or None, optional, default=None
+            Number of components in the PLS model. If None, the statistics are only
+            accumulated, and no model is fitted.
+
+        Attributes
+        ----------
+        statistics : GramStatistics
+            Statistics of all the rows accumulated so far.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If `algorithm` is 1 or 3.
+
+            If the number of columns of `X` or `Y` differs from the previous chunks.
+
+            If `A` is given before any rows have been accumulated.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine precision for np.float64.
+
+        Notes
+        -----
+        The column-wise means and the centered cross-products are accumulated in a
+        `GramStatistics` instance which avoids the loss of precision of accumulating
+        raw sums of squares over many rows. Chunks without rows are skipped, which
+        allows passing e.g. the output of `numpy.array_split` directly. Calling `fit`
+        discards the accumulated statistics.
+        """
+        if self.algorithm in [1, 3]:
+            raise ValueError(
+                "partial_fit is only supported by Improved Kernel PLS Algorithm #2."
+            )
+        X = np.asarray(X, dtype=self.dtype)
+        Y = np.asarray(Y, dtype=self.dtype)
+
+        if Y.ndim == 1:
+            Y = Y.reshape(-1, 1)
+
+        if self.statistics is None:
+            self.statistics = GramStatistics(X.shape[1], Y.shape[1], self.dtype)
+        if X.shape[0] > 0:
+            self.statistics.update(X, Y)
+        elif X.shape[1] != self.statistics.K or Y.shape[1] != self.statistics.M:
+            raise ValueError(
+                f"Expected chunks of {self.statistics.K} predictor and "
+                f"{self.statistics.M} response variables, got {X.shape[1]} and "
+                f"{Y.shape[1]}."
+            )
+
+        if A is not None:
+            if self.statistics.N == 0:
+                raise ValueError(
+                    "partial_fit cannot fit a model before any rows have been "
+                    "accumulated."
+                )
+            self.fit_from_statistics(self.statistics, A)
+
+    def fit_from_statistics(self, statistics: GramStatistics, A: int) -> None:
+        """
+        Fits Improved Kernel PLS Algorithm #2 using `A` components on the column-wise
+        means and centered cross-products in `statistics`. The result is the same as
+        calling `fit` on the rows that `statistics` was computed from.
+
+        Parameters
+        ----------
+        statistics : GramStatistics
+            Statistics of `X` and `Y`, e.g. merged from statistics computed on
+            separate shards of the rows.
+
+        A : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If `algorithm` is 1 or 3.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine precision for np.float64.
+        """
+        if self.algorithm in [1, 3]:
+            raise ValueError(
+                "fit_from_statistics is only supported by Improved Kernel PLS "
+                "Algorithm #2."
+            )
+        N = statistics.N
+        XTX, XTY = self._preprocess_products(
+            statistics.XTX_centered,
+            statistics.XTY_centered,
+            N,
+            statistics.X_mean,
+            statistics.Y_mean,
+            statistics.X_std if self.scale_X else None,
+            statistics.Y_std if self.scale_Y else None,
+            centered=True,
+        )
+
+        # Column-wise sums of squares of the preprocessed Y.
+        YTY_diag = np.array(statistics.YTY_centered_diag, dtype=self.dtype)
+        if not self.center_Y:
+            YTY_diag += N * np.asarray(statistics.Y_mean, dtype=self.dtype) ** 2
+        if self.scale_Y:
+            YTY_diag /= self.Y_std**2
+
+        self.N = N
+        self._set_selected_algorithm(2)
+        self._main_loop(A, XTY, XTX=XTX, Y_ss=np.sum(YTY_diag))
+
+    def _preprocess_products(
+        self,
+        XTX: npt.ArrayLike,
+        XTY: npt.ArrayLike,
+        N: int,
+        X_mean: Union[None, npt.ArrayLike],
+        Y_mean: Union[None, npt.ArrayLike],
+        X_std: Union[None, npt.ArrayLike],
+        Y_std: Union[None, npt.ArrayLike],
+        centered: bool,
+    ) -> Tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """
+        Applies the centering and scaling of the model to `XTX` and `XTY` with
+        `preprocess_products` and stores the statistics that are applied.
+
+        Parameters
+        ----------
+        XTX : Array of shape (K, K)
+            Product of the transposed predictor variables and the predictor variables.
+
+        XTY : Array of shape (K, M) or (K,)
+            Product of the transposed predictor variables and the response variables.
+
+        N : int
+            Number of samples used to compute `XTX` and `XTY`.
+
+        X_mean, Y_mean, X_std, Y_std : Array or None
+            Column-wise statistics of the predictor and response variables.
+
+        centered : bool
+            Whether `XTX` and `XTY` are computed from the centered `X` and `Y`.
+
+        Returns
+        -------
+        XTX : Array of shape (K, K)
+            Preprocessed `XTX`.
+
+        XTY : Array of shape (K, M)
+            Preprocessed `XTY`.
+        """
+        XTX, XTY, X_mean, Y_mean, X_std, Y_std = preprocess_products(
+            XTX,
+            XTY,
+            N,
+            X_mean,
+            Y_mean,
+            X_std,
+            Y_std,
+            self.center_X,
+            self.center_Y,
+            self.scale_X,
+            self.scale_Y,
+            centered=centered,
+            eps=self.eps,
+            dtype=self.dtype,
+        )
+        for name, value in [
+            ("X_mean", X_mean),
+            ("Y_mean", Y_mean),
+            ("X_std", X_std),
+            ("Y_std", Y_std),
+        ]:
+            if value is not None:
+                setattr(self, name, value)
+        return XTX, XTY
+
+    def _lanczos(
+        self,
+        XTY: npt.NDArray[np.floating],
+        q_last: Union[None, npt.NDArray[np.floating]] = None,
+        n_vectors: int = 20,
+    ) -> Tuple[npt.NDArray[np.floating], float]:
+        """
+        Computes the dominant left singular vector of `XTY` with the restarted Lanczos
+        method applied to `XTY.T @ XTY` without forming the product.
+
+        Parameters
+        ----------
+        XTY : Array of shape (K, M)
+            Product of the preprocessed predictor and response variables.
+
+        q_last : Array of shape (M, 1) or None, optional, default=None
+            Loadings of the previous component used as the starting vector. If None or
+            if it is nearly orthogonal to the rows of `XTY`, then the row of `XTY` with
+            the largest norm is used instead.
+
+        n_vectors : int, optional, default=20
+            Maximum dimension of the Krylov subspace before restarting with the
+            dominant Ritz vector.
+
+        Returns
+        -------
+        w : Array of shape (K, 1)
+            The dominant left singular vector of `XTY`.
+
+        norm : float
+            The dominant singular value of `XTY`.
+        """
+        K, M = XTY.shape
+        n_vectors = min(n_vectors, K, M)
+        tol = 1000 * self.eps if self.tol is None else self.tol
+        v = XTY[np.argmax(np.einsum("ij,ij->i", XTY, XTY))]
+        if q_last is not None:
+            q_last = q_last.reshape(-1)
+            start_norm = la.norm(XTY @ q_last)
+            if start_norm > self.eps * la.norm(XTY) * la.norm(q_last):
+                v = q_last
+        v_norm = la.norm(v)
+        if np.isclose(v_norm, 0, atol=self.eps, rtol=0):
+            return np.zeros((K, 1), dtype=self.dtype), 0
+        v = v / v_norm
+        V = np.zeros((M, n_vectors), dtype=self.dtype)
+        alpha = np.zeros(n_vectors, dtype=self.dtype)
+        beta = np.zeros(n_vectors, dtype=self.dtype)
+        for _ in range(self.max_iter):
+            V[:] = 0
+            V[:, 0] = v
+            for j in range(n_vectors):
+                z = XTY.T @ (XTY @ V[:, j])
+                alpha[j] = V[:, j] @ z
+                # Full reorthogonalization, repeated once to counter cancellation
+                z = z - V @ (V.T @ z)
+                z = z - V @ (V.T @ z)
+                beta[j] = la.norm(z)
+                if j + 1 < n_vectors:
+                    if beta[j] > self.eps * alpha[0]:
+                        V[:, j + 1] = z / beta[j]
+                    else:
+                        # The Krylov subspace is invariant.
+                        V[:, j + 1] = 0
+            T = (
+                np.diag(alpha)
+                + np.diag(beta[:-1], k=1)
+                + np.diag(beta[:-1], k=-1)
+            )
+            theta, S = la.eigh(T)
+            v = V @ S[:, -1]
+            if abs(beta[-1] * S[-1, -1]) <= tol * theta[-1]:
+                break
+        w = XTY @ v.reshape(-1, 1)
+        norm = la.norm(w)
+        return w / norm, norm
+
+    def _main_loop(
+        self,
+        A: int,
+        XTY: npt.NDArray[np.floating],
+        X: Union[None, npt.NDArray[np.floating]] = None,
+        XTX: Union[None, npt.NDArray[np.floating]] = None,
+        start: int = 0,
+        Y_ss: Union[None, float] = None,
+        X_offset: Union[None, npt.NDArray[np.floating]] = None,
+    ) -> None:
+        """
+        Runs steps 2-5 of Improved Kernel PLS for `A` components and stores the
+        resulting matrices as attributes. Step 4 uses `X` if it is given (Algorithm
+        #1) and `XTX` otherwise (Algorithm #2). The deflated `XTY` and `XTX` are kept
+        to allow extending the model with `extend`. If a stopping rule is met, the
+        loop ends, and the matrices are truncated to the extracted components.
+
+        Parameters
+        ----------
+        A : int
+            Number of components in the PLS model.
+
+        XTY : Array of shape (K, M)
+            Product of the preprocessed predictor and response variables.
+
+        X : Array or sparse matrix of shape (N, K) or None, optional, default=None
+            Preprocessed predictor variables, or a `_RowChunks` that streams them.
+
+        XTX : Array of shape (K, K) or None, optional, default=None
+            Product of the preprocessed predictor variables with themselves.
+
+        start : int, optional, default=0
+            Number of components of the current model to keep. The loop continues
+            from component `start`, and `XTY` must already be deflated by the kept
+            components.
+
+        Y_ss : float or None, optional, default=None
+            Total sum of squares of the preprocessed response variables. Only used by
+            `stop_explained_variance`. Ignored if `start` is greater than 0, in which
+            case the value of the previous fit is used.
+
+        X_offset : Array of shape (1, K) or None, optional, default=None
+            Row implicitly subtracted from each row of a sparse `X` to center it. If
+            None, `X` is used as is.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If `stop_explained_variance` is not None and `Y_ss` is not available.
+        """
+        K, M = XTY.shape
+        if start == 0:
+            self._XTY_norm = la.norm(XTY)
+            self._Y_ss = Y_ss
+        if self.stop_explained_variance is not None and self._Y_ss is None:
+            raise ValueError(
+                "stop_explained_variance requires the sum of squares of Y, which is "
+                "not available when fitting with fit_from_gram."
+            )
+
+        W = np.zeros(shape=(A, K), dtype=self.dtype)
+        P = np.zeros(shape=(A, K), dtype=self.dtype)
+        Q = np.zeros(shape=(A, M), dtype=self.dtype)
+        R = np.zeros(shape=(A, K), dtype=self.dtype)
+        if X is not None:
+            T = np.zeros(shape=(A, X.shape[0]), dtype=self.dtype)
+        q = None
+        if start > 0:
+            W[:start] = self.W.T
+            P[:start] = self.P.T
+            Q[:start] = self.Q.T
+            R[:start] = self.R.T
+            if X is not None:
+                T[:start] = self.T.T
+            q = Q[start - 1 : start].T
+        self.W = W.T
+        self.P = P.T
+        self.Q = Q.T
+        self.R = R.T
+        self.T = T.T if X is not None else None
+        self.A = A
+        self.K = K
+        self.M = M
+
+        for i in range(start, A):
+            # Step 2
+            if M == 1:
+                norm = la.norm(XTY, ord=2)
+                if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                    self._weight_warning(i)
+                    break
+                w = XTY / norm
+            elif self.eigensolver == "lanczos":
+                w, norm = self._lanczos(XTY, q)
+                if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                    self._weight_warning(i)
+                    break
+            else:
+                if M < K:
+                    XTYTXTY = XTY.T @ XTY
+                    eig_vals, eig_vecs = la.eigh(XTYTXTY)
+                    q = eig_vecs[:, -1:]
+                    w = XTY @ q
+                    norm = la.norm(w)
+                    if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                        self._weight_warning(i)
+                        break
+                    w = w / norm
+                else:
+                    XTYYTX = XTY @ XTY.T
+                    eig_vals, eig_vecs = la.eigh(XTYYTX)
+                    norm = eig_vals[-1]
+                    if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                        self._weight_warning(i)
+                        break
+                    w = eig_vecs[:, -1:]
+            W[i] = w.squeeze()
+
+            # Step 3
+            r = w - R[:i].T @ (P[:i] @ w)
+            R[i] = r.squeeze()
+
+            # Step 4
+            if isinstance(X, _RowChunks):
+                # A single pass over the chunks of X computes t and X^T t
+                t, XTt = X.scores(r)
+                T[i] = t.squeeze()
+                tTt = t.T @ t
+                p = XTt / tTt
+            elif X is not None:
+                t = sparse.product(X, r, X_offset)
+                T[i] = t.squeeze()
+                tTt = t.T @ t
+                p = sparse.transpose_product(X, t, X_offset) / tTt
+            else:
+                rXTX = r.T @ XTX
+                tTt = rXTX @ r
+                p = rXTX.T / tTt
+            q = (r.T @ XTY).T / tTt
+            P[i] = p.squeeze()
+            Q[i] = q.squeeze()
+
+            # Step 5
+            XTY = XTY - (p @ q.T) * tTt
+
+            state = {"w": w, "p": p, "q": q, "r": r, "tTt": tTt, "XTY": XTY}
+            XTY_norm = la.norm(XTY) if self.stop_XTY_norm is not None else None
+            if self._stopping_rule_met(i + 1, q, tTt, XTY_norm, state):
+                A = i + 1
+                W, P, Q, R = W[:A], P[:A], Q[:A], R[:A]
+                self.W = W.T
+                self.P = P.T
+                self.Q = Q.T
+                self.R = R.T
+                if X is not None:
+                    self.T = T[:A].T
+                self.A = A
+                break
+
+        self._XTY = XTY
+        self._XTX = XTX
+
+        self._store_B(R, Q)
+
+    def _kernel_main_loop(
+        self,
+        A: int,
+        X: npt.NDArray[np.floating],
+        Y: npt.NDArray[np.floating],
+        Y_ss: float,
+        X_offset: Union[None, npt.NDArray[np.floating]] = None,
+    ) -> None:
+        """
+        Runs the wide kernel form of PLS (Algorithm #3) for `A` components and stores
+        the resulting matrices as attributes. The scores are extracted from the (N, N)
+        Gram matrix `XXT`, which is deflated instead of `XTY`. The weights and loadings
+        in the space of the predictor variables are computed after the loop with a
+        single product with `X`.
+
+        Parameters
+        ----------
+        A : int
+            Number of components in the PLS model.
+
+        X : Array or scipy.sparse matrix of shape (N, K)
+            Preprocessed predictor variables.
+
+        Y : Array of shape (N, M)
+            Preprocessed response variables.
+
+        Y_ss : float
+            Total sum of squares of the preprocessed response variables.
+
+        X_offset : Array of shape (1, K) or None, optional, default=None
+            Row implicitly subtracted from each row of a sparse `X` to center it. If
+            None, `X` is used as is.
+
+        Returns
+        -------
+        None.
+        """
+        N, K = X.shape
+        M = Y.shape[1]
+
+        # Step 1
+        XXT = sparse.gram(X, X_offset)
+        YTXXTY = Y.T @ XXT @ Y
+        self._XTY_norm = np.sqrt(np.trace(YTXXTY))
+        self._Y_ss = Y_ss
+
+        # The weight of each component is X^T v
+        V = np.zeros(shape=(A, N), dtype=self.dtype)
+        T = np.zeros(shape=(A, N), dtype=self.dtype)
+        Q = np.zeros(shape=(A, M), dtype=self.dtype)
+        tTts = np.ones(shape=(A, 1), dtype=self.dtype)
+
+        for i in range(A):
+            # Step 2. The weight is X^T u up to normalization, where Y^T u is the
+            # dominant eigenvector of YTXXTY = XTY^T XTY.
+            if M == 1:
+                u = Y
+            else:
+                eig_vals, eig_vecs = la.eigh(YTXXTY)
+                u = Y @ eig_vecs[:, -1:]
+            XXTu = XXT @ u
+            norm = np.sqrt(max((u.T @ XXTu).item(), 0))
+            if np.isclose(norm, 0, atol=self.eps, rtol=0):
+                self._weight_warning(i)
+                break
+
+            # Step 3. Project u onto the orthogonal complement of the previous scores
+            # to express the weight with the undeflated X.
+            v = u - T[:i].T @ ((T[:i] @ u) / tTts[:i])
+            V[i] = v.squeeze() / norm
+
+            # Step 4
+            t = XXTu / norm
+            T[i] = t.squeeze()
+            tTt = t.T @ t
+            tTts[i] = tTt
+            q = (Y.T @ t) / tTt
+            Q[i] = q.squeeze()
+
+            # Step 5. Deflate XXT by projecting out t from both sides.
+            XXTt = XXT @ t
+            c = (t.T @ XXTt) / tTt**2
+            XXT = XXT - (t @ XXTt.T + XXTt @ t.T) / tTt + c * (t @ t.T)
+            YTt = Y.T @ t
+            YTXXTt = Y.T @ XXTt
+            YTXXTY = (
+                YTXXTY - (YTt @ YTXXTt.T + YTXXTt @ YTt.T) / tTt + c * (YTt @ YTt.T)
+            )
+
+            state = {"q": q, "t": t, "tTt": tTt}
+            XTY_norm = np.sqrt(max(np.trace(YTXXTY), 0))
+            if self._stopping_rule_met(i + 1, q, tTt, XTY_norm, state):
+                A = i + 1
+                V, T, Q, tTts = V[:A], T[:A], Q[:A], tTts[:A]
+                break
+
+        # Compute the weights and the X loadings from X
+        WP = sparse.transpose_product(X, np.concatenate([V, T]).T, X_offset).T
+        W = WP[:A]
+        P = WP[A:] / tTts
+        R = np.zeros(shape=(A, K), dtype=self.dtype)
+        for i in range(A):
+            r = W[i] - R[:i].T @ (P[:i] @ W[i])
+            R[i] = r
+
+        # Keep the deflated XTY to allow extending the model with Algorithm #1
+        self._XTY = sparse.transpose_product(
+            X, Y - T.T @ ((T @ Y) / tTts), X_offset
+        )
+        self._XTX = None
+
+        self.W = W.T
+        self.P = P.T
+        self.Q = Q.T
+        self.R = R.T
+        self.T = T.T
+        self.A = A
+        self.K = K
+        self.M = M
+        self._store_B(R, Q)
+
+    def _stopping_rule_met(
+        self,
+        n_components: int,
+        q: npt.NDArray[np.floating],
+        tTt: npt.NDArray[np.floating],
+        XTY_norm: float,
+        state: dict,
+    ) -> bool:
+        """
+        Checks whether any of the configured stopping rules is met after extracting a
+        component.
+
+        Parameters
+        ----------
+        n_components : int
+            Number of components extracted so far.
+
+        q : Array of shape (M, 1)
+            Y loadings of the extracted component.
+
+        tTt : Array of shape (1, 1)
+            Squared norm of the scores of the extracted component.
+
+        XTY_norm : float
+            Frobenius norm of the cross-covariance matrix deflated by the extracted
+            component.
+
+        state : dict
+            State of the extracted component passed to `stop_callback`.
+
+        Returns
+        -------
+        bool
+            Whether component extraction should stop.
+        """
+        if self.stop_XTY_norm is not None:
+            if XTY_norm <= self.stop_XTY_norm * self._XTY_norm:
+                return True
+        if self.stop_explained_variance is not None:
+            explained = tTt.item() * (q.T @ q).item()
+            if explained < self.stop_explained_variance * self._Y_ss:
+                return True
+        if self.stop_callback is not None:
+            if self.stop_callback(n_components, state):
+                return True
+        return False
+
+    def _store_B(
+        self, R: npt.NDArray[np.floating], Q: npt.NDArray[np.floating]
+    ) -> None:
+        """
+        Computes the regression coefficients selected by `store_B` and stores them in
+        `B`.
+
+        Parameters
+        ----------
+        R : Array of shape (A, K)
+            PLS weights matrix to compute scores T directly from original X.
+
+        Q : Array of shape (A, M)
+            PLS Loadings matrix for Y.
+
+        Returns
+        -------
+        None.
+        """
+        # Components after an early stop have zero weights and thus repeat the
+        # coefficients of the last extracted component.
+        self._B_cache = OrderedDict()
+        if self.store_B == "all":
+            self.B = _cumulative_outer_products(R, Q)
+        elif self.store_B == "last":
+            self.B = R.T @ Q
+        else:
+            self.B = None
+
+    def extend(
+        self, additional_components: int, X: Union[None, npt.ArrayLike] = None
+    ) -> None:
+        """
+        Extends the fitted model by `additional_components` components. The deflated
+        `XTY` and the matrices of the previous fit are kept, so only the additional
+        components are computed. The result is the same as fitting with
+        `A + additional_components` components on the same data.
+
+        Parameters
+        ----------
+        additional_components : int
+            Number of components to add to the PLS model.
+
+        X : Array or sparse matrix of shape (N, K) or None, optional, default=None
+            Predictor variables passed to the previous fit. Only used by Improved
+            Kernel PLS Algorithm #1 and #3, which require it. Algorithm #2 uses the
+            `XTX` kept from the previous fit. A numpy.memmap or a callable returning
+            row chunks is streamed in chunks.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted.
+
+            If Improved Kernel PLS Algorithm #1 or #3 was used for fitting and `X` is
+            None.
+
+        Warns
+        -----
+        UserWarning.
+            If at any point during iteration over the number of components `A`, the
+            residual goes below machine precision for np.float64.
+
+        Notes
+        -----
+        Keeping the state of the previous fit requires storing `XTY`, and for
+        Improved Kernel PLS Algorithm #2, also `XTX`. `X` is centered and scaled with
+        the statistics of the previous fit, so it must be the same data. The stopping
+        rules also apply to the additional components. A model fitted with Algorithm
+        #3 is extended with the steps of Algorithm #1.
+        """
+        if self._XTY is None:
+            raise ValueError("The model must be fitted before it can be extended.")
+        A = self.A + additional_components
+        if self.selected_algorithm == 2:
+            self._main_loop(A, self._XTY, XTX=self._XTX, start=self.A)
+            return
+        if X is None:
+            raise ValueError(
+                "X must be given to extend Improved Kernel PLS Algorithm "
+                f"#{self.selected_algorithm}."
+            )
+        X_offset = None
+        if sp.issparse(X):
+            X, X_offset = self._preprocess_sparse_X(X, compute_statistics=False)
+        elif self._is_chunked(X):
+            X = self._chunked_X(X, compute_statistics=False)
+            X.shape = (self.N, self.K)
+        else:
+            X = np.asarray(X, dtype=self.dtype)
+            if (self.center_X or self.scale_X) and self.copy:
+                X = X.copy()
+            if self.center_X:
+                X -= self.X_mean
+            if self.scale_X:
+                X /= self.X_std
+        self._main_loop(A, self._XTY, X=X, start=self.A, X_offset=X_offset)
+
+    def get_B(self, n_components: int) -> npt.NDArray[np.floating]:
+        """
+        Returns the regression coefficients for `n_components` components. If they are
+        not stored in `B`, then they are computed from `R` and `Q` and cached.
+
+        Parameters
+        ----------
+        n_components : int
+            Number of components in the PLS model.
+
+        Returns
+        -------
+        B : Array of shape (K, M)
+            PLS regression coefficients matrix for `n_components` components.
+        """
+        if self.B is not None and self.B.ndim == 3:
+            return self.B[n_components - 1]
+        if self.B is not None and n_components == self.A:
+            return self.B
+        if n_components in self._B_cache:
+            self._B_cache.move_to_end(n_components)
+            return self._B_cache[n_components]
+        B = self.R[:, :n_components] @ self.Q[:, :n_components].T
+        self._B_cache[n_components] = B
+        if len(self._B_cache) > _B_CACHE_SIZE:
+            self._B_cache.popitem(last=False)
+        return B
+
+    def predict(
+        self, X: npt.ArrayLike, n_components: Union[None, int] = None
+    ) -> npt.NDArray[np.floating]:
+        """
+        Predicts with Improved Kernel PLS Algorithm #1 on `X` with `B` using
+        `n_components` components. If `n_components` is None, then predictions are
+        returned for all number of components.
+
+        Parameters
+        ----------
+        X : Array or scipy.sparse matrix of shape (N, K) or callable
+            Predictor variables. A numpy.memmap or a callable returning row chunks is
+            streamed in chunks.
+
+        n_components : int or None, optional, default=None.
+            Number of components in the PLS model. If None, then all number of
+            components are used.
+
+        Returns
+        -------
+        Y_pred : Array of shape (N, M) or (A, N, M)
+            If `n_components` is an int, then an array of shape (N, M) with the
+            predictions for that specific number of components is used. If
+            `n_components` is None, returns a prediction for each number of components
+            up to `A`.
+        """
+        if n_components is None:
+            # The centering and scaling of Y are undone after the cumulative sums
+            matrix, intercept = self._fold_X_preprocessing(self.R)
+        else:
+            matrix, intercept = self._fold_preprocessing(self.get_B(n_components))
+        if sp.issparse(X):
+            X = sparse.as_sparse(X, self.dtype)
+        elif self._is_chunked(X):
+            # Predict on one chunk at a time
+            chunks = _RowChunks(X, self.chunk_size, self.dtype).raw_chunks()
+            Y_preds = [
+                self._predict_folded(chunk, matrix, intercept, n_components)
+                for chunk in chunks
+            ]
+            return np.concatenate(Y_preds, axis=-2)
+        else:
+            X = np.asarray(X, dtype=self.dtype)
+        return self._predict_folded(X, matrix, intercept, n_components)
+
+    def export_predictor(
+        self,
+        n_components: Union[None, int] = None,
+        dtype: Union[None, np.floating] = None,
+    ) -> LinearPredictor:
+        """
+        Exports the fitted model with `n_components` components as an immutable
+        predictor. The centering and scaling of `X` and `Y` are folded into a single
+        matrix of regression coefficients and an intercept.
+
+        Parameters
+        ----------
+        n_components : int or None, optional, default=None
+            Number of components in the PLS model. If None, then `A` components are
+            used.
+
+        dtype : numpy.float or None, optional, default=None
+            The float datatype of the predictor, e.g., numpy.float32 to halve the
+            memory traffic of predicting. If None, `dtype` of the model is used. The
+            folding is computed in `dtype` of the model before converting.
+
+        Returns
+        -------
+        predictor : LinearPredictor
+            A predictor whose `predict` and `predict_into` methods return the same
+            predictions as `predict` with `n_components` components.
+
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted.
+        """
+        if self.R is None:
+            raise ValueError("The model must be fitted before it can be exported.")
+        if n_components is None:
+            n_components = self.A
+        B, intercept = self._fold_preprocessing(self.get_B(n_components))
+        if intercept is None:
+            intercept = np.zeros(shape=(1, self.M), dtype=self.dtype)
+        return LinearPredictor(
+            B, intercept, dtype=self.dtype if dtype is None else dtype
+        )
+
+    def _fold_X_preprocessing(
+        self, W: npt.NDArray[np.floating]
+    ) -> Tuple[npt.NDArray[np.floating], Union[None, npt.NDArray[np.floating]]]:
+        """
+        Folds the centering and scaling of `X` into a matrix that multiplies the
+        preprocessed `X`, so that the product can be computed from the original `X`.
+
+        Parameters
+        ----------
+        W : Array of shape (K, L)
+            Matrix that multiplies the preprocessed `X`.
+
+        Returns
+        -------
+        W : Array of shape (K, L)
+            Matrix that multiplies the original `X`.
+
+        intercept : Array of shape (1, L) or None
+            Row added to the product. None if `X` is not centered.
+        """
+        if self.scale_X:
+            W = W / self.X_std.T
+        intercept = -self.X_mean @ W if self.center_X else None
+        return W, intercept
+
+    def _fold_preprocessing(
+        self, B: npt.NDArray[np.floating]
+    ) -> Tuple[npt.NDArray[np.floating], Union[None, npt.NDArray[np.floating]]]:
+        """
+        Folds the centering and scaling of `X` and `Y` into regression coefficients,
+        so that predictions on the original scale are computed as `X @ B + intercept`
+        without preprocessed copies of `X` or the predictions.
+
+        Parameters
+        ----------
+        B : Array of shape (K, M)
+            PLS regression coefficients matrix.
+
+        Returns
+        -------
+        B : Array of shape (K, M)
+            Regression coefficients for the original `X` and `Y`.
+
+        intercept : Array of shape (1, M) or None
+            Row added to the predictions. None if neither `X` nor `Y` is centered.
+        """
+        B, intercept = self._fold_X_preprocessing(B)
+        if self.scale_Y:
+            B = B * self.Y_std
+            if intercept is not None:
+                intercept = intercept * self.Y_std
+        if self.center_Y:
+            intercept = self.Y_mean if intercept is None else intercept + self.Y_mean
+        return B, intercept
+
+    def _predict_folded(
+        self,
+        X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+        matrix: npt.NDArray[np.floating],
+        intercept: Union[None, npt.NDArray[np.floating]],
+        n_components: Union[None, int],
+    ) -> npt.NDArray[np.floating]:
+        """
+        Predicts with the matrix and intercept returned by `_fold_X_preprocessing`
+        (for all numbers of components) or `_fold_preprocessing`.
+
+        Parameters
+        ----------
+        X : Array or scipy.sparse matrix of shape (N, K)
+            Predictor variables.
+
+        matrix : Array of shape (K, A) or (K, M)
+            `R` or `B` with the preprocessing folded in.
+
+        intercept : Array of shape (1, A) or (1, M) or None
+            Row added to the product of `X` with `matrix`.
+
+        n_components : int or None
+            Number of components in the PLS model. If None, then all number of
+            components are used.
+
+        Returns
+        -------
+        Y_pred : Array of shape (N, M) or (A, N, M)
+            Predictions on the original scale of the response variables.
+        """
+        product = X @ matrix
+        if intercept is not None:
+            product = product + intercept
+        if n_components is not None:
+            return product
+        # Cumulative sums of the rank one contributions of each component avoid the
+        # product with the (A, K, M) tensor B. The product holds the scores T.
+        Y_pred = _cumulative_outer_products(product.T, self.Q.T)
         if self.scale_Y:
-            Y_pred = Y_pred * self.Y_std
+            Y_pred *= self.Y_std
         if self.center_Y:
-            Y_pred = Y_pred + self.Y_mean
+            Y_pred += self.Y_mean
         return Y_pred
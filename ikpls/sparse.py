@@ -0,0 +1,250 @@
+"""
+Contains functions for computing the products needed by Improved Kernel PLS by Dayal
+and MacGregor on scipy.sparse matrices:
+https://doi.org/10.1002/(SICI)1099-128X(199701)11:1%3C73::AID-CEM435%3E3.0.CO;2-%23
+
+Centering a sparse matrix makes it dense. Instead, each function takes a row `offset`
+that is implicitly subtracted from every row of `X`, and the products with the shifted
+`X` are computed from products with the sparse `X` corrected by rank-one terms. The
+functions also accept dense arrays, in which case `offset` is typically None. The
+implementation is written using NumPy and SciPy.
+
+Author: Ole-Christian Galbo Engstrøm
+E-mail: ole.e@di.ku.dk
+"""
+
+from typing import Union
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+
+
+def as_sparse(X: sp.spmatrix, dtype: np.floating = np.float64) -> sp.spmatrix:
+    """
+    Converts a sparse matrix to the CSR or CSC format with the given datatype. The
+    data is not copied if `X` already has a compressed format and the datatype.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix of shape (N, K)
+        Sparse predictor variables.
+
+    dtype : numpy.float, default=numpy.float64
+        The float datatype of the result.
+
+    Returns
+    -------
+    X : scipy.sparse matrix of shape (N, K)
+        `X` in the CSR or CSC format.
+    """
+    if X.format not in ["csr", "csc"]:
+        X = X.tocsr()
+    return X.astype(dtype, copy=False)
+
+
+def scale_columns(X: sp.spmatrix, scale: npt.NDArray[np.floating]) -> sp.spmatrix:
+    """
+    Divides each column of a sparse matrix by its scale. The result has the same
+    sparsity pattern as `X`.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix of shape (N, K)
+        Sparse predictor variables.
+
+    scale : Array of shape (1, K)
+        Scale of each column. Must not contain zeros.
+
+    Returns
+    -------
+    X_scaled : scipy.sparse matrix of shape (N, K)
+        `X` with each column divided by its scale.
+    """
+    return (X @ sp.diags(1 / scale.ravel())).asformat(X.format)
+
+
+def column_sums(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the column-wise sums of `X` shifted by `offset`.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    sums : Array of shape (1, K)
+        Column-wise sums of the shifted `X`.
+    """
+    sums = np.asarray(X.sum(axis=0)).reshape(1, -1)
+    if offset is not None:
+        sums = sums - X.shape[0] * offset
+    return sums
+
+
+def column_sums_of_squares(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the column-wise sums of squares of `X` shifted by `offset`. For a sparse
+    `X`, the squared deviations of the stored entries are summed, and each implicit
+    zero contributes the square of its offset. This avoids the catastrophic
+    cancellation of subtracting the squared offset from the raw sums of squares.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    sums_of_squares : Array of shape (1, K)
+        Column-wise sums of squares of the shifted `X`.
+    """
+    if not sp.issparse(X):
+        if offset is not None:
+            X = X - offset
+        return np.expand_dims(np.einsum("ij,ij -> j", X, X), axis=0)
+    N, K = X.shape
+    X = X.tocoo(copy=True)
+    X.sum_duplicates()
+    if offset is None:
+        return np.bincount(X.col, weights=X.data**2, minlength=K).reshape(1, -1)
+    offset = offset.ravel()
+    deviations = X.data - offset[X.col]
+    sums_of_squares = np.bincount(X.col, weights=deviations**2, minlength=K)
+    num_zeros = N - np.bincount(X.col, minlength=K)
+    return (sums_of_squares + num_zeros * offset**2).reshape(1, -1)
+
+
+def product(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    Z: npt.NDArray[np.floating],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the product of `X` shifted by `offset` with `Z`.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    Z : Array of shape (K, L)
+        Dense right-hand side.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    XZ : Array of shape (N, L)
+        Product of the shifted `X` with `Z`.
+    """
+    XZ = X @ Z
+    if offset is not None:
+        XZ = XZ - offset @ Z
+    return XZ
+
+
+def transpose_product(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    Z: npt.NDArray[np.floating],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the product of the transpose of `X` shifted by `offset` with `Z`.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    Z : Array of shape (N, L)
+        Dense right-hand side.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    XTZ : Array of shape (K, L)
+        Product of the transpose of the shifted `X` with `Z`.
+    """
+    XTZ = X.T @ Z
+    if offset is not None:
+        XTZ = XTZ - offset.T @ Z.sum(axis=0, keepdims=True)
+    return XTZ
+
+
+def cross_product(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the dense product of the transpose of `X` shifted by `offset` with
+    itself.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    XTX : Array of shape (K, K)
+        Product of the transpose of the shifted `X` with itself.
+    """
+    XTX = X.T @ X
+    if sp.issparse(XTX):
+        XTX = XTX.toarray()
+    if offset is not None:
+        sums = column_sums(X)
+        XTX = (
+            XTX - offset.T @ sums - sums.T @ offset + X.shape[0] * (offset.T @ offset)
+        )
+    return XTX
+
+
+def gram(
+    X: Union[sp.spmatrix, npt.NDArray[np.floating]],
+    offset: Union[None, npt.NDArray[np.floating]] = None,
+) -> npt.NDArray[np.floating]:
+    """
+    Computes the dense Gram matrix of `X` shifted by `offset`.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or Array of shape (N, K)
+        Predictor variables.
+
+    offset : Array of shape (1, K) or None, optional, default=None
+        Row subtracted from each row of `X`. If None, `X` is not shifted.
+
+    Returns
+    -------
+    XXT : Array of shape (N, N)
+        Product of the shifted `X` with its transpose.
+    """
+    XXT = X @ X.T
+    if sp.issparse(XXT):
+        XXT = XXT.toarray()
+    if offset is not None:
+        X_offset = X @ offset.T
+        XXT = XXT - X_offset - X_offset.T + offset @ offset.T
+    return XXT
@@ -0,0 +1,91 @@
+import argparse
+import csv
+import os
+import time
+
+import jax
+
+from ikpls.jax_ikpls_alg_1 import PLS as JAX_PLS_Alg_1
+from ikpls.jax_ikpls_alg_2 import PLS as JAX_PLS_Alg_2
+from timings.timings import gen_random_data
+
+jax.config.update("jax_enable_x64", True)
+
+
+def time_compilation(pls, X, Y, n_components):
+    """
+    Returns the time in seconds taken to trace and lower `pls.stateless_fit` and the
+    time taken to compile it for `n_components` components.
+    """
+    start = time.perf_counter()
+    lowered = type(pls).stateless_fit.lower(pls, X, Y, n_components)
+    trace_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lowered.compile()
+    compile_time = time.perf_counter() - start
+    return trace_time, compile_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the time taken to trace and compile the JAX PLS "
+        "implementations as a function of the number of components."
+    )
+    parser.add_argument(
+        "-model",
+        type=str,
+        default="jax2",
+        help="Model to use. Must be either 'jax1', 'jax2', 'diffjax1', or 'diffjax2'.",
+    )
+    parser.add_argument(
+        "-n_components",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10, 20, 50, 100],
+        help="Numbers of components to compile for.",
+    )
+    parser.add_argument("-n", type=int, default=1000, help="Number of samples.")
+    parser.add_argument("-k", type=int, default=500, help="Number of features.")
+    parser.add_argument("-m", type=int, default=10, help="Number of targets.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="timings/user_compilation_timings.csv",
+        help="Output file to write timings to.",
+    )
+    args = parser.parse_args()
+
+    X, Y = gen_random_data(args.n, args.k, args.m)
+    pls_class = JAX_PLS_Alg_1 if args.model.endswith("1") else JAX_PLS_Alg_2
+    reverse_differentiable = args.model.startswith("diff")
+
+    write_header = not os.path.isfile(args.output)
+    with open(args.output, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(
+                ["model", "n_components", "n", "k", "m", "trace_time", "compile_time"]
+            )
+        pls = pls_class(reverse_differentiable=reverse_differentiable)
+        for n_components in args.n_components:
+            trace_time, compile_time = time_compilation(pls, X, Y, n_components)
+            print(
+                f"{args.model} A={n_components}: trace {trace_time:.2f} s, "
+                f"compile {compile_time:.2f} s"
+            )
+            writer.writerow(
+                [
+                    args.model,
+                    n_components,
+                    args.n,
+                    args.k,
+                    args.m,
+                    trace_time,
+                    compile_time,
+                ]
+            )
+
+
+if __name__ == "__main__":
+    main()
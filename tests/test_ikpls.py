@@ -12,22 +12,37 @@ Author: Ole-Christian Galbo Engstrøm
 E-mail: ole.e@di.ku.dk
 """
 
+import contextlib
+import io
+import os
+import pickle
+import subprocess
+import sys
 from itertools import product
-from typing import Callable, Optional, Tuple, Union
+from typing import Any, Callable, Optional, Tuple, Union
 
 import jax
 import numpy as np
 import numpy.typing as npt
 import pytest
+import scipy.sparse as sp
 from jax import numpy as jnp
+from jax.experimental.compilation_cache import compilation_cache
+from joblib import parallel_config
 from numpy.testing import assert_allclose
 from sklearn.cross_decomposition import PLSRegression as SkPLS
 from sklearn.datasets import load_linnerud
 from sklearn.model_selection import cross_validate
 
+import ikpls
+from ikpls.algorithm_selection import CostModel, make_jax_pls, select_algorithm
+from ikpls.fast_cross_validation.jax_ikpls import PLS as JAXFastCVPLS
 from ikpls.fast_cross_validation.numpy_ikpls import PLS as FastCVPLS
+from ikpls.gram_statistics import GramStatistics
 from ikpls.jax_ikpls_alg_1 import PLS as JAX_Alg_1
 from ikpls.jax_ikpls_alg_2 import PLS as JAX_Alg_2
+from ikpls.jax_ikpls_alg_3 import PLS as JAX_Alg_3
+from ikpls.linear_predictor import LinearPredictor
 from ikpls.numpy_ikpls import PLS as NpPLS
 
 from . import load_data
@@ -86,6 +101,35 @@ class TestClass:
         target_values = self.csv[values].to_numpy()
         return target_values
 
+    def count_traces(
+        self, name: str, func: Callable[..., Any], *args, **kwargs
+    ) -> Tuple[Any, int]:
+        """
+        Description
+        -----------
+        Call `func` and count how many times the jitted function `name` is traced
+        during the call. Tracing happens exactly when a jitted function is compiled.
+        The count relies on the messages printed by JAX PLS instances with
+        `verbose=True`.
+
+        Parameters
+        ----------
+        name : str
+            Name of the jitted function as printed in the verbose messages.
+
+        func : Callable
+            The function to call with `args` and `kwargs`.
+
+        Returns
+        -------
+        Tuple[Any, int]
+            The result of `func` and the number of times `name` was traced.
+        """
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            result = func(*args, **kwargs)
+        lines = output.getvalue().splitlines()
+        return result, sum(line.startswith(f"{name} for ") for line in lines)
+
     def fit_models(
         self, X: npt.NDArray, Y: npt.NDArray, n_components: int
     ) -> Tuple[
@@ -3934,3 +3978,2138 @@ class TestClass:
         assert Y.shape[1] > 1
         assert Y.shape[1] > X.shape[1]
         self.check_center_scale_combinations(X, Y, splits, atol=0, rtol=1e-8)
+
+    def check_masked_cross_val_pls(self, X, Y, splits, atol, rtol):
+        """
+        Description
+        -----------
+        This method tests that cross-validation with fixed-shape masks yields the same
+        root mean square errors (RMSE) as the ordinary JAX cross-validation for all
+        possible combinations of centering and scaling, both when evaluating one fold
+        at a time and when evaluating batches of folds with `jax.vmap`. The metric
+        function receives the validation weights to exclude the padding of the
+        smaller folds. It also tests that the fixed-shape cross-validation is JIT
+        compiled only once for all folds. Finally, it tests that a metric function
+        receiving only the true and predicted values yields the same RMSEs for folds
+        of equal sizes and is rejected for folds of different sizes.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        splits : numpy.ndarray
+            Split indices for cross-validation.
+
+        atol : float
+            Absolute tolerance for value comparisons.
+
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+
+        Raises
+        ------
+        AssertionError
+            If the RMSEs of the masked cross-validation are not equal to those of the
+            ordinary cross-validation down to the specified tolerance.
+
+            If the masked cross-validation is JIT compiled more than once.
+
+            If a metric function without the validation weights is not rejected for
+            folds of different sizes.
+        """
+
+        center_scale_combinations = product([False, True], repeat=4)
+
+        # Apply the identity function for this test
+        def cross_val_preprocessing(
+            X_train: jnp.ndarray,
+            Y_train: jnp.ndarray,
+            X_val: jnp.ndarray,
+            Y_val: jnp.ndarray,
+        ) -> Tuple[jnp.ndarray, jnp.ndarray, jnp.ndarray, jnp.ndarray]:
+            return X_train, Y_train, X_val, Y_val
+
+        def jax_rmse_per_component(
+            Y_true: jnp.ndarray, Y_pred: jnp.ndarray
+        ) -> jnp.ndarray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = jnp.mean(se, axis=-2)
+            rmse = jnp.sqrt(mse)
+            return rmse
+
+        def jax_masked_rmse_per_component(
+            Y_true: jnp.ndarray, Y_pred: jnp.ndarray, val_weights: jnp.ndarray
+        ) -> jnp.ndarray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = jnp.sum(se, axis=-2) / jnp.sum(val_weights)
+            rmse = jnp.sqrt(mse)
+            return rmse
+
+        n_components = X.shape[1]
+        jnp_splits = jnp.array(splits)
+
+        for center_X, center_Y, scale_X, scale_Y in center_scale_combinations:
+            for pls_class, reverse_differentiable in product(
+                [JAX_Alg_1, JAX_Alg_2], [False, True]
+            ):
+                jax_pls = pls_class(
+                    center_X=center_X,
+                    center_Y=center_Y,
+                    scale_X=scale_X,
+                    scale_Y=scale_Y,
+                    reverse_differentiable=reverse_differentiable,
+                    verbose=True,
+                )
+                results = jax_pls.cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=jnp_splits,
+                    preprocessing_function=cross_val_preprocessing,
+                    metric_function=jax_rmse_per_component,
+                    metric_names=["RMSE"],
+                    show_progress=False,
+                )
+                masked_results, num_compilations = self.count_traces(
+                    "_inner_masked_cv",
+                    jax_pls.masked_cross_validate,
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=jnp_splits,
+                    preprocessing_function=cross_val_preprocessing,
+                    metric_function=jax_masked_rmse_per_component,
+                    metric_names=["RMSE"],
+                    show_progress=False,
+                    pass_val_weights=True,
+                )
+                assert num_compilations == 1
+                assert_allclose(
+                    np.asarray(masked_results["RMSE"]),
+                    np.asarray(results["RMSE"]),
+                    atol=atol,
+                    rtol=rtol,
+                )
+                batched_results = jax_pls.masked_cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=jnp_splits,
+                    preprocessing_function=cross_val_preprocessing,
+                    metric_function=jax_masked_rmse_per_component,
+                    metric_names=["RMSE"],
+                    show_progress=False,
+                    fold_batch_size=2,
+                    pass_val_weights=True,
+                )
+                assert_allclose(
+                    np.asarray(batched_results["RMSE"]),
+                    np.asarray(results["RMSE"]),
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        # Without the validation weights, the metric function would include the
+        # padding of the smaller folds in its mean.
+        num_folds = np.unique(splits).size
+        N_even = X.shape[0] - X.shape[0] % num_folds
+        even_splits = jnp.arange(N_even) % num_folds
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            jax_pls = pls_class()
+            with pytest.raises(ValueError, match="pass_val_weights"):
+                jax_pls.masked_cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=jnp_splits,
+                    preprocessing_function=cross_val_preprocessing,
+                    metric_function=jax_rmse_per_component,
+                    metric_names=["RMSE"],
+                    show_progress=False,
+                )
+            results = jax_pls.cross_validate(
+                X=X[:N_even],
+                Y=Y[:N_even],
+                A=n_components,
+                cv_splits=even_splits,
+                preprocessing_function=cross_val_preprocessing,
+                metric_function=jax_rmse_per_component,
+                metric_names=["RMSE"],
+                show_progress=False,
+            )
+            masked_results = jax_pls.masked_cross_validate(
+                X=X[:N_even],
+                Y=Y[:N_even],
+                A=n_components,
+                cv_splits=even_splits,
+                preprocessing_function=cross_val_preprocessing,
+                metric_function=jax_rmse_per_component,
+                metric_names=["RMSE"],
+                show_progress=False,
+            )
+            assert_allclose(
+                np.asarray(masked_results["RMSE"]),
+                np.asarray(results["RMSE"]),
+                atol=atol,
+                rtol=rtol,
+            )
+
+    def test_masked_cross_val_pls_1(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, a single target variable, and split
+        indices for cross-validation. It then calls the `check_masked_cross_val_pls`
+        method to validate the fixed-shape cross-validation results for all possible
+        combinations of centering and scaling.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :3]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Protein"])
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        # Decrease the amount of samples in the interest of time.
+        X = X[::50]
+        Y = Y[::50]
+        splits = splits[::50]
+        assert Y.shape[1] == 1
+        self.check_masked_cross_val_pls(X, Y, splits, atol=0, rtol=1e-8)
+
+    def test_masked_cross_val_pls_2_m_less_k(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, multiple target variables (where M
+        is less than K), and split indices for cross-validation. It then calls the
+        `check_masked_cross_val_pls` method to validate the fixed-shape
+        cross-validation results for all possible combinations of centering and
+        scaling.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        Y = self.load_Y(
+            [
+                "Rye_Midsummer",
+                "Wheat_H1",
+                "Wheat_H3",
+                "Wheat_H4",
+                "Wheat_H5",
+                "Wheat_Halland",
+                "Wheat_Oland",
+                "Wheat_Spelt",
+                "Moisture",
+                "Protein",
+            ]
+        )
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        # Decrease the amount of samples in the interest of time.
+        X = X[::50]
+        Y = Y[::50]
+        splits = splits[::50]
+        assert Y.shape[1] > 1
+        assert Y.shape[1] < X.shape[1]
+        self.check_masked_cross_val_pls(X, Y, splits, atol=0, rtol=1e-8)
+
+    def check_jax_fast_cross_val_pls(self, X, Y, splits, atol, rtol):
+        """
+        Description
+        -----------
+        This method tests that the JAX implementation of fast cross-validation yields
+        the same root mean square errors (RMSE) as the NumPy implementation of fast
+        cross-validation for both algorithms and all possible combinations of
+        centering and scaling. The folds have different sizes, so the mean in the JAX
+        metric function must exclude the padding of the smaller folds. It also tests
+        that the two-argument metric function of the NumPy implementation is rejected.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        splits : numpy.ndarray
+            Split indices for cross-validation.
+
+        atol : float
+            Absolute tolerance for value comparisons.
+
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+
+        Raises
+        ------
+        AssertionError
+            If the RMSEs of the JAX implementation are not equal to those of the NumPy
+            implementation down to the specified tolerance.
+
+            If the JAX implementation accepts the two-argument metric function.
+        """
+
+        center_scale_combinations = product([False, True], repeat=4)
+
+        def rmse_per_component(Y_true: npt.NDArray, Y_pred: npt.NDArray) -> npt.NDArray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = np.mean(se, axis=-2)
+            rmse = np.sqrt(mse)
+            return rmse
+
+        def jax_masked_rmse_per_component(
+            Y_true: jnp.ndarray, Y_pred: jnp.ndarray, val_weights: jnp.ndarray
+        ) -> jnp.ndarray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = jnp.sum(se, axis=-2) / jnp.sum(val_weights)
+            rmse = jnp.sqrt(mse)
+            return rmse
+
+        n_components = X.shape[1]
+        splits = splits.flatten()
+        fold_sizes = np.unique(splits, return_counts=True)[1]
+        assert np.unique(fold_sizes).size > 1
+
+        with pytest.raises(TypeError):
+            JAXFastCVPLS().cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits,
+                metric_function=rmse_per_component,
+                show_progress=False,
+            )
+
+        for center_X, center_Y, scale_X, scale_Y in center_scale_combinations:
+            for algorithm in [1, 2]:
+                np_pls = FastCVPLS(
+                    center_X=center_X,
+                    center_Y=center_Y,
+                    scale_X=scale_X,
+                    scale_Y=scale_Y,
+                    algorithm=algorithm,
+                )
+                jax_pls = JAXFastCVPLS(
+                    center_X=center_X,
+                    center_Y=center_Y,
+                    scale_X=scale_X,
+                    scale_Y=scale_Y,
+                    algorithm=algorithm,
+                )
+                np_results = np_pls.cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=splits,
+                    metric_function=rmse_per_component,
+                    n_jobs=1,
+                    verbose=0,
+                )
+                jax_results = jax_pls.cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=splits,
+                    metric_function=jax_masked_rmse_per_component,
+                    show_progress=False,
+                )
+                assert np_results.keys() == jax_results.keys()
+                for split in np_results:
+                    assert_allclose(
+                        np.asarray(jax_results[split]),
+                        np_results[split],
+                        atol=atol,
+                        rtol=rtol,
+                    )
+
+    def test_jax_fast_cross_val_pls_1(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, a single target variable, and split
+        indices for cross-validation. It then calls the `check_jax_fast_cross_val_pls`
+        method to validate the JAX fast cross-validation results for all possible
+        combinations of centering and scaling.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :3]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Protein"])
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        # Decrease the amount of samples in the interest of time.
+        X = X[::50]
+        Y = Y[::50]
+        splits = splits[::50]
+        assert Y.shape[1] == 1
+        self.check_jax_fast_cross_val_pls(X, Y, splits, atol=0, rtol=1e-8)
+
+    def test_jax_fast_cross_val_pls_2_m_less_k(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, multiple target variables (where M
+        is less than K), and split indices for cross-validation. It then calls the
+        `check_jax_fast_cross_val_pls` method to validate the JAX fast
+        cross-validation results for all possible combinations of centering and
+        scaling.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        Y = self.load_Y(
+            [
+                "Rye_Midsummer",
+                "Wheat_H1",
+                "Wheat_H3",
+                "Wheat_H4",
+                "Wheat_H5",
+                "Wheat_Halland",
+                "Wheat_Oland",
+                "Wheat_Spelt",
+                "Moisture",
+                "Protein",
+            ]
+        )
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        # Decrease the amount of samples in the interest of time.
+        X = X[::50]
+        Y = Y[::50]
+        splits = splits[::50]
+        assert Y.shape[1] > 1
+        assert Y.shape[1] < X.shape[1]
+        self.check_jax_fast_cross_val_pls(X, Y, splits, atol=0, rtol=1e-8)
+
+    def check_fast_cross_val_pls_shared_memory(self, X, Y, splits, temp_folder):
+        """
+        Description
+        -----------
+        This method checks that fast cross-validation with the arrays placed in shared
+        read-only memory maps gives the same results as ordinary fast
+        cross-validation, that the memory-mapped files are removed afterwards, and
+        that the original arrays are restored on the model.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        splits : numpy.ndarray
+            Split indices for cross-validation.
+        temp_folder : pathlib.Path
+            An empty folder in which to place the memory-mapped files.
+
+        Returns:
+        None
+        """
+        n_components = X.shape[1]
+
+        def rmse_per_component(Y_true: npt.NDArray, Y_pred: npt.NDArray) -> npt.NDArray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = np.mean(se, axis=-2)
+            rmse = np.sqrt(mse)
+            return rmse
+
+        for algorithm in [1, 2]:
+            pls = FastCVPLS(
+                algorithm=algorithm,
+                center_X=True,
+                center_Y=True,
+                scale_X=True,
+                scale_Y=True,
+            )
+            results = pls.cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits.flatten(),
+                metric_function=rmse_per_component,
+                n_jobs=2,
+                verbose=0,
+            )
+            shared_results = pls.cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits.flatten(),
+                metric_function=rmse_per_component,
+                n_jobs=2,
+                verbose=0,
+                shared_memory=True,
+                temp_folder=str(temp_folder),
+            )
+            assert os.listdir(temp_folder) == []
+            assert not isinstance(pls.X, np.memmap)
+            assert not isinstance(pls.XTY, np.memmap)
+            assert results.keys() == shared_results.keys()
+            for split in results:
+                assert_allclose(shared_results[split], results[split], atol=0, rtol=0)
+
+    # JAX will issue a warning if os.fork() is called as JAX is incompatible with
+    # multi-threaded code. os.fork() is called by the  other cross-validation
+    # algorithms. However, there is no interaction between the JAX and the other
+    # algorithms, so we can safely ignore this warning.
+    @pytest.mark.filterwarnings(
+        "ignore",
+        category=RuntimeWarning,
+        message="os.fork() was called. os.fork() is"
+        " incompatible with multithreaded code, and JAX is"
+        " multithreaded, so this will likely lead to a"
+        " deadlock.",
+    )
+    def test_fast_cross_val_pls_shared_memory(self, tmp_path):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, multiple target variables, and
+        split indices for cross-validation. It then calls the
+        `check_fast_cross_val_pls_shared_memory` method to validate that sharing the
+        arrays with the workers through memory maps does not change the results.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        self.check_fast_cross_val_pls_shared_memory(X, Y, splits, tmp_path)
+
+    def check_fast_cross_val_pls_backends(self, X, Y, splits):
+        """
+        Description
+        -----------
+        This method checks that fast cross-validation gives the same results with the
+        process-based and the thread-based joblib backends, both with and without a
+        limit on the number of BLAS threads per job.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        splits : numpy.ndarray
+            Split indices for cross-validation.
+
+        Returns:
+        None
+        """
+        n_components = X.shape[1]
+
+        def rmse_per_component(Y_true: npt.NDArray, Y_pred: npt.NDArray) -> npt.NDArray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = np.mean(se, axis=-2)
+            rmse = np.sqrt(mse)
+            return rmse
+
+        for algorithm in [1, 2]:
+            pls = FastCVPLS(
+                algorithm=algorithm,
+                center_X=True,
+                center_Y=True,
+                scale_X=True,
+                scale_Y=True,
+            )
+            results = pls.cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits.flatten(),
+                metric_function=rmse_per_component,
+                n_jobs=2,
+                verbose=0,
+            )
+            for backend, blas_threads in product(["loky", "threading"], [None, 1]):
+                backend_results = pls.cross_validate(
+                    X=X,
+                    Y=Y,
+                    A=n_components,
+                    cv_splits=splits.flatten(),
+                    metric_function=rmse_per_component,
+                    n_jobs=2,
+                    verbose=0,
+                    backend=backend,
+                    blas_threads=blas_threads,
+                )
+                assert results.keys() == backend_results.keys()
+                for split in results:
+                    assert_allclose(
+                        backend_results[split], results[split], atol=0, rtol=1e-12
+                    )
+
+        # A backend set by the caller is used unless a backend is passed explicitly.
+        def pid_metric(Y_true: npt.NDArray, Y_pred: npt.NDArray) -> int:
+            return os.getpid()
+
+        pls = FastCVPLS()
+        with parallel_config(backend="threading"), contextlib.redirect_stdout(
+            io.StringIO()
+        ) as output:
+            pids = pls.cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits.flatten(),
+                metric_function=pid_metric,
+                n_jobs=2,
+                verbose=0,
+                blas_threads=1,
+            )
+        assert set(pids.values()) == {os.getpid()}
+        assert "parallel threads" in output.getvalue()
+        with pytest.raises(ValueError, match="Unknown backend"):
+            pls.cross_validate(
+                X=X,
+                Y=Y,
+                A=n_components,
+                cv_splits=splits.flatten(),
+                metric_function=pid_metric,
+                backend="unknown",
+            )
+
+    # JAX will issue a warning if os.fork() is called as JAX is incompatible with
+    # multi-threaded code. os.fork() is called by the  other cross-validation
+    # algorithms. However, there is no interaction between the JAX and the other
+    # algorithms, so we can safely ignore this warning.
+    @pytest.mark.filterwarnings(
+        "ignore",
+        category=RuntimeWarning,
+        message="os.fork() was called. os.fork() is"
+        " incompatible with multithreaded code, and JAX is"
+        " multithreaded, so this will likely lead to a"
+        " deadlock.",
+    )
+    def test_fast_cross_val_pls_backends(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, multiple target variables, and
+        split indices for cross-validation. It then calls the
+        `check_fast_cross_val_pls_backends` method to validate that the choice of
+        joblib backend and BLAS thread limit does not change the results.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        self.check_fast_cross_val_pls_backends(X, Y, splits)
+
+    def check_partial_fit(self, X, Y, A, chunk_size, atol, rtol):
+        """
+        Description
+        -----------
+        This method checks that accumulating the statistics of Improved Kernel PLS
+        Algorithm #2 from chunks of rows with `partial_fit` gives the same model as
+        fitting on all rows at once for all possible combinations of centering and
+        scaling.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        A : int
+            Number of components in the PLS model.
+        chunk_size : int
+            Number of rows in each chunk passed to `partial_fit`.
+        atol : float
+            Absolute tolerance for value comparisons.
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+        """
+        for center_X, center_Y, scale_X, scale_Y in product([False, True], repeat=4):
+            pls = NpPLS(
+                algorithm=2,
+                center_X=center_X,
+                center_Y=center_Y,
+                scale_X=scale_X,
+                scale_Y=scale_Y,
+            )
+            partial_pls = NpPLS(
+                algorithm=2,
+                center_X=center_X,
+                center_Y=center_Y,
+                scale_X=scale_X,
+                scale_Y=scale_Y,
+            )
+            pls.fit(X, Y, A)
+            for start in range(0, X.shape[0], chunk_size):
+                partial_pls.partial_fit(
+                    X[start : start + chunk_size], Y[start : start + chunk_size]
+                )
+            partial_pls.partial_fit(X[:0], Y[:0], A)
+            assert partial_pls.N == X.shape[0]
+            assert partial_pls.statistics.N == X.shape[0]
+            assert_allclose(partial_pls.B, pls.B, atol=atol, rtol=rtol)
+            assert_allclose(
+                partial_pls.predict(X), pls.predict(X), atol=atol, rtol=rtol
+            )
+
+    def test_partial_fit(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_partial_fit` method to validate that fitting Improved
+        Kernel PLS Algorithm #2 from chunks of rows gives the same model as fitting on
+        all rows at once. It also checks that `partial_fit` is rejected by Improved
+        Kernel PLS Algorithm #1.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_partial_fit(X, Y, A=12, chunk_size=997, atol=1e-8, rtol=1e-6)
+        self.check_partial_fit(
+            X, Y[:, 0], A=12, chunk_size=997, atol=1e-8, rtol=1e-6
+        )
+        with pytest.raises(ValueError):
+            NpPLS(algorithm=1).partial_fit(X, Y)
+        with pytest.raises(ValueError, match="before any rows"):
+            NpPLS(algorithm=2).partial_fit(X[:0], Y[:0], 12)
+        with pytest.raises(ValueError, match="Expected chunks"):
+            partial_pls = NpPLS(algorithm=2)
+            partial_pls.partial_fit(X, Y)
+            partial_pls.partial_fit(X[:0, :-1], Y[:0])
+
+    def check_fit_from_gram(self, X, Y, A, atol, rtol):
+        """
+        Description
+        -----------
+        This method checks that fitting Improved Kernel PLS Algorithm #2 from the
+        products and column-wise statistics of `X` and `Y` with `fit_from_gram` gives
+        the same model as fitting on `X` and `Y` for all possible combinations of
+        centering and scaling. Both the NumPy and the JAX implementations are checked.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        A : int
+            Number of components in the PLS model.
+        atol : float
+            Absolute tolerance for value comparisons.
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+        """
+        Y_2d = Y.reshape(Y.shape[0], -1)
+        statistics = {
+            "XTX": X.T @ X,
+            "XTY": X.T @ Y,
+            "N": X.shape[0],
+            "X_mean": X.mean(axis=0),
+            "Y_mean": Y_2d.mean(axis=0),
+            "X_std": X.std(axis=0, ddof=1),
+            "Y_std": Y_2d.std(axis=0, ddof=1),
+            "A": A,
+        }
+        for center_X, center_Y, scale_X, scale_Y in product([False, True], repeat=4):
+            flags = {
+                "center_X": center_X,
+                "center_Y": center_Y,
+                "scale_X": scale_X,
+                "scale_Y": scale_Y,
+            }
+            np_pls = NpPLS(algorithm=2, **flags)
+            np_gram_pls = NpPLS(algorithm=2, **flags)
+            jax_pls = JAX_Alg_2(**flags)
+            jax_gram_pls = JAX_Alg_2(**flags)
+            np_pls.fit(X, Y, A)
+            np_gram_pls.fit_from_gram(**statistics)
+            jax_pls.fit(X, Y, A)
+            jax_gram_pls.fit_from_gram(**statistics)
+            assert_allclose(np_gram_pls.B, np_pls.B, atol=atol, rtol=rtol)
+            assert_allclose(
+                np_gram_pls.predict(X), np_pls.predict(X), atol=atol, rtol=rtol
+            )
+            assert_allclose(
+                np.asarray(jax_gram_pls.B), np.asarray(jax_pls.B), atol=atol, rtol=rtol
+            )
+            assert_allclose(
+                np.asarray(jax_gram_pls.predict(X)),
+                np.asarray(jax_pls.predict(X)),
+                atol=atol,
+                rtol=rtol,
+            )
+
+    def test_fit_from_gram(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_fit_from_gram` method to validate that fitting from the
+        products and column-wise statistics gives the same model as fitting on the
+        data. It also checks that missing statistics and Improved Kernel PLS Algorithm
+        #1 are rejected.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_fit_from_gram(X, Y, A=12, atol=1e-8, rtol=1e-6)
+        self.check_fit_from_gram(X, Y[:, 0], A=12, atol=1e-8, rtol=1e-6)
+        with pytest.raises(ValueError):
+            NpPLS(algorithm=1).fit_from_gram(
+                X.T @ X, X.T @ Y, X.shape[0], None, None, None, None, 12
+            )
+        with pytest.raises(ValueError):
+            NpPLS(algorithm=2).fit_from_gram(
+                X.T @ X, X.T @ Y, X.shape[0], None, None, None, None, 12
+            )
+        with pytest.raises(ValueError):
+            JAX_Alg_2().fit_from_gram(
+                X.T @ X, X.T @ Y, X.shape[0], None, None, None, None, 12
+            )
+
+    def check_gram_statistics(self, X, Y, n_shards, temp_folder, atol, rtol):
+        """
+        Description
+        -----------
+        This method checks that `GramStatistics` computed on separate shards of the
+        rows of `X` and `Y` and merged in different orders equal the statistics of all
+        rows, that they survive a round trip through a file, and that fitting on them
+        gives the same model as fitting on `X` and `Y`.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        n_shards : int
+            Number of shards to split the rows into.
+        temp_folder : pathlib.Path
+            Folder in which to save the statistics.
+        atol : float
+            Absolute tolerance for value comparisons.
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+        """
+        full = GramStatistics.from_arrays(X, Y)
+        Y_2d = Y.reshape(Y.shape[0], -1)
+        assert full.N == X.shape[0]
+        assert_allclose(full.XTX, X.T @ X, atol=atol, rtol=rtol)
+        assert_allclose(full.XTY, X.T @ Y_2d, atol=atol, rtol=rtol)
+        assert_allclose(full.X_std, X.std(axis=0, ddof=1, keepdims=True), rtol=rtol)
+        assert_allclose(full.Y_std, Y_2d.std(axis=0, ddof=1, keepdims=True), rtol=rtol)
+
+        shards = [
+            GramStatistics.from_arrays(X_shard, Y_shard)
+            for X_shard, Y_shard in zip(
+                np.array_split(X, n_shards), np.array_split(Y, n_shards)
+            )
+        ]
+        sequential = GramStatistics(X.shape[1], Y_2d.shape[1])
+        for shard in shards:
+            sequential = sequential.merge(shard)
+        pairwise = shards
+        while len(pairwise) > 1:
+            pairwise = [
+                pairwise[i] + pairwise[i + 1] if i + 1 < len(pairwise) else pairwise[i]
+                for i in range(0, len(pairwise), 2)
+            ]
+        path = temp_folder / "statistics.npz"
+        pairwise[0].save(path)
+        loaded = GramStatistics.load(path)
+
+        for merged in [sequential, pairwise[0], loaded]:
+            assert merged.N == full.N
+            for name in [
+                "X_mean",
+                "Y_mean",
+                "XTX_centered",
+                "XTY_centered",
+                "YTY_centered_diag",
+            ]:
+                assert_allclose(
+                    getattr(merged, name), getattr(full, name), atol=atol, rtol=rtol
+                )
+
+        for center_X, center_Y, scale_X, scale_Y in product([False, True], repeat=4):
+            flags = {
+                "center_X": center_X,
+                "center_Y": center_Y,
+                "scale_X": scale_X,
+                "scale_Y": scale_Y,
+            }
+            pls = NpPLS(algorithm=2, **flags)
+            statistics_pls = NpPLS(algorithm=2, **flags)
+            pls.fit(X, Y, X.shape[1])
+            statistics_pls.fit_from_statistics(loaded, X.shape[1])
+            assert_allclose(
+                statistics_pls.predict(X), pls.predict(X), atol=atol, rtol=rtol
+            )
+
+    def test_gram_statistics(self, tmp_path):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_gram_statistics` method to validate that statistics
+        computed on shards of the data can be merged, serialized, and fitted on. It
+        also checks that statistics of different shapes cannot be merged.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_gram_statistics(X, Y, 7, tmp_path, atol=1e-8, rtol=1e-6)
+        self.check_gram_statistics(X, Y[:, 0], 7, tmp_path, atol=1e-8, rtol=1e-6)
+        with pytest.raises(ValueError):
+            GramStatistics.from_arrays(X, Y).merge(
+                GramStatistics.from_arrays(X[:, :-1], Y)
+            )
+
+    def check_fast_cross_val_pls_float32(self, X, Y, splits, A, offset, rtol):
+        """
+        Description
+        -----------
+        This method checks that fast cross-validation in float32 on data with a large
+        offset from zero agrees with fast cross-validation in float64. This requires
+        that the training set statistics of each fold are derived without catastrophic
+        cancellation. Both the NumPy and the JAX implementations are checked.
+
+        Parameters:
+        X : numpy.ndarray
+            The input predictor variables.
+        Y : numpy.ndarray
+            The target variables.
+        splits : numpy.ndarray
+            Split indices for cross-validation.
+        A : int
+            Number of components in the PLS model.
+        offset : float
+            Constant added to `X` and `Y`.
+        rtol : float
+            Relative tolerance for value comparisons.
+
+        Returns:
+        None
+        """
+        X = X + offset
+        Y = Y + offset
+        splits = splits.flatten()
+
+        def rmse_per_component(Y_true: npt.NDArray, Y_pred: npt.NDArray) -> npt.NDArray:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = np.mean(se, axis=-2)
+            rmse = np.sqrt(mse)
+            return rmse
+
+        def jax_masked_rmse_per_component(
+            Y_true: jax.Array, Y_pred: jax.Array, val_weights: jax.Array
+        ) -> jax.Array:
+            e = Y_true - Y_pred
+            se = e**2
+            mse = jnp.sum(se, axis=-2) / jnp.sum(val_weights)
+            rmse = jnp.sqrt(mse)
+            return rmse
+
+        for algorithm in [1, 2]:
+            results = FastCVPLS(algorithm=algorithm).cross_validate(
+                X=X,
+                Y=Y,
+                A=A,
+                cv_splits=splits,
+                metric_function=rmse_per_component,
+                n_jobs=1,
+                verbose=0,
+            )
+            np_float32_results = FastCVPLS(
+                algorithm=algorithm, dtype=np.float32
+            ).cross_validate(
+                X=X.astype(np.float32),
+                Y=Y.astype(np.float32),
+                A=A,
+                cv_splits=splits,
+                metric_function=rmse_per_component,
+                n_jobs=1,
+                verbose=0,
+            )
+            jax_float32_results = JAXFastCVPLS(
+                algorithm=algorithm, dtype=jnp.float32
+            ).cross_validate(
+                X=X.astype(np.float32),
+                Y=Y.astype(np.float32),
+                A=A,
+                cv_splits=splits,
+                metric_function=jax_masked_rmse_per_component,
+                show_progress=False,
+            )
+            for split in results:
+                assert_allclose(
+                    np_float32_results[split], results[split], atol=0, rtol=rtol
+                )
+                assert_allclose(
+                    np.asarray(jax_float32_results[split]),
+                    results[split],
+                    atol=0,
+                    rtol=rtol,
+                )
+
+    def test_fast_cross_val_pls_float32(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables, multiple target variables, and
+        split indices for cross-validation. It then calls the
+        `check_fast_cross_val_pls_float32` method to validate that float32 fast
+        cross-validation is accurate on data with a large offset from zero.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        splits = self.load_Y(["split"])  # Contains 3 splits of different sizes
+        self.check_fast_cross_val_pls_float32(
+            X, Y, splits, A=3, offset=1e3, rtol=1e-2
+        )
+
+    def check_shared_compilation(self, X, Y):
+        """
+        Checks that JAX PLS instances with the same configuration share compiled
+        executables and that instances with a different configuration do not.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 3
+        # copy=False and verbose=True are not used together by other tests, so no
+        # executables are cached yet.
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            jax_pls = pls_class(scale_Y=False, copy=False, verbose=True)
+            _, num_compilations = self.count_traces(
+                "stateless_fit", jax_pls.fit, X, Y, n_components
+            )
+            assert num_compilations == 1
+            same_config_pls = pls_class(scale_Y=False, copy=False, verbose=True)
+            assert same_config_pls != jax_pls
+            assert same_config_pls._static_config() == jax_pls._static_config()
+            assert hash(same_config_pls._static_config()) == hash(
+                jax_pls._static_config()
+            )
+            _, num_compilations = self.count_traces(
+                "stateless_fit", same_config_pls.fit, X, Y, n_components
+            )
+            assert num_compilations == 0
+            assert_allclose(
+                np.asarray(same_config_pls.predict(X)),
+                np.asarray(jax_pls.predict(X)),
+                atol=0,
+                rtol=1e-12,
+            )
+            other_config_pls = pls_class(
+                scale_Y=False, center_Y=False, copy=False, verbose=True
+            )
+            assert other_config_pls._static_config() != jax_pls._static_config()
+            _, num_compilations = self.count_traces(
+                "stateless_fit", other_config_pls.fit, X, Y, n_components
+            )
+            assert num_compilations == 1
+
+            # Instances hash by identity, so mutating one keeps it usable as a key.
+            instances = {jax_pls: "fitted"}
+            jax_pls.store_B = "last"
+            assert instances[jax_pls] == "fitted"
+
+        for algorithm in [1, 2]:
+            config = JAXFastCVPLS(algorithm=algorithm)._static_config()
+            assert JAXFastCVPLS(algorithm=algorithm)._static_config() == config
+            assert (
+                JAXFastCVPLS(algorithm=algorithm, scale_X=False)._static_config()
+                != config
+            )
+            assert JAXFastCVPLS(algorithm=3 - algorithm)._static_config() != config
+
+    def test_shared_compilation(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_shared_compilation` method to validate that JAX PLS
+        instances with equal configurations reuse compiled executables.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_shared_compilation(X, Y)
+
+    def check_precompile(self, X, Y, cache_dir, export_dir):
+        """
+        Checks that `precompile` leaves the global JAX settings untouched, writes the
+        executables of `stateless_fit` and `stateless_predict` to a persistent
+        compilation cache configured by the caller if `weight_callback` is False, and
+        warns that `stateless_fit` is not persisted otherwise. Also checks that
+        fitting and predicting afterwards yields the same results as without
+        precompilation, and that the functions exported to `export_dir` are loaded in
+        a new process and fit and predict there without being traced.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 4
+        N, K = X.shape
+        M = Y.shape[1]
+        old_cache_dir = jax.config.jax_compilation_cache_dir
+        old_min_compile_time = jax.config.jax_persistent_cache_min_compile_time_secs
+        JAX_Alg_1(weight_callback=False).precompile(N, K, M, n_components)
+        assert jax.config.jax_compilation_cache_dir == old_cache_dir
+        try:
+            compilation_cache.reset_cache()
+            jax.config.update("jax_compilation_cache_dir", os.fspath(cache_dir))
+            jax.config.update("jax_persistent_cache_min_compile_time_secs", 0)
+            for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+                with pytest.warns(UserWarning, match="not written to the persistent"):
+                    pls_class(center_Y=False).precompile(N, K, M, n_components)
+                jax_pls = pls_class(center_Y=False, weight_callback=False)
+                jax_pls.precompile(N, K, M, n_components, predict_N=N // 2)
+                jax_pls.fit(X, Y, n_components)
+                reference_pls = pls_class(center_Y=False)
+                reference_pls.fit(X, Y, n_components)
+                assert_allclose(
+                    np.asarray(jax_pls.predict(X[: N // 2])),
+                    np.asarray(reference_pls.predict(X[: N // 2])),
+                    atol=0,
+                    rtol=1e-12,
+                )
+        finally:
+            jax.config.update("jax_compilation_cache_dir", old_cache_dir)
+            jax.config.update(
+                "jax_persistent_cache_min_compile_time_secs", old_min_compile_time
+            )
+            compilation_cache.reset_cache()
+        entries = os.listdir(cache_dir)
+        for name in ["jit_stateless_fit", "jit_stateless_predict"]:
+            assert any(entry.startswith(name) for entry in entries)
+
+        X_path = os.path.join(export_dir, "X.npy")
+        Y_path = os.path.join(export_dir, "Y.npy")
+        Y_pred_path = os.path.join(export_dir, "Y_pred.npy")
+        os.makedirs(export_dir)
+        np.save(X_path, X)
+        np.save(Y_path, Y)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(ikpls.__file__))
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            path = os.path.join(export_dir, pls_class.__module__)
+            pls_class(center_Y=False).precompile(N, K, M, n_components, path=path)
+            script = (
+                "import sys\n"
+                "import jax\n"
+                "import numpy as np\n"
+                'jax.config.update("jax_enable_x64", True)\n'
+                f"from {pls_class.__module__} import PLS\n"
+                "pls = PLS(center_Y=False, verbose=True)\n"
+                "pls.load_precompiled(sys.argv[1])\n"
+                f"pls.fit(np.load(sys.argv[2]), np.load(sys.argv[3]), {n_components})\n"
+                "np.save(sys.argv[4], np.asarray(pls.predict(np.load(sys.argv[2]))))\n"
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", script, path, X_path, Y_path, Y_pred_path],
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+            assert "JIT compiled" not in result.stdout
+            reference_pls = pls_class(center_Y=False)
+            reference_pls.fit(X, Y, n_components)
+            assert_allclose(
+                np.load(Y_pred_path),
+                np.asarray(reference_pls.predict(X)),
+                atol=0,
+                rtol=1e-12,
+            )
+            with pytest.raises(ValueError, match="another configuration"):
+                pls_class().load_precompiled(path)
+
+    def test_precompile(self, tmp_path):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_precompile` method to validate ahead-of-time compilation
+        into a persistent compilation cache and exporting to a directory.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_precompile(X, Y, tmp_path / "cache", tmp_path / "export")
+
+    def check_weight_callback(self, X, Y):
+        """
+        Checks that JAX PLS without weight callbacks yields the same results as with
+        callbacks, compiles without host callbacks, and warns once after fitting if a
+        weight is close to zero.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 3
+        constant_Y = np.ones((X.shape[0], 1))
+        msg = "Weight is close to zero."
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            callback_pls = pls_class()
+            callback_pls.fit(X, Y, n_components)
+            jax_pls = pls_class(weight_callback=False)
+            jax_pls.fit(X, Y, n_components)
+            assert_allclose(
+                np.asarray(jax_pls.B), np.asarray(callback_pls.B), atol=0, rtol=0
+            )
+            zero_weight_index = jax_pls.stateless_fit(
+                X, Y, n_components, return_status=True
+            )[-1]
+            assert zero_weight_index == -1
+            lowered = type(jax_pls).stateless_fit.lower(
+                jax_pls, X, Y, n_components, return_status=True
+            )
+            assert "callback" not in lowered.as_text()
+
+            zero_weight_index = jax_pls.stateless_fit(
+                X, constant_Y, n_components, return_status=True
+            )[-1]
+            assert zero_weight_index == 0
+            with pytest.warns(UserWarning, match=msg) as record:
+                jax_pls.fit(X, constant_Y, n_components)
+            assert len(record) == 1
+
+    def test_weight_callback(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_weight_callback` method to validate fitting without host
+        callbacks in the main loop of the JAX implementations.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_weight_callback(X, Y)
+
+    def check_lanczos(self, X, Y, atol, rtol):
+        """
+        Checks that computing the weights with the Lanczos method yields the same
+        regression coefficients as the full eigendecomposition for the NumPy and JAX
+        implementations and the JAX fast cross-validation.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 5
+        splits = np.arange(X.shape[0]) % 3
+
+        def metric_function(Y_true, Y_pred, val_weights):
+            return jnp.sum((Y_true - Y_pred) ** 2, axis=-2) / jnp.sum(val_weights)
+
+        for algorithm in [1, 2]:
+            np_pls = NpPLS(algorithm=algorithm)
+            np_pls.fit(X, Y, n_components)
+            np_lanczos_pls = NpPLS(algorithm=algorithm, eigensolver="lanczos")
+            np_lanczos_pls.fit(X, Y, n_components)
+            assert_allclose(np_lanczos_pls.B, np_pls.B, atol=atol, rtol=rtol)
+
+            jax_fast_cv_pls = JAXFastCVPLS(algorithm=algorithm, eigensolver="lanczos")
+            lanczos_results = jax_fast_cv_pls.cross_validate(
+                X, Y, n_components, splits, metric_function, show_progress=False
+            )
+            results = JAXFastCVPLS(algorithm=algorithm).cross_validate(
+                X, Y, n_components, splits, metric_function, show_progress=False
+            )
+            for split in results:
+                assert_allclose(
+                    np.asarray(lanczos_results[split]),
+                    np.asarray(results[split]),
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            jax_pls = pls_class(eigensolver="lanczos")
+            jax_pls.fit(X, Y, n_components)
+            assert_allclose(np.asarray(jax_pls.B), np_pls.B, atol=atol, rtol=rtol)
+
+        with pytest.raises(ValueError, match="Invalid eigensolver"):
+            NpPLS(eigensolver="svd")
+        with pytest.raises(ValueError, match="Invalid eigensolver"):
+            JAX_Alg_1(eigensolver="svd")
+
+    def test_lanczos(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_lanczos` method to validate the Lanczos method for the
+        weights for both fewer and more targets than features.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :12]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Moisture", "Protein"])
+        self.check_lanczos(X, Y, atol=1e-8, rtol=1e-6)
+        Y = self.load_X()[..., 12:30]
+        self.check_lanczos(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_low_rank_prediction(self, X, Y, atol, rtol):
+        """
+        Checks that predicting for all numbers of components with the scores and the
+        Y loadings yields the same predictions as the product with the regression
+        coefficients tensor for the NumPy and JAX implementations and the NumPy fast
+        cross-validation.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 10
+        splits = np.arange(X.shape[0]) % 3
+
+        def dense_predict(pls, X):
+            X_pred = (X - np.asarray(pls.X_mean)) / np.asarray(pls.X_std)
+            Y_pred = np.einsum("nk,akm->anm", X_pred, np.asarray(pls.B))
+            return Y_pred * np.asarray(pls.Y_std) + np.asarray(pls.Y_mean)
+
+        for algorithm in [1, 2]:
+            np_pls = NpPLS(algorithm=algorithm)
+            np_pls.fit(X, Y, n_components)
+            Y_pred = np_pls.predict(X)
+            assert_allclose(Y_pred, dense_predict(np_pls, X), atol=atol, rtol=rtol)
+            for n in range(1, n_components + 1):
+                assert_allclose(
+                    Y_pred[n - 1], np_pls.predict(X, n), atol=atol, rtol=rtol
+                )
+
+            fast_cv_pls = FastCVPLS(algorithm=algorithm)
+            results = fast_cv_pls.cross_validate(
+                X,
+                Y,
+                n_components,
+                splits,
+                lambda Y_true, Y_pred: Y_pred,
+                n_jobs=1,
+                verbose=0,
+            )
+            for split in np.unique(splits):
+                val_idxs = splits == split
+                np_pls.fit(X[~val_idxs], Y[~val_idxs], n_components)
+                assert_allclose(
+                    results[split],
+                    dense_predict(np_pls, X[val_idxs]),
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            jax_pls = pls_class()
+            jax_pls.fit(X, Y, n_components)
+            Y_pred = np.asarray(jax_pls.predict(X))
+            assert_allclose(Y_pred, dense_predict(jax_pls, X), atol=atol, rtol=rtol)
+            stateless_Y_pred = jax_pls.stateless_predict(
+                X,
+                None,
+                X_mean=jax_pls.X_mean,
+                X_std=jax_pls.X_std,
+                Y_mean=jax_pls.Y_mean,
+                Y_std=jax_pls.Y_std,
+                R=jax_pls.R.T,
+                Q=jax_pls.Q.T,
+            )
+            assert_allclose(np.asarray(stateless_Y_pred), Y_pred, atol=atol, rtol=rtol)
+
+    def test_low_rank_prediction(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_low_rank_prediction` method to validate the predictions
+        computed from the scores and the Y loadings.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :20]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_low_rank_prediction(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_store_B(self, X, Y, atol, rtol):
+        """
+        Checks that the predictions and the regression coefficients are the same
+        regardless of which regression coefficients are stored by the NumPy and JAX
+        implementations and by the NumPy fast cross-validation.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 10
+        splits = np.arange(X.shape[0]) % 3
+
+        def metric_function(Y_true, Y_pred):
+            return np.mean((Y_true - Y_pred) ** 2, axis=-2)
+
+        for algorithm in [1, 2]:
+            np_pls = NpPLS(algorithm=algorithm)
+            np_pls.fit(X, Y, n_components)
+            results = FastCVPLS(algorithm=algorithm).cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            for store_B in ["last", "none"]:
+                store_B_pls = NpPLS(algorithm=algorithm, store_B=store_B)
+                store_B_pls.fit(X, Y, n_components)
+                if store_B == "last":
+                    assert_allclose(store_B_pls.B, np_pls.B[-1], atol=atol, rtol=rtol)
+                else:
+                    assert store_B_pls.B is None
+                for n in range(1, n_components + 1):
+                    assert_allclose(
+                        store_B_pls.get_B(n), np_pls.B[n - 1], atol=atol, rtol=rtol
+                    )
+                    assert_allclose(
+                        store_B_pls.predict(X, n),
+                        np_pls.predict(X, n),
+                        atol=atol,
+                        rtol=rtol,
+                    )
+                # Only the most recently used coefficients are cached
+                assert len(store_B_pls._B_cache) <= 8
+                assert_allclose(
+                    store_B_pls.predict(X), np_pls.predict(X), atol=atol, rtol=rtol
+                )
+
+                store_B_results = FastCVPLS(
+                    algorithm=algorithm, store_B=store_B
+                ).cross_validate(
+                    X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+                )
+                for split in results:
+                    assert_allclose(
+                        store_B_results[split], results[split], atol=atol, rtol=rtol
+                    )
+
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            for store_B in ["last", "none"]:
+                jax_pls = pls_class(store_B=store_B)
+                jax_pls.fit(X, Y, n_components)
+                if store_B == "last":
+                    assert_allclose(
+                        np.asarray(jax_pls.B), np_pls.B[-1], atol=atol, rtol=rtol
+                    )
+                else:
+                    assert jax_pls.B is None
+                for n in range(1, n_components + 1):
+                    assert_allclose(
+                        np.asarray(jax_pls.predict(X, n)),
+                        np_pls.predict(X, n),
+                        atol=atol,
+                        rtol=rtol,
+                    )
+                assert_allclose(
+                    np.asarray(jax_pls.predict(X)),
+                    np_pls.predict(X),
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        with pytest.raises(ValueError, match="Invalid store_B"):
+            NpPLS(store_B="first")
+        with pytest.raises(ValueError, match="Invalid store_B"):
+            FastCVPLS(store_B="first")
+        with pytest.raises(ValueError, match="Invalid store_B"):
+            JAX_Alg_1(store_B="first")
+
+    def test_store_B(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_store_B` method to validate that storing only some or
+        none of the regression coefficients does not change the results.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :20]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_store_B(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_extend(self, X, Y, atol, rtol):
+        """
+        Checks that extending a fitted model with more components yields the same
+        model as fitting with all the components from the start for the NumPy and JAX
+        implementations.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 10
+        first_components = 4
+
+        for algorithm in [1, 2]:
+            np_pls = NpPLS(algorithm=algorithm)
+            np_pls.fit(X, Y, n_components)
+            extended_np_pls = NpPLS(algorithm=algorithm)
+            with pytest.raises(ValueError, match="must be fitted"):
+                extended_np_pls.extend(1, X)
+            extended_np_pls.fit(X, Y, first_components)
+            extended_np_pls.extend(2, X)
+            extended_np_pls.extend(n_components - first_components - 2, X)
+            assert extended_np_pls.A == n_components
+            assert_allclose(extended_np_pls.B, np_pls.B, atol=atol, rtol=rtol)
+            assert_allclose(extended_np_pls.W, np_pls.W, atol=atol, rtol=rtol)
+            assert_allclose(extended_np_pls.P, np_pls.P, atol=atol, rtol=rtol)
+            assert_allclose(extended_np_pls.Q, np_pls.Q, atol=atol, rtol=rtol)
+            assert_allclose(extended_np_pls.R, np_pls.R, atol=atol, rtol=rtol)
+            if algorithm == 1:
+                assert_allclose(extended_np_pls.T, np_pls.T, atol=atol, rtol=rtol)
+                with pytest.raises(ValueError, match="X must be given"):
+                    extended_np_pls.extend(1)
+
+        for pls_class in [JAX_Alg_1, JAX_Alg_2]:
+            extended_jax_pls = pls_class()
+            extended_jax_pls.fit(X, Y, first_components)
+            extended_jax_pls.extend(n_components - first_components, X)
+            assert_allclose(
+                np.asarray(extended_jax_pls.B), np_pls.B, atol=atol, rtol=rtol
+            )
+            assert_allclose(
+                np.asarray(extended_jax_pls.R), np_pls.R, atol=atol, rtol=rtol
+            )
+            with pytest.raises(ValueError, match="must be fitted"):
+                pls_class().extend(1, X)
+
+    def test_extend(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_extend` method to validate that extending a fitted model
+        with more components yields the same model as fitting from scratch.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :20]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_extend(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_stopping_rules(self, X, Y, atol, rtol):
+        """
+        Checks that the stopping rules of the NumPy implementation end component
+        extraction after the first component that meets them and truncate the fitted
+        matrices to the prefix of a model fitted without stopping rules.
+        """
+        n_components = 15
+
+        def record(n_components, state):
+            states.append(state)
+            return False
+
+        for algorithm in [1, 2]:
+            states = []
+            np_pls = NpPLS(algorithm=algorithm, stop_callback=record)
+            np_pls.fit(X, Y, n_components)
+            assert np_pls.A == n_components
+            XTY_norms = np.array(
+                [np.linalg.norm(state["XTY"]) for state in states]
+            ) / np_pls._XTY_norm
+            gains = np.array(
+                [state["tTt"].item() * np.sum(state["q"] ** 2) for state in states]
+            ) / np_pls._Y_ss
+
+            stopped_plss = [
+                (
+                    NpPLS(algorithm=algorithm, stop_callback=lambda n, state: n == 5),
+                    5,
+                ),
+                (
+                    NpPLS(algorithm=algorithm, stop_XTY_norm=XTY_norms[4]),
+                    np.argmax(XTY_norms <= XTY_norms[4]) + 1,
+                ),
+                (
+                    NpPLS(algorithm=algorithm, stop_explained_variance=gains[4] * 1.01),
+                    np.argmax(gains < gains[4] * 1.01) + 1,
+                ),
+            ]
+            for stopped_pls, expected_A in stopped_plss:
+                stopped_pls.fit(X, Y, n_components)
+                assert stopped_pls.A == expected_A
+                assert stopped_pls.B.shape[0] == expected_A
+                for name in ["W", "P", "Q", "R"] + (["T"] if algorithm == 1 else []):
+                    assert getattr(stopped_pls, name).shape[1] == expected_A
+                    assert_allclose(
+                        getattr(stopped_pls, name),
+                        getattr(np_pls, name)[:, :expected_A],
+                        atol=atol,
+                        rtol=rtol,
+                    )
+                assert_allclose(
+                    stopped_pls.B, np_pls.B[:expected_A], atol=atol, rtol=rtol
+                )
+                assert_allclose(
+                    stopped_pls.predict(X),
+                    np_pls.predict(X)[:expected_A],
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        # The sum of squares of Y is also available from the statistics.
+        statistics_pls = NpPLS(algorithm=2, stop_explained_variance=gains[4] * 1.01)
+        statistics_pls.fit_from_statistics(
+            GramStatistics.from_arrays(X, Y), n_components
+        )
+        assert statistics_pls.A == expected_A
+        assert_allclose(statistics_pls._Y_ss, np_pls._Y_ss, atol=atol, rtol=rtol)
+
+        with pytest.raises(ValueError, match="stop_explained_variance"):
+            NpPLS(algorithm=2, stop_explained_variance=0.01).fit_from_gram(
+                X.T @ X,
+                X.T @ Y,
+                X.shape[0],
+                X.mean(axis=0),
+                Y.mean(axis=0),
+                X.std(axis=0, ddof=1),
+                Y.std(axis=0, ddof=1),
+                n_components,
+            )
+
+    def test_stopping_rules(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_stopping_rules` method to validate that the stopping
+        rules truncate the fitted model after the first component that meets them.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :20]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_stopping_rules(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_algorithm_selection(self, X, Y, atol, rtol):
+        """
+        Checks that the cost model selects Algorithm #2 for tall data and Algorithm #1
+        for wide or sparse data, that the name of the model reflects the selected
+        algorithm, and that selecting the algorithm with a cost model yields the same
+        results as the selected algorithm for the NumPy implementation, the NumPy fast
+        cross-validation, and the JAX factory.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 10
+        splits = np.arange(X.shape[0]) % 3
+        N, K = X.shape
+        M = Y.shape[1]
+
+        def metric_function(Y_true, Y_pred):
+            return np.mean((Y_true - Y_pred) ** 2, axis=-2)
+
+        assert select_algorithm(100000, 20, 1, 10) == 2
+        assert select_algorithm(50, 5000, 1, 10) == 1
+        assert select_algorithm(50, 5000, 1, 10, validation_sizes=[5] * 10) == 1
+        # Algorithm #1 is selected if XTX does not fit in memory.
+        assert (
+            select_algorithm(100000, 20, 1, 10, cost_model=CostModel(memory_limit=8))
+            == 1
+        )
+        calibrated = CostModel.calibrate(size=64, repeats=2)
+        assert calibrated.gemm_flops > 0 and calibrated.gemv_flops > 0
+
+        # The products with a sparse X cost in proportion to its nonzero entries,
+        # and a dense XTX may not be larger than a sparse X.
+        cost_model = CostModel()
+        for algorithm in [1, 2]:
+            assert cost_model.fit_cost(
+                algorithm, 2000, 100, 1, 10, nnz=200
+            ) < cost_model.fit_cost(algorithm, 2000, 100, 1, 10)
+        assert cost_model.fits_in_memory(100)
+        assert not cost_model.fits_in_memory(100, nnz=200)
+        assert cost_model.fits_in_memory(100, nnz=10000)
+        assert select_algorithm(2000, 100, 1, 10) == 2
+        assert select_algorithm(2000, 100, 1, 10, nnz=200) == 1
+        assert select_algorithm(2000, 100, 1, 10, [200] * 10, nnz=200) == 1
+        sparse_X = sp.random(2000, 100, density=1e-3, format="csr", random_state=0)
+        sparse_Y = np.random.default_rng(0).standard_normal((2000, 1))
+        auto_pls = NpPLS(algorithm="auto")
+        assert auto_pls.name == "Improved Kernel PLS"
+        auto_pls.fit(sparse_X, sparse_Y, 10)
+        assert auto_pls.selected_algorithm == 1
+        assert auto_pls.name == "Improved Kernel PLS Algorithm #1"
+        auto_pls.fit(sparse_X.toarray(), sparse_Y, 10)
+        assert auto_pls.selected_algorithm == 2
+        assert auto_pls.name == "Improved Kernel PLS Algorithm #2"
+
+        # Cost models that make either algorithm the cheaper one
+        cost_models = {1: CostModel(gemm_flops=1e-3), 2: CostModel(gemv_flops=1e-3)}
+        for algorithm, cost_model in cost_models.items():
+            assert select_algorithm(N, K, M, n_components, cost_model=cost_model) == (
+                algorithm
+            )
+            np_pls = NpPLS(algorithm=algorithm)
+            np_pls.fit(X, Y, n_components)
+            auto_pls = NpPLS(algorithm=cost_model)
+            assert auto_pls.selected_algorithm is None
+            auto_pls.fit(X, Y, n_components)
+            assert auto_pls.selected_algorithm == algorithm
+            assert_allclose(auto_pls.B, np_pls.B, atol=atol, rtol=rtol)
+            assert (auto_pls.T is None) == (algorithm == 2)
+
+            results = FastCVPLS(algorithm=algorithm).cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            auto_cv_pls = FastCVPLS(algorithm=cost_model)
+            auto_results = auto_cv_pls.cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            assert auto_cv_pls.selected_algorithm == algorithm
+            assert auto_cv_pls.name == f"Improved Kernel PLS Algorithm #{algorithm}"
+            for split in results:
+                assert_allclose(
+                    auto_results[split], results[split], atol=atol, rtol=rtol
+                )
+
+            jax_pls = make_jax_pls(N, K, M, n_components, cost_model=cost_model)
+            assert isinstance(jax_pls, JAX_Alg_1 if algorithm == 1 else JAX_Alg_2)
+            jax_pls.fit(X, Y, n_components)
+            assert_allclose(np.asarray(jax_pls.B), np_pls.B, atol=atol, rtol=rtol)
+
+        # Fitting from the statistics always uses Algorithm #2.
+        auto_pls = NpPLS(algorithm=cost_models[1])
+        auto_pls.fit_from_statistics(GramStatistics.from_arrays(X, Y), n_components)
+        assert auto_pls.selected_algorithm == 2
+        assert_allclose(auto_pls.B, np_pls.B, atol=atol, rtol=rtol)
+
+        with pytest.raises(ValueError, match="Invalid algorithm"):
+            NpPLS(algorithm=4)
+        with pytest.raises(ValueError, match="Invalid algorithm"):
+            FastCVPLS(algorithm="fastest")
+
+    def test_algorithm_selection(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_algorithm_selection` method to validate the automatic
+        selection between Improved Kernel PLS Algorithm #1 and #2.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[..., :20]  # Decrease the amount of features in the interest of time.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_algorithm_selection(X, Y, atol=1e-8, rtol=1e-6)
+
+    def check_kernel_algorithm(self, X, Y, atol, rtol):
+        """
+        Checks that the wide kernel form of PLS (Algorithm #3) yields the same model as
+        Improved Kernel PLS Algorithm #1 for the NumPy and JAX implementations and the
+        same metrics in the NumPy fast cross-validation.
+        """
+        jax.config.update("jax_enable_x64", True)
+        n_components = 10
+        splits = np.arange(X.shape[0]) % 4
+
+        def metric_function(Y_true, Y_pred):
+            return np.mean((Y_true - Y_pred) ** 2, axis=-2)
+
+        np_pls = NpPLS(algorithm=1)
+        np_pls.fit(X, Y, n_components)
+        kernel_pls = NpPLS(algorithm=3)
+        kernel_pls.fit(X, Y, n_components)
+        for name in ["B", "W", "P", "Q", "R", "T"]:
+            assert_allclose(
+                getattr(kernel_pls, name),
+                getattr(np_pls, name),
+                atol=atol,
+                rtol=rtol,
+            )
+        assert_allclose(kernel_pls.predict(X), np_pls.predict(X), atol=atol, rtol=rtol)
+
+        # Algorithm #3 is extended with the steps of Algorithm #1.
+        extended_pls = NpPLS(algorithm=3)
+        extended_pls.fit(X, Y, n_components - 4)
+        extended_pls.extend(4, X)
+        assert_allclose(extended_pls.B, np_pls.B, atol=atol, rtol=rtol)
+
+        jax_pls = JAX_Alg_3()
+        jax_pls.fit(X, Y, n_components)
+        assert_allclose(np.asarray(jax_pls.B), np_pls.B, atol=atol, rtol=rtol)
+        assert_allclose(np.asarray(jax_pls.T), np_pls.T, atol=atol, rtol=rtol)
+
+        # With more components than the rank of the centered X, the weights vanish and
+        # the remaining components must be zero rather than NaN.
+        X_low_rank, Y_low_rank = X[:10], Y[:10]
+        rank = X_low_rank.shape[0] - 1
+        np_pls = NpPLS(algorithm=1)
+        np_pls.fit(X_low_rank, Y_low_rank, rank + 5)
+        jax_pls = JAX_Alg_3(weight_callback=False)
+        jax_pls.fit(X_low_rank, Y_low_rank, rank + 5)
+        jax_Y_pred = np.asarray(jax_pls.predict(X_low_rank))
+        assert np.all(np.isfinite(jax_Y_pred))
+        assert_allclose(
+            jax_Y_pred[:rank],
+            np_pls.predict(X_low_rank)[:rank],
+            atol=atol,
+            rtol=rtol,
+        )
+
+        # A constant Y vanishes when centered, so every weight is exactly zero.
+        constant_Y = np.ones((X_low_rank.shape[0], Y.shape[1]))
+        zero_weight_index = jax_pls.stateless_fit(
+            X_low_rank, constant_Y, rank + 5, return_status=True
+        )[-1]
+        assert zero_weight_index == 0
+        with pytest.warns(UserWarning, match="Weight is close to zero."):
+            jax_pls.fit(X_low_rank, constant_Y, rank + 5)
+        for name in ["B", "W", "P", "Q", "R", "T"]:
+            assert np.all(np.asarray(getattr(jax_pls, name)) == 0)
+
+        # The Gram matrices of the training sets are sub-blocks of the global Gram
+        # matrix unless X is scaled.
+        for center_X, scale_X in [(True, True), (True, False), (False, False)]:
+            results = FastCVPLS(
+                center_X=center_X, scale_X=scale_X, algorithm=1
+            ).cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            kernel_results = FastCVPLS(
+                center_X=center_X, scale_X=scale_X, algorithm=3
+            ).cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            for split in results:
+                assert_allclose(
+                    kernel_results[split], results[split], atol=atol, rtol=rtol
+                )
+
+        with pytest.raises(ValueError, match="only supported"):
+            NpPLS(algorithm=3).partial_fit(X, Y, n_components)
+
+    def test_kernel_algorithm(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_kernel_algorithm` method with fewer samples than
+        predictor variables to validate the wide kernel form of PLS.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        X = X[:50]  # Use fewer samples than features.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])[:50]
+        self.check_kernel_algorithm(X, Y, atol=1e-8, rtol=1e-6)
+        self.check_kernel_algorithm(X, Y[:, :1], atol=1e-8, rtol=1e-6)
+
+    def check_sparse(self, X, Y, atol, rtol):
+        """
+        Checks that fitting, extending, and predicting with a sparse `X` yields the
+        same results as with the dense `X` for the NumPy implementation of all
+        algorithms and for the NumPy fast cross-validation.
+        """
+        n_components = 8
+        splits = np.arange(X.shape[0]) % 4
+        X_sparse = sp.csr_matrix(X)
+
+        def metric_function(Y_true, Y_pred):
+            return np.mean((Y_true - Y_pred) ** 2, axis=-2)
+
+        for algorithm, (center_X, scale_X) in product(
+            [1, 2, 3], [(True, True), (True, False), (False, True), (False, False)]
+        ):
+            np_pls = NpPLS(algorithm=algorithm, center_X=center_X, scale_X=scale_X)
+            np_pls.fit(X, Y, n_components - 2)
+            np_pls.extend(2, X)
+            sparse_pls = NpPLS(
+                algorithm=algorithm, center_X=center_X, scale_X=scale_X
+            )
+            sparse_pls.fit(X_sparse.tocsc(), Y, n_components - 2)
+            sparse_pls.extend(2, X_sparse)
+            assert_allclose(sparse_pls.B, np_pls.B, atol=atol, rtol=rtol)
+            assert_allclose(
+                sparse_pls.predict(X_sparse), np_pls.predict(X), atol=atol, rtol=rtol
+            )
+            assert_allclose(
+                sparse_pls.predict(X_sparse, n_components=3),
+                np_pls.predict(X, n_components=3),
+                atol=atol,
+                rtol=rtol,
+            )
+
+            results = FastCVPLS(
+                center_X=center_X, scale_X=scale_X, algorithm=algorithm
+            ).cross_validate(
+                X, Y, n_components, splits, metric_function, n_jobs=1, verbose=0
+            )
+            sparse_results = FastCVPLS(
+                center_X=center_X, scale_X=scale_X, algorithm=algorithm
+            ).cross_validate(
+                X_sparse,
+                Y,
+                n_components,
+                splits,
+                metric_function,
+                n_jobs=1,
+                verbose=0,
+            )
+            for split in results:
+                assert_allclose(
+                    sparse_results[split], results[split], atol=atol, rtol=rtol
+                )
+
+    def test_sparse(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables and
+        zeros most of the predictor variables. It then calls the `check_sparse`
+        method to validate fitting and cross-validation on sparse matrices.
+
+        Returns:
+        None
+        """
+        X = self.load_X()[:200]
+        X = np.where(X > np.quantile(X, 0.9), X, 0)  # Keep 10% of the entries.
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])[:200]
+        self.check_sparse(X, Y, atol=1e-8, rtol=1e-6)
+        self.check_sparse(X, Y[:, :1], atol=1e-8, rtol=1e-6)
+
+    def check_chunked(self, X, Y, tmp_path, atol, rtol):
+        """
+        Checks that streaming `X` in chunks from a memory map, from a callable, and
+        from an in-memory array with `chunk_size` yields the same results as fitting,
+        extending, and predicting on the in-memory `X`.
+        """
+        n_components = 8
+        path = os.path.join(tmp_path, "X.npy")
+        np.save(path, X)
+        X_memmap = np.load(path, mmap_mode="r")
+
+        def row_chunks():
+            return (X[start : start + 97] for start in range(0, X.shape[0], 97))
+
+        for algorithm, (center_X, scale_X) in product(
+            [1, 2], [(True, True), (True, False), (False, True), (False, False)]
+        ):
+            np_pls = NpPLS(algorithm=algorithm, center_X=center_X, scale_X=scale_X)
+            np_pls.fit(X, Y, n_components - 2)
+            np_pls.extend(2, X)
+            for chunked_X, chunk_size in [
+                (X_memmap, None),
+                (X_memmap, 250),
+                (row_chunks, None),
+                (X, 333),
+            ]:
+                chunked_pls = NpPLS(
+                    algorithm=algorithm,
+                    center_X=center_X,
+                    scale_X=scale_X,
+                    chunk_size=chunk_size,
+                )
+                chunked_pls.fit(chunked_X, Y, n_components - 2)
+                chunked_pls.extend(2, chunked_X)
+                assert_allclose(chunked_pls.B, np_pls.B, atol=atol, rtol=rtol)
+                if algorithm == 1:
+                    assert_allclose(chunked_pls.T, np_pls.T, atol=atol, rtol=rtol)
+                assert_allclose(
+                    chunked_pls.predict(chunked_X),
+                    np_pls.predict(X),
+                    atol=atol,
+                    rtol=rtol,
+                )
+                assert_allclose(
+                    chunked_pls.predict(chunked_X, n_components=3),
+                    np_pls.predict(X, n_components=3),
+                    atol=atol,
+                    rtol=rtol,
+                )
+
+        with pytest.raises(ValueError, match="does not support streaming"):
+            NpPLS(algorithm=3).fit(X_memmap, Y, n_components)
+
+    def test_chunked(self, tmp_path):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_chunked` method to validate streaming the predictor
+        variables in chunks of rows.
+
+        Returns:
+        None
+        """
+        X = self.load_X()
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_chunked(X, Y, tmp_path, atol=1e-8, rtol=1e-6)
+        self.check_chunked(X, Y[:, :1], tmp_path, atol=1e-8, rtol=1e-6)
+
+    def check_fused_preprocessing(self, X, Y, atol, rtol):
+        """
+        Checks that Algorithm #2 with centering and scaling fused into `XTX` and `XTY`
+        neither copies nor modifies `X` and yields the same model as Algorithm #1,
+        which preprocesses `X` explicitly. Also checks that predictions with the
+        preprocessing folded into the regression coefficients match predictions on the
+        explicitly preprocessed `X`.
+        """
+        n_components = 10
+        for center_X, scale_X, center_Y, scale_Y in product([True, False], repeat=4):
+            params = {
+                "center_X": center_X,
+                "scale_X": scale_X,
+                "center_Y": center_Y,
+                "scale_Y": scale_Y,
+                "copy": False,
+            }
+            X_fit = X.copy()
+            np_pls_alg_1 = NpPLS(algorithm=1, **params)
+            np_pls_alg_1.fit(X_fit.copy(), Y.copy(), n_components)
+            np_pls_alg_2 = NpPLS(algorithm=2, **params)
+            np_pls_alg_2.fit(X_fit, Y.copy(), n_components)
+            assert_allclose(X_fit, X, atol=0, rtol=0)
+            for name in ["X_mean", "X_std"]:
+                if getattr(np_pls_alg_1, name) is not None:
+                    assert_allclose(
+                        getattr(np_pls_alg_2, name),
+                        getattr(np_pls_alg_1, name),
+                        atol=atol,
+                        rtol=rtol,
+                    )
+            assert_allclose(np_pls_alg_2.B, np_pls_alg_1.B, atol=atol, rtol=rtol)
+
+            X_preprocessed = X
+            if center_X:
+                X_preprocessed = X_preprocessed - np_pls_alg_2.X_mean
+            if scale_X:
+                X_preprocessed = X_preprocessed / np_pls_alg_2.X_std
+            Y_pred = X_preprocessed @ np_pls_alg_2.B
+            if scale_Y:
+                Y_pred = Y_pred * np_pls_alg_2.Y_std
+            if center_Y:
+                Y_pred = Y_pred + np_pls_alg_2.Y_mean
+            assert_allclose(np_pls_alg_2.predict(X), Y_pred, atol=atol, rtol=rtol)
+            assert_allclose(
+                np_pls_alg_2.predict(X, n_components=n_components),
+                Y_pred[-1],
+                atol=atol,
+                rtol=rtol,
+            )
+
+    def test_fused_preprocessing(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables and
+        adds a large offset to the predictor variables. It then calls the
+        `check_fused_preprocessing` method to validate the fused centering and scaling
+        of Algorithm #2 and the folded preprocessing in `predict`.
+
+        Returns:
+        None
+        """
+        X = self.load_X() + 100
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_fused_preprocessing(X, Y, atol=1e-8, rtol=1e-6)
+        self.check_fused_preprocessing(X, Y[:, :1], atol=1e-8, rtol=1e-6)
+
+    def check_export_predictor(self, X, Y, atol, rtol):
+        """
+        Checks that an exported predictor yields the same predictions as `predict`,
+        both when allocating its output and when writing into a preallocated array,
+        also in single precision. Also checks that the predictor is immutable and
+        survives pickling.
+        """
+        n_components = 10
+        for center_X, scale_X, center_Y, scale_Y in product([True, False], repeat=4):
+            np_pls = NpPLS(
+                center_X=center_X, scale_X=scale_X, center_Y=center_Y, scale_Y=scale_Y
+            )
+            np_pls.fit(X, Y, n_components)
+            for a in [1, n_components]:
+                predictor = np_pls.export_predictor(a)
+                Y_pred = np_pls.predict(X, n_components=a)
+                assert_allclose(predictor.predict(X), Y_pred, atol=atol, rtol=rtol)
+                out = np.empty_like(Y_pred)
+                assert predictor.predict_into(X, out) is out
+                assert_allclose(out, Y_pred, atol=atol, rtol=rtol)
+                out = np.empty(Y_pred.shape[1], dtype=predictor.dtype)
+                predictor.predict_into(X[0], out)
+                assert_allclose(out, Y_pred[0], atol=atol, rtol=rtol)
+
+        predictor = np_pls.export_predictor()
+        assert_allclose(
+            predictor.predict(X),
+            np_pls.predict(X, n_components=n_components),
+            atol=atol,
+            rtol=rtol,
+        )
+        predictor_32 = np_pls.export_predictor(dtype=np.float32)
+        assert predictor_32.dtype == np.float32
+        assert predictor_32.coefficients.flags.c_contiguous
+        Y_pred_32 = predictor_32.predict(X)
+        assert Y_pred_32.dtype == np.float32
+        assert_allclose(Y_pred_32, predictor.predict(X), atol=1e-3, rtol=1e-3)
+
+        with pytest.raises(AttributeError):
+            predictor.coefficients = predictor.coefficients.copy()
+        with pytest.raises(ValueError):
+            predictor.coefficients[0, 0] = 0
+        with pytest.raises(ValueError):
+            predictor.intercept[0] = 0
+        unpickled = pickle.loads(pickle.dumps(predictor))
+        assert isinstance(unpickled, LinearPredictor)
+        assert_allclose(unpickled.predict(X), predictor.predict(X), atol=0, rtol=0)
+        with pytest.raises(ValueError):
+            NpPLS().export_predictor()
+
+    def test_export_predictor(self):
+        """
+        Description
+        -----------
+        This test loads input predictor variables and multiple target variables. It
+        then calls the `check_export_predictor` method to validate the predictor
+        exported from a fitted model.
+
+        Returns:
+        None
+        """
+        X = self.load_X() + 100
+        Y = self.load_Y(["Rye_Midsummer", "Wheat_H1", "Moisture", "Protein"])
+        self.check_export_predictor(X, Y, atol=1e-8, rtol=1e-6)
+        self.check_export_predictor(X, Y[:, :1], atol=1e-8, rtol=1e-6)